@@ -13,7 +13,7 @@ a = Analysis(
         ('images/warning.png', 'images'),
         ('images/check.png', 'images'),
     ],
-    hiddenimports=['PyPDF2', 'fitz', 'PIL', 'PIL.Image', 'PIL.ImageTk'],
+    hiddenimports=['PyPDF2', 'fitz', 'PIL', 'PIL.Image', 'PIL.ImageTk', 'numpy'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
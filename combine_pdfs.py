@@ -172,7 +172,15 @@ print("compression module:", core.compression.__file__)
 import core.toc
 print("toc module:", core.toc.__file__)
 print("=== END MODULE ORIGIN ===\n")
-from core.pdf_merger import merge_files, FileEntry, MergeOptions
+from core.pdf_merger import FileEntry, MergeOptions
+from core.plan import compile_plan
+from core.doc_pool import get_document_pool
+from core.catalog import get_document_catalog
+from core.journal import default_journal_dir
+from core.segment_cache import default_segment_cache_dir
+from core.page_cache import default_page_cache_dir
+from core.analysis_cache import default_analysis_cache_dir
+from core.progress import STAGE_PAGES, ProgressEvent, format_event
 
 
 import platform
@@ -210,6 +218,7 @@ class AppSettings:
     # Compression
     compression_enabled: bool = False
     compression_level: str = "Medium"
+    dedupe_resources: bool = False
 
     # Watermark
     watermark_enabled: bool = False
@@ -231,6 +240,37 @@ class AppSettings:
     # Scaling
     scaling_enabled: bool = False
     scaling_mode: str = "Fit"
+    # Scale pages as form XObjects (faster for vector-heavy drawings);
+    # settings file only
+    scaling_form_xobject: bool = False
+
+    # Merge backend ("pypdf2" or "pymupdf"); set in the settings file
+    merge_engine: str = "pypdf2"
+
+    # Checkpoint each finished input so a cancelled or crashed merge of the
+    # same files resumes where it stopped; set in the settings file
+    resume_merges: bool = False
+
+    # Keep each input's processed pages in a per-user cache, so re-merging
+    # after a few inputs changed only reprocesses those; settings file only
+    segment_cache: bool = False
+
+    # Keep scaled, watermarked and recompressed pages in a per-user cache
+    # (size in MB, least recently used pages evicted); settings file only
+    page_cache: bool = False
+    page_cache_max_mb: int = 1024
+
+    # Remember each page's blank-check result in a per-user cache, so
+    # blank-page removal skips pages it has seen before; settings file only
+    analysis_cache: bool = False
+
+    # Read PDF inputs through memory maps (large local files); settings
+    # file only
+    mmap_inputs: bool = False
+
+    # Open-document pool shared by validation, preview and merge
+    doc_pool_max_handles: int = 32
+    doc_pool_max_mb: int = 512
 
     # UI
     dark_mode: bool = False
@@ -269,7 +309,7 @@ class ProgressDialog:
                 pass
 
         # Set a larger size
-        width, height = 380, 200
+        width, height = 380, 225
         self.top.geometry(f"{width}x{height}")
 
         # Center the dialog in the parent window
@@ -292,15 +332,32 @@ class ProgressDialog:
         self.progress = ttk.Progressbar(self.top, mode="indeterminate", length=250)
         self.progress.grid(row=3, column=0, padx=10, pady=5, sticky="nsew")
         self.progress.start(10)
+        self._determinate = False
+        # Pages, throughput and ETA from the merge's progress events
+        self.stats_var = tk.StringVar(value="")
+        ttk.Label(self.top, textvariable=self.stats_var, font=("Segoe UI", 9), background=bg).grid(row=4, column=0, padx=10, pady=(2, 0), sticky="nsew")
 
         from ttkbootstrap import Button as TBButton
-        TBButton(self.top, text="Cancel", command=self._on_cancel, style="WinButton.TButton").grid(row=4, column=0, padx=10, pady=(10, 18), sticky="nsew")
+        TBButton(self.top, text="Cancel", command=self._on_cancel, style="WinButton.TButton").grid(row=5, column=0, padx=10, pady=(10, 18), sticky="nsew")
 
         self.top.protocol("WM_DELETE_WINDOW", self._on_cancel)
 
     def set_filename(self, filename: str):
         self.filename_var.set(filename)
 
+    def show_event(self, event: ProgressEvent) -> None:
+        """Reflect the latest merge progress event (call on the Tk thread)."""
+        fraction = event.fraction
+        if fraction is not None and event.stage == STAGE_PAGES:
+            if not self._determinate:
+                self.progress.stop()
+                self.progress.configure(mode="determinate", maximum=1000)
+                self._determinate = True
+            self.progress["value"] = int(fraction * 1000)
+        if event.stage == STAGE_PAGES and event.filename:
+            self.filename_var.set(os.path.basename(event.filename))
+        self.stats_var.set(format_event(event).split("] ", 1)[-1])
+
     def _on_cancel(self) -> None:
         self.cancelled = True
 
@@ -476,12 +533,20 @@ class CombinePDFsUI:
         self.root.title("Combine PDFs")
 
         self.files: List[dict] = []
+        # File metadata for the list, status bar and validation
+        self.catalog = get_document_catalog()
+        self._catalog_poll_id = None
         self.settings = self._load_app_settings()
+        get_document_pool().configure(
+            max_handles=self.settings.doc_pool_max_handles,
+            max_bytes=self.settings.doc_pool_max_mb * 1024 * 1024,
+        )
 
         self._build_ui()
 
         self._merge_thread: Optional[threading.Thread] = None
         self._progress_dialog: Optional[ProgressDialog] = None
+        self._merge_report = None
 
         # Save settings on exit
         self.root.protocol("WM_DELETE_WINDOW", self._on_exit)
@@ -495,6 +560,7 @@ class CombinePDFsUI:
             self.settings.add_filename_bookmarks = self.var_add_filename_bookmarks.get()
             self.settings.compression_enabled = self.var_comp_enabled.get()
             self.settings.compression_level = self.var_comp_level.get()
+            self.settings.dedupe_resources = self.var_dedupe.get()
             self.settings.watermark_enabled = self.var_wm_enabled.get()
             self.settings.watermark_text = self.var_wm_text.get()
             self.settings.watermark_opacity = float(self.var_wm_opacity.get())
@@ -688,14 +754,28 @@ class CombinePDFsUI:
         status_bar.grid(row=4, column=0, sticky="ew")
 
     def _update_status_bar(self):
+        from core.page_ops import parse_page_range
         count = len(self.files)
         total_size = 0
+        total_pages = 0
+        output_size = 0.0
+        unknown = 0
         for entry in self.files:
-            path = entry.get("path")
+            # From the catalog; files not catalogued yet are counted once
+            # the background check reaches them
+            info = self.catalog.get(entry.get("path"))
+            if info is None:
+                unknown += 1
+                continue
+            total_size += info.size
+            if not info.page_count:
+                continue  # unreadable: nothing of it is merged
             try:
-                total_size += os.path.getsize(path)
-            except Exception:
-                pass
+                pages = len(parse_page_range(entry.get("page_range", "All"), info.page_count))
+            except ValueError:
+                pages = info.page_count
+            total_pages += pages
+            output_size += info.size * pages / info.page_count
         def human_size(size):
             if size is None:
                 return "Unknown size"
@@ -705,7 +785,11 @@ class CombinePDFsUI:
                 size /= 1024.0
             return f"{size:.1f} PB"
         size_str = human_size(total_size)
-        self.status_var.set(f"Files: {count}     Total Size: {size_str}")
+        more = "+" if unknown else ""
+        self.status_var.set(
+            f"Files: {count}     Pages: {total_pages:,}{more}     Total Size: {size_str}{more}"
+            f"     Est. Output: {human_size(int(output_size))}{more}"
+        )
 
     # Update status bar after file list changes
     def _build_file_list(self, parent: ttk.Frame) -> None:
@@ -791,7 +875,17 @@ class CombinePDFsUI:
         import PIL.Image, PIL.ImageTk
         preview_img = None
         preview_text = None
-        if ext in ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif'):
+        info = self.catalog.get(path)
+        thumbnail = info.thumbnail if info else ""
+        if thumbnail and os.path.exists(thumbnail):
+            # Rendered by the catalog in the background
+            try:
+                img = PIL.Image.open(thumbnail)
+                img.thumbnail((240, 240))
+                preview_img = PIL.ImageTk.PhotoImage(img)
+            except Exception as e:
+                preview_text = f"Preview failed: {e}"
+        elif ext in ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif'):
             try:
                 img = PIL.Image.open(path)
                 img.thumbnail((240, 240))
@@ -801,9 +895,9 @@ class CombinePDFsUI:
         elif ext == '.pdf':
             try:
                 import fitz
-                doc = fitz.open(path)
-                page = doc.load_page(0)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2,2))
+                with get_document_pool().fitz_document(path) as doc:
+                    page = doc.load_page(0)
+                    pix = page.get_pixmap(matrix=fitz.Matrix(2,2))
                 img = PIL.Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
                 img.thumbnail((240, 240))
                 preview_img = PIL.ImageTk.PhotoImage(img)
@@ -879,16 +973,11 @@ class CombinePDFsUI:
             path = entry["path"]
             if col == "path":
                 return os.path.basename(path).lower()
-            elif col == "size":
-                try:
-                    return os.stat(path).st_size
-                except Exception:
-                    return -1
+            info = self.catalog.get(path)
+            if col == "size":
+                return info.size if info else -1
             elif col == "date":
-                try:
-                    return os.stat(path).st_mtime
-                except Exception:
-                    return 0
+                return info.mtime_ns if info else 0
             return None
 
         self.files.sort(key=get_sort_key, reverse=self._tree_sort_reverse)
@@ -955,9 +1044,8 @@ class CombinePDFsUI:
                         from core.page_ops import parse_page_range
                         path = entry.get("path", "")
                         if path.lower().endswith(".pdf"):
-                            from PyPDF2 import PdfReader
-                            reader = PdfReader(path)
-                            total_pages = len(reader.pages)
+                            info = self.catalog.ensure(path)
+                            total_pages = info.page_count if info else 0
                         else:
                             total_pages = 1
                         parse_page_range(value, total_pages)
@@ -971,6 +1059,7 @@ class CombinePDFsUI:
                         return
                 entry["page_range"] = value
                 self._refresh_tree()
+                self._update_status_bar()
                 top.destroy()
             entry_widget.bind('<Return>', validate_and_commit)
             entry_widget.bind('<FocusOut>', validate_and_commit)
@@ -1092,7 +1181,7 @@ class CombinePDFsUI:
         if not file_paths:
             messagebox.showinfo("No supported files", "No PDF or image files found in the selected folder.", parent=self.root)
             return
-        added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, file_paths)
+        added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, file_paths, self.catalog)
         msg = []
         if dupes:
             msg.append(f"{dupes} duplicate file(s) skipped: {', '.join(dupe_names)}")
@@ -1240,7 +1329,7 @@ class CombinePDFsUI:
         self._save_app_settings()
 
         # Use file_manager logic for adding files
-        added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, list(paths))
+        added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, list(paths), self.catalog)
 
         msg = []
         if dupes:
@@ -1772,6 +1861,11 @@ class CombinePDFsUI:
         comp_level_combo = ttk.Combobox(frame, textvariable=self.var_comp_level, values=["Low", "Medium", "High", "Maximum"], state="readonly", width=12)
         comp_level_combo.grid(row=1, column=1, sticky="w", padx=(0, 8), pady=(0, 8))
 
+        # Independent of image compression: identical fonts/images across
+        # input files are written to the output only once
+        self.var_dedupe = tk.BooleanVar(value=self.settings.dedupe_resources)
+        ttk.Checkbutton(frame, text="Store identical fonts and images only once", variable=self.var_dedupe).grid(row=2, column=0, columnspan=2, sticky="w", pady=(12, 0))
+
         frame.columnconfigure(1, weight=1)
 
         # Set initial state
@@ -1785,15 +1879,7 @@ class CombinePDFsUI:
     # -----------------------------------------------------------------------
 
     def _refresh_tree(self) -> None:
-        import datetime
         from core.file_manager import SUPPORTED_EXTS
-        def human_size(num, suffix="B"):
-            for unit in ["", "K", "M", "G", "T", "P", "E", "Z"]:
-                if abs(num) < 1024.0:
-                    return f"{num:3.1f}{unit}{suffix}"
-                num /= 1024.0
-            return f"{num:.1f}Y{suffix}"
-
         # Define image extensions
         image_exts = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif')
 
@@ -1834,35 +1920,67 @@ class CombinePDFsUI:
 
         for idx, entry in enumerate(self.files):
             path = entry["path"]
-            try:
-                stat = os.stat(path)
-                size = human_size(stat.st_size)
-                mtime = datetime.datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                size = "-"
-                mtime = "-"
             ext = os.path.splitext(path)[1].lower()
             tags = ()
             is_image = ext in image_exts
             if is_image:
                 tags = ('imagefile',)
-            # Show 'N/A' for Pages and Reverse for images
-            page_range_val = entry.get("page_range", "All") if not is_image else "N/A"
-            reverse_val = ("\u2713" if entry.get("reverse", False) else "\u00D7") if not is_image else "-"
             self.tree.insert(
                 "",
                 "end",
                 iid=str(idx),
-                values=(
-                    os.path.basename(path),
-                    size,
-                    mtime,
-                    page_range_val,
-                    entry.get("rotation", 0),
-                    reverse_val,
-                ),
+                values=self._tree_row_values(entry),
                 tags=tags
             )
+        # Size and date come from the catalog; check the files against it
+        # in the background and update the rows that changed
+        self.catalog.request(entry["path"] for entry in self.files)
+        self._schedule_catalog_poll()
+
+    def _tree_row_values(self, entry: dict) -> tuple:
+        import datetime
+        def human_size(num, suffix="B"):
+            for unit in ["", "K", "M", "G", "T", "P", "E", "Z"]:
+                if abs(num) < 1024.0:
+                    return f"{num:3.1f}{unit}{suffix}"
+                num /= 1024.0
+            return f"{num:.1f}Y{suffix}"
+
+        path = entry["path"]
+        info = self.catalog.get(path)
+        if info is not None:
+            size = human_size(info.size)
+            mtime = datetime.datetime.fromtimestamp(info.mtime).strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            size = "-"
+            mtime = "-"
+        is_image = os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif')
+        # Show 'N/A' for Pages and Reverse for images
+        page_range_val = entry.get("page_range", "All") if not is_image else "N/A"
+        reverse_val = ("\u2713" if entry.get("reverse", False) else "\u00D7") if not is_image else "-"
+        return (
+            os.path.basename(path),
+            size,
+            mtime,
+            page_range_val,
+            entry.get("rotation", 0),
+            reverse_val,
+        )
+
+    def _schedule_catalog_poll(self) -> None:
+        if self._catalog_poll_id is None:
+            self._catalog_poll_id = self.root.after(250, self._poll_catalog)
+
+    def _poll_catalog(self) -> None:
+        self._catalog_poll_id = None
+        changed = self.catalog.changes()
+        if changed:
+            for idx, entry in enumerate(self.files):
+                if os.path.abspath(entry["path"]) in changed and self.tree.exists(str(idx)):
+                    self.tree.item(str(idx), values=self._tree_row_values(entry))
+            self._update_status_bar()
+        if changed or self.catalog.pending():
+            self._schedule_catalog_poll()
 
     # -----------------------------------------------------------------------
     # Collect all settings into MergeOptions
@@ -1879,6 +1997,7 @@ class CombinePDFsUI:
 
         self.settings.compression_enabled = self.var_comp_enabled.get()
         self.settings.compression_level = self.var_comp_level.get()
+        self.settings.dedupe_resources = self.var_dedupe.get()
 
         self.settings.watermark_enabled = self.var_wm_enabled.get()
         self.settings.watermark_text = self.var_wm_text.get()
@@ -1918,6 +2037,7 @@ class CombinePDFsUI:
 
             compression_enabled=self.settings.compression_enabled,
             compression_level=self.settings.compression_level,
+            dedupe_resources=self.settings.dedupe_resources,
 
             watermark_enabled=self.settings.watermark_enabled,
             watermark_text=self.settings.watermark_text,
@@ -1936,6 +2056,7 @@ class CombinePDFsUI:
 
             scaling_enabled=self.settings.scaling_enabled,
             scaling_mode=self.settings.scaling_mode,
+            scaling_form_xobject=self.settings.scaling_form_xobject,
 
             # Encryption
             encrypt_enabled=encryption['encrypt_enabled'],
@@ -1946,6 +2067,14 @@ class CombinePDFsUI:
             add_filename_bookmarks=self.settings.add_filename_bookmarks,
             # TOC file info mode
             toc_fileinfo_mode=self.settings.toc_fileinfo_mode,
+
+            merge_engine=self.settings.merge_engine,
+            journal_dir=default_journal_dir() if self.settings.resume_merges else "",
+            segment_cache_dir=default_segment_cache_dir() if self.settings.segment_cache else "",
+            page_cache_dir=default_page_cache_dir() if self.settings.page_cache else "",
+            page_cache_max_mb=self.settings.page_cache_max_mb,
+            analysis_cache_dir=default_analysis_cache_dir() if self.settings.analysis_cache else "",
+            mmap_inputs=self.settings.mmap_inputs,
         )
 
     # -----------------------------------------------------------------------
@@ -2022,9 +2151,15 @@ class CombinePDFsUI:
         def cancel_callback():
             return self._progress_dialog and self._progress_dialog.cancelled
 
+        # Called on the merge thread; the poll loop shows the latest event
+        self._progress_event = None
+
+        def event_callback(event):
+            self._progress_event = event
+
         self._merge_thread = threading.Thread(
             target=self._run_merge,
-            args=(entries, output_path, options, progress_callback, cancel_callback),
+            args=(entries, output_path, options, progress_callback, cancel_callback, event_callback),
             daemon=True,
         )
         self._merge_thread.start()
@@ -2037,14 +2172,15 @@ class CombinePDFsUI:
     # Background merge worker
     # -----------------------------------------------------------------------
 
-    def _run_merge(self, entries, output_path, options, progress_callback=None, cancel_callback=None):
+    def _run_merge(self, entries, output_path, options, progress_callback=None, cancel_callback=None, event_callback=None):
         try:
-            if progress_callback is not None or cancel_callback is not None:
-                merge_files(entries, output_path, options, progress_callback=progress_callback, cancel_callback=cancel_callback)
-            else:
-                merge_files(entries, output_path, options)
+            # Validate the whole job first, so every bad range or missing
+            # file is reported together before any work is done
+            plan = compile_plan(entries, options)
+            self._merge_report = plan.execute(output_path, progress_callback=progress_callback, cancel_callback=cancel_callback, event_callback=event_callback)
             self._merge_error = None
         except Exception as e:
+            self._merge_report = None
             self._merge_error = e
 
     # -----------------------------------------------------------------------
@@ -2055,6 +2191,11 @@ class CombinePDFsUI:
         if self._merge_thread is None:
             return
 
+        event = getattr(self, "_progress_event", None)
+        if event is not None and self._progress_dialog:
+            self._progress_event = None
+            self._progress_dialog.show_event(event)
+
         if self._merge_thread.is_alive():
             self.root.after(100, self._poll_merge_thread)
             return
@@ -2157,10 +2298,29 @@ class CombinePDFsUI:
             check_label = tk.Label(dlg, text="✔", font=("Segoe UI", 24, "bold"), fg="green", bg=bg)
         check_label.grid(row=0, column=0, rowspan=2, padx=(24, 12), pady=(24, 12), sticky="n")
 
+        report = self._merge_report
+        report_str = ""
+        if report is not None and report.duplicate_streams:
+            report_str = (
+                f"Shared resources: {report.duplicate_streams:,} duplicates, "
+                f"{human_size(report.bytes_deduplicated)} saved\n"
+            )
+        if report is not None and report.resumed_segments:
+            report_str += f"Reused: {report.resumed_segments:,} unchanged files\n"
+        if report is not None and report.unchanged:
+            report_str += "Nothing changed since the last merge; output kept as is\n"
+        if report is not None and report.bytes_read:
+            backing = "memory-mapped" if report.mapped_inputs else "buffered"
+            report_str += (
+                f"Input reads: {report.read_seconds:.2f}s ({backing}), "
+                f"peak memory {human_size(report.peak_rss_bytes)}\n"
+            )
+
         info = (
             f"Merged PDF created successfully.\n\n"
             f"Files combined: {file_count}\n"
             f"Output size: {size_str}\n"
+            f"{report_str}"
             f"Saved as: {fullpath}"
         )
         msg_label = tk.Label(
@@ -2247,7 +2407,7 @@ class CombinePDFsUI:
             missing_files = [entry["path"] for entry in loaded if isinstance(entry, dict) and "path" in entry and not os.path.exists(entry["path"])]
             self.files.clear()
             # Use add_files_to_list to check all files
-            added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, paths)
+            added, dupes, dupe_names, unsupported, unsupported_names = add_files_to_list(self.files, paths, self.catalog)
             # Add missing files to unsupported_names for reporting
             all_unsupported = set(unsupported_names)
             all_unsupported.update(missing_files)
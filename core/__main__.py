@@ -0,0 +1,9 @@
+import time
+
+_STARTED = time.perf_counter()
+
+import sys
+
+from core.cli import main
+
+sys.exit(main(started=_STARTED))
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+# core/analysis_cache.py
+
+import os
+import threading
+from typing import Dict, Optional
+
+from core.blank_pages import BlankVerdict, PageAnalysis
+from core.file_hash import HashIndex, read_json, write_json
+from core.settings import make_private_dir, user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Per-page analysis cache
+#
+# Blank-page removal analyses every selected page of every input on every
+# merge, although the answer only depends on the page's bytes. With
+# MergeOptions.analysis_cache_dir set, what the blank check learns is kept
+# per input, keyed by the input's content hash and the page index:
+#
+#   - the content scan verdict (blank, tier used, reason) and the number
+#     of images, per merge engine (their tier 2 heuristics differ);
+#   - the raster ink ratio, per set of raster settings that shape it
+#     (resolution, white level, margin); the max-ink threshold is applied
+#     afterwards, so changing it needs no new renders.
+#
+# Each input's results are one small JSON record, <hash[:2]>/<hash>.json.
+# A record is merged with the copy on disk before it is written, so
+# concurrent batch workers analysing different pages of the same input do
+# not lose each other's results. Records name the user's documents, so
+# the directory must belong to the user and is kept private (0o700).
+# ---------------------------------------------------------------------------
+
+ANALYSIS_VERSION = 1
+
+
+def default_analysis_cache_dir() -> str:
+    return str(user_cache_dir("analysis"))
+
+
+def raster_key(settings) -> str:
+    """Record key of the raster settings an ink ratio was measured with."""
+    return f"{settings.dpi}/{settings.white_level}/{settings.margin:g}"
+
+
+class FileAnalysis:
+    """Cached page analyses of one input; save() writes new results."""
+
+    def __init__(self, record_path: str, content_hash: str) -> None:
+        self.record_path = record_path
+        self.content_hash = content_hash
+        record = read_json(record_path)
+        if record.get("version") != ANALYSIS_VERSION:
+            record = {}
+        # engine -> page index (str) -> [blank, tier, reason, images]
+        self._pages: Dict[str, Dict[str, list]] = record.get("pages", {})
+        # raster key -> page index (str) -> ink ratio
+        self._ink: Dict[str, Dict[str, float]] = record.get("ink", {})
+        self._new_pages: Dict[str, Dict[str, list]] = {}
+        self._new_ink: Dict[str, Dict[str, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def page(self, engine: str, index: int) -> Optional[PageAnalysis]:
+        known = self._pages.get(engine, {}).get(str(index))
+        if known is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        blank, tier, reason, images = known
+        return PageAnalysis(BlankVerdict(bool(blank), int(tier), reason), int(images))
+
+    def set_page(self, engine: str, index: int, analysis: PageAnalysis) -> None:
+        verdict = analysis.verdict
+        value = [verdict.blank, verdict.tier, verdict.reason, analysis.images]
+        self._pages.setdefault(engine, {})[str(index)] = value
+        self._new_pages.setdefault(engine, {})[str(index)] = value
+
+    def ink_ratio(self, key: str, index: int) -> Optional[float]:
+        ratio = self._ink.get(key, {}).get(str(index))
+        if ratio is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return float(ratio)
+
+    def set_ink_ratio(self, key: str, index: int, ratio: float) -> None:
+        self._ink.setdefault(key, {})[str(index)] = ratio
+        self._new_ink.setdefault(key, {})[str(index)] = ratio
+
+    def save(self) -> None:
+        """Write new results, merged with whatever is on disk now."""
+        if not self._new_pages and not self._new_ink:
+            return
+        record = read_json(self.record_path)
+        if record.get("version") != ANALYSIS_VERSION:
+            record = {"version": ANALYSIS_VERSION}
+        for name, new in (("pages", self._new_pages), ("ink", self._new_ink)):
+            merged = record.setdefault(name, {})
+            for key, values in new.items():
+                merged.setdefault(key, {}).update(values)
+        os.makedirs(os.path.dirname(self.record_path), mode=0o700, exist_ok=True)
+        try:
+            write_json(self.record_path, record)
+        except OSError:
+            return  # the cache is an optimisation; a full disk is not an error
+        self._new_pages = {}
+        self._new_ink = {}
+
+
+class AnalysisCache:
+    """Directory of per-input analysis records."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        make_private_dir(root)
+        self._hashes = HashIndex(os.path.join(root, "hashes.json"))
+
+    def open(self, path: str) -> FileAnalysis:
+        """The cached analyses of the input at ``path`` (by its content)."""
+        content_hash = self._hashes.content_hash(path)
+        return FileAnalysis(
+            os.path.join(self.root, content_hash[:2], f"{content_hash}.json"), content_hash
+        )
+
+
+_caches: Dict[str, AnalysisCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_analysis_cache(root: str) -> AnalysisCache:
+    """The process-wide AnalysisCache for a directory."""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = AnalysisCache(root)
+        return cache
+
+
+def open_file_analysis(options, path: str) -> Optional[FileAnalysis]:
+    """Cached analyses of one input file, or None when the cache is off."""
+    root = getattr(options, "analysis_cache_dir", "")
+    if not root or not path:
+        return None
+    try:
+        return get_analysis_cache(root).open(path)
+    except OSError:
+        return None
@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+# core/batch.py
+
+import os
+import signal
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from core.jobs import (
+    STATUS_CANCELLED,
+    STATUS_FAILED,
+    STATUS_INVALID,
+    STATUS_OK,
+    JobResult,
+    JobSpec,
+    JobSpecError,
+)
+from core.settings import user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Batch runs (python -m core DIR --jobs N)
+#
+# Many jobs run on a pool of long-lived worker processes, so the PDF
+# libraries are imported once per worker rather than once per job, and
+# each worker's document pool stays warm from one job to the next. Jobs
+# in a batch share the on-disk caches by default: the segment cache (an
+# input that appears in many jobs with the same settings is processed
+# once), the transformed-page cache, the image-conversion cache and the
+# page analysis cache, all of which are safe for concurrent workers. The
+# largest jobs are started first, so one big job does not hold up the end
+# of the batch.
+# ---------------------------------------------------------------------------
+
+SPEC_SUFFIXES = (".pdflist", ".json")
+
+# Idle parsed documents each worker keeps between jobs
+WORKER_POOL_HANDLES = 64
+
+
+def discover_jobs(directory: str) -> List[str]:
+    """The job specs (.pdflist and .json files) directly in a directory."""
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError as e:
+        raise JobSpecError(f"{directory}: {e.strerror or e}")
+    return [
+        os.path.join(directory, name) for name in names
+        if name.lower().endswith(SPEC_SUFFIXES) and not name.startswith(".")
+        and os.path.isfile(os.path.join(directory, name))
+    ]
+
+
+def shared_cache_options(cache_root: str = "") -> Dict:
+    """MergeOptions fields that point every job at the shared caches."""
+    def cache_dir(name: str) -> str:
+        return os.path.join(cache_root, name) if cache_root else str(user_cache_dir(name))
+    return {
+        "segment_cache_dir": cache_dir("segments"),
+        "page_cache_dir": cache_dir("pages"),
+        "image_cache_dir": cache_dir("images"),
+        "analysis_cache_dir": cache_dir("analysis"),
+    }
+
+
+def _input_bytes(spec: JobSpec) -> int:
+    total = 0
+    for entry in spec.files:
+        try:
+            total += os.path.getsize(entry["path"])
+        except OSError:
+            pass
+    return total
+
+
+def progress_listener(prefix: str):
+    from core.progress import format_event
+
+    def listener(event) -> None:
+        print(f"{prefix}{format_event(event)}", file=sys.stderr, flush=True)
+    return listener
+
+
+# ---------------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------------
+
+def _init_worker(pool_handles: int) -> None:
+    # Ctrl+C is handled by the parent. The merge machinery is imported up
+    # front so the first job's timing does not include it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import core.pdf_merger  # noqa: F401
+    import core.plan  # noqa: F401
+    from core.doc_pool import get_document_pool
+    from core.raster_blank import get_raster_pool
+
+    get_document_pool().configure(max_handles=pool_handles)
+    # Jobs already run in parallel; scanned pages are rendered in-process
+    get_raster_pool().configure(max_workers=1)
+
+
+def _run_in_worker(spec: JobSpec, base_options: Dict, dry_run: bool, progress: bool,
+                   batch_started: float) -> JobResult:
+    from core.jobs import run_job
+
+    started = time.time() - batch_started
+    listener = progress_listener(f"{os.path.basename(spec.output)}: ") if progress else None
+    result = run_job(spec, base_options, dry_run, event_callback=listener)
+    result.worker = os.getpid()
+    result.started = round(started, 3)
+    return result
+
+
+def _worker_result(future, spec: JobSpec) -> JobResult:
+    """A finished future's JobResult; a job whose worker died counts as failed."""
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        # The worker was killed (e.g. out of memory) while running this or
+        # another job; every job still in the pool fails the same way
+        return JobResult(spec.source, spec.output, STATUS_FAILED,
+                         error=str(e) or type(e).__name__)
+
+
+def _run_in_process(specs: List[JobSpec], base_options: Dict, dry_run: bool, progress: bool,
+                    on_result: Optional[Callable[[JobResult], None]]) -> List[JobResult]:
+    from core.jobs import run_job
+
+    # SIGINT/SIGTERM cancel the running merge cleanly (a journalled job
+    # can be resumed); later jobs are skipped
+    cancel = threading.Event()
+
+    def on_signal(signum, frame):
+        cancel.set()
+    previous = {
+        sig: signal.signal(sig, on_signal) for sig in (signal.SIGINT, signal.SIGTERM)
+    }
+    batch_started = time.perf_counter()
+    try:
+        results = []
+        for spec in specs:
+            if cancel.is_set():
+                result = JobResult(spec.source, spec.output, STATUS_CANCELLED)
+            else:
+                prefix = f"{os.path.basename(spec.output)}: " if len(specs) > 1 else ""
+                started = time.perf_counter() - batch_started
+                result = run_job(
+                    spec, base_options, dry_run, cancel_callback=cancel.is_set,
+                    event_callback=progress_listener(prefix) if progress else None,
+                )
+                result.worker = os.getpid()
+                result.started = round(started, 3)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+        return results
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def _run_in_pool(specs: List[JobSpec], base_options: Dict, workers: int, dry_run: bool,
+                 progress: bool, on_result: Optional[Callable[[JobResult], None]]
+                 ) -> List[JobResult]:
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    results: List[Optional[JobResult]] = [None] * len(specs)
+    # Largest first: the batch ends sooner than in submission order
+    order = sorted(range(len(specs)), key=lambda i: _input_bytes(specs[i]), reverse=True)
+    batch_started = time.time()
+
+    # SIGTERM stops the batch the way Ctrl+C does
+    def on_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    previous = signal.signal(signal.SIGTERM, on_sigterm)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(WORKER_POOL_HANDLES,)
+        ) as pool:
+            pending = {
+                pool.submit(_run_in_worker, specs[i], base_options, dry_run, progress,
+                            batch_started): i
+                for i in order
+            }
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = pending.pop(future)
+                        results[i] = _worker_result(future, specs[i])
+                        if on_result is not None:
+                            on_result(results[i])
+            except KeyboardInterrupt:
+                # Queued jobs are dropped; running ones finish (their workers
+                # ignore SIGINT) so no output is left half-written
+                for future in pending:
+                    future.cancel()
+                for future, i in pending.items():
+                    results[i] = (
+                        JobResult(specs[i].source, specs[i].output, STATUS_CANCELLED)
+                        if future.cancelled() else _worker_result(future, specs[i])
+                    )
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    return results
+
+
+def run_batch(
+    specs: List[JobSpec],
+    base_options: Optional[Dict] = None,
+    workers: int = 1,
+    dry_run: bool = False,
+    progress: bool = False,
+    shared_caches: bool = True,
+    cache_root: str = "",
+    on_result: Optional[Callable[[JobResult], None]] = None,
+) -> List[JobResult]:
+    """
+    Run jobs with up to ``workers`` in parallel; results are in ``specs``
+    order, and ``on_result`` is called as each job finishes. With
+    ``shared_caches`` every job uses the shared segment, page, image and
+    analysis caches (under ``cache_root``, default the per-user cache
+    directory) unless its own options set them.
+    """
+    options = dict(base_options or {})
+    if shared_caches:
+        options = {**shared_cache_options(cache_root), **options}
+    workers = min(workers, len(specs))
+    if workers <= 1:
+        return _run_in_process(specs, options, dry_run, progress, on_result)
+    return _run_in_pool(specs, options, workers, dry_run, progress, on_result)
+
+
+# ---------------------------------------------------------------------------
+# Batch summary
+# ---------------------------------------------------------------------------
+
+@dataclass
+class BatchSummary:
+    jobs: int = 0
+    ok: int = 0
+    failed: int = 0
+    invalid: int = 0
+    cancelled: int = 0
+    unchanged: int = 0  # skipped: output already up to date
+    workers: int = 1
+    wall_seconds: float = 0.0
+    # Sum of per-job times; over wall_seconds this is the parallel speed-up
+    job_seconds: float = 0.0
+    median_job_seconds: float = 0.0
+    p95_job_seconds: float = 0.0
+    max_job_seconds: float = 0.0
+    pages: int = 0
+    output_bytes: int = 0
+    reused_segments: int = 0
+    slowest: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(results: List[JobResult], wall_seconds: float, workers: int) -> BatchSummary:
+    statuses = [r.status for r in results]
+    ran = [r for r in results if r.status != STATUS_CANCELLED]
+    times = [r.seconds for r in ran]
+    return BatchSummary(
+        jobs=len(results),
+        ok=statuses.count(STATUS_OK),
+        failed=statuses.count(STATUS_FAILED),
+        invalid=statuses.count(STATUS_INVALID),
+        cancelled=statuses.count(STATUS_CANCELLED),
+        unchanged=sum(1 for r in results if r.unchanged),
+        workers=workers,
+        wall_seconds=round(wall_seconds, 3),
+        job_seconds=round(sum(times), 3),
+        median_job_seconds=_percentile(times, 0.5),
+        p95_job_seconds=_percentile(times, 0.95),
+        max_job_seconds=max(times, default=0.0),
+        pages=sum(r.pages for r in ran),
+        output_bytes=sum(r.output_bytes for r in ran),
+        reused_segments=sum(r.resumed_segments for r in ran),
+        slowest=[r.spec for r in sorted(ran, key=lambda r: r.seconds, reverse=True)[:5]],
+    )
+
+
+def format_summary(summary: BatchSummary) -> List[str]:
+    speedup = summary.job_seconds / summary.wall_seconds if summary.wall_seconds else 0.0
+    counts = ", ".join(
+        f"{n} {label}" for n, label in (
+            (summary.ok, "ok"), (summary.failed, "failed"),
+            (summary.invalid, "invalid"), (summary.cancelled, "cancelled"),
+        ) if n
+    )
+    lines = [
+        f"{summary.jobs} jobs ({counts}) in {summary.wall_seconds:.1f}s "
+        f"on {summary.workers} worker{'s' if summary.workers != 1 else ''}",
+        f"job time: {summary.job_seconds:.1f}s total ({speedup:.1f}x parallel), "
+        f"median {summary.median_job_seconds:.2f}s, p95 {summary.p95_job_seconds:.2f}s, "
+        f"max {summary.max_job_seconds:.2f}s",
+        f"{summary.pages:,} pages, {summary.output_bytes / (1024 * 1024):.1f} MB written; "
+        f"{summary.unchanged} unchanged, {summary.reused_segments} cached segments reused",
+    ]
+    if summary.slowest:
+        lines.append("slowest: " + ", ".join(os.path.basename(s) for s in summary.slowest))
+    return lines
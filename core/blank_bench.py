@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+# core/blank_bench.py
+#
+# Time the tiered blank-page classifier against the text-extraction
+# heuristic it replaces, and report how often they agree.
+#
+#   python -m core.blank_bench a.pdf b.pdf [--repeat 3] [--min-agreement 0.99] [--json]
+#
+# Each method runs on freshly opened documents, so neither benefits from
+# content the other has already parsed.
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from PyPDF2 import PdfReader
+
+from core.blank_pages import TIER_OPERATORS, TIER_TEXT, classify_page, text_heuristic_blank
+
+
+@dataclass
+class BlankComparison:
+    pages: int = 0
+    heuristic_seconds: float = 0.0
+    classifier_seconds: float = 0.0
+    agree: int = 0
+    heuristic_blank: int = 0
+    classifier_blank: int = 0
+    tiers: Dict[int, int] = field(default_factory=dict)
+    # "file p.N: heuristic X, classifier Y (reason)"
+    disagreements: List[str] = field(default_factory=list)
+
+    @property
+    def agreement(self) -> float:
+        return self.agree / self.pages if self.pages else 1.0
+
+    @property
+    def speedup(self) -> float:
+        return self.heuristic_seconds / self.classifier_seconds if self.classifier_seconds else 0.0
+
+
+def _timed(paths: List[str], method: Callable, repeat: int):
+    """Best total time of ``method`` over every page, and its last results."""
+    best = None
+    results: List = []
+    for _ in range(max(1, repeat)):
+        readers = [PdfReader(path) for path in paths]
+        results = []
+        start = time.perf_counter()
+        for reader in readers:
+            results.append([method(page) for page in reader.pages])
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def compare_classifiers(paths: List[str], repeat: int = 1) -> BlankComparison:
+    heuristic_seconds, heuristic = _timed(paths, text_heuristic_blank, repeat)
+    classifier_seconds, verdicts = _timed(paths, classify_page, repeat)
+
+    comparison = BlankComparison(
+        heuristic_seconds=heuristic_seconds, classifier_seconds=classifier_seconds,
+    )
+    tiers: Counter = Counter()
+    for path, old_pages, new_pages in zip(paths, heuristic, verdicts):
+        for index, (old, new) in enumerate(zip(old_pages, new_pages)):
+            comparison.pages += 1
+            comparison.heuristic_blank += old
+            comparison.classifier_blank += new.blank
+            tiers[new.tier] += 1
+            if old == new.blank:
+                comparison.agree += 1
+            else:
+                comparison.disagreements.append(
+                    f"{path} p.{index + 1}: heuristic {'blank' if old else 'not blank'}, "
+                    f"classifier {'blank' if new.blank else 'not blank'} ({new.reason})"
+                )
+    comparison.tiers = {tier: tiers[tier] for tier in (TIER_OPERATORS, TIER_TEXT)}
+    return comparison
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.blank_bench",
+        description="Compare the blank-page classifier with the text-extraction heuristic.",
+    )
+    parser.add_argument("files", nargs="+", help="PDF files")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per method; best time is reported")
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="exit 1 when fewer than this fraction of pages agree")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        c = compare_classifiers(args.files, args.repeat)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if args.json:
+        print(json.dumps({
+            "pages": c.pages,
+            "heuristic_seconds": round(c.heuristic_seconds, 4),
+            "classifier_seconds": round(c.classifier_seconds, 4),
+            "speedup": round(c.speedup, 1),
+            "agreement": round(c.agreement, 4),
+            "heuristic_blank": c.heuristic_blank,
+            "classifier_blank": c.classifier_blank,
+            "tiers": c.tiers,
+            "disagreements": c.disagreements,
+        }, indent=2))
+    else:
+        print(f"{c.pages} pages")
+        print(f"heuristic   {c.heuristic_seconds:.3f}s  {c.heuristic_blank} blank")
+        print(f"classifier  {c.classifier_seconds:.3f}s  {c.classifier_blank} blank  "
+              f"({c.speedup:.1f}x faster)")
+        print(f"decided by tier 1 (operators): {c.tiers[TIER_OPERATORS]}, "
+              f"tier 2 (text): {c.tiers[TIER_TEXT]}")
+        print(f"agreement {c.agreement:.1%}")
+        for line in c.disagreements[:20]:
+            print(f"  {line}")
+        if len(c.disagreements) > 20:
+            print(f"  ... {len(c.disagreements) - 20} more")
+
+    return 1 if c.agreement < args.min_agreement else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
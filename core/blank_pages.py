@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+# core/blank_pages.py
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+# ---------------------------------------------------------------------------
+# Tiered blank-page classification
+#
+# Tier 1 scans the page's content stream operators once, without building
+# PyPDF2 content objects, and stops at the first thing that puts ink on
+# the page: an image or form (Do, inline image), a shading, visible text
+# with a non-blank string, or a path filled or stroked in a dark colour.
+# Reaching the end of the stream without any of those means the page is
+# blank. Annotations other than popups make a page non-blank.
+#
+# What tier 1 cannot decide (paint in a colour space it does not model,
+# content it cannot decode) goes to tier 2, the previous text-extraction
+# heuristic: no extracted text, no XObjects, no fonts.
+#
+# The two can disagree: tier 1 treats a page that only lists fonts or
+# images in a shared resource dictionary, without drawing them, as blank,
+# and a page with only dark vector paths as not blank.
+# ---------------------------------------------------------------------------
+
+BLANK = "blank"
+NOT_BLANK = "not_blank"
+AMBIGUOUS = "ambiguous"
+
+TIER_OPERATORS = 1
+TIER_TEXT = 2
+
+# Tier 1 reasons for pages drawn from images (scans)
+REASON_IMAGE = "image or form"
+REASON_INLINE_IMAGE = "inline image"
+
+# Colours at least this light (per gray/RGB component, or at most 1 minus
+# this per CMYK ink) leave no visible ink on white paper
+NEAR_WHITE = 0.95
+
+_TOKEN = re.compile(
+    rb"[ \t\r\n\f\x00]+"  # whitespace
+    rb"|%[^\r\n]*"  # comment
+    rb"|/[^ \t\r\n\f\x00()<>\[\]{}/%]*"  # name
+    rb"|<<|>>|[\[\]{}]"
+    rb"|<[0-9A-Fa-f \t\r\n\f\x00]*>"  # hex string
+    rb"|[^ \t\r\n\f\x00()<>\[\]{}/%]+"  # number, keyword or operator
+)
+_NUMBER = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)\Z")
+_WHITESPACE = b" \t\r\n\f\x00"
+
+_TEXT_SHOW = {b"Tj", b"TJ", b"'", b'"'}
+_FILL = {b"f", b"F", b"f*"}
+_STROKE = {b"S", b"s"}
+_FILL_STROKE = {b"B", b"B*", b"b", b"b*"}
+_DEVICE_SPACES = {b"/DeviceGray": 1, b"/DeviceRGB": 3, b"/DeviceCMYK": 4,
+                  b"/G": 1, b"/RGB": 3, b"/CMYK": 4}
+
+# Colour states
+_WHITE = 0
+_INK = 1
+_UNKNOWN = 2
+
+
+@dataclass(frozen=True)
+class BlankVerdict:
+    blank: bool
+    tier: int
+    reason: str
+
+
+@dataclass(frozen=True)
+class PageAnalysis:
+    """What the blank check learned about one page (see core/analysis_cache.py)."""
+    verdict: BlankVerdict
+    # Image XObjects in the page's resources
+    images: int = 0
+
+
+def _literal_string(data: bytes, pos: int) -> Tuple[bytes, int]:
+    """Raw body of the literal string starting at data[pos] == '('."""
+    depth = 0
+    i = pos
+    n = len(data)
+    while i < n:
+        c = data[i]
+        if c == 0x5C:  # backslash escapes the next byte
+            i += 2
+            continue
+        if c == 0x28:
+            depth += 1
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return data[pos + 1:i], i + 1
+        i += 1
+    return data[pos + 1:], n
+
+
+def _colour(operands: List, components: int) -> int:
+    try:
+        values = [float(v) for v in operands[-components:]]
+    except ValueError:
+        return _UNKNOWN
+    if len(values) != components:
+        return _UNKNOWN
+    if components == 4:
+        return _WHITE if all(v <= 1 - NEAR_WHITE for v in values) else _INK
+    return _WHITE if all(v >= NEAR_WHITE for v in values) else _INK
+
+
+def scan_content(data: bytes) -> Tuple[str, str]:
+    """
+    Classify a page's (decoded, concatenated) content stream. Returns
+    (BLANK | NOT_BLANK | AMBIGUOUS, reason).
+    """
+    match = _TOKEN.match
+    pos = 0
+    n = len(data)
+    operands: List = []  # bytes tokens; literal/hex strings as (body,) tuples
+    # Graphics state: fill colour, stroke colour, their component counts
+    # (0 = not a device colour space), text render mode
+    fill, stroke, fill_n, stroke_n, invisible = _INK, _INK, 1, 1, False
+    stack = []
+    ambiguous = ""
+
+    while pos < n:
+        if data[pos] == 0x28:  # "("
+            body, pos = _literal_string(data, pos)
+            operands.append((body,))
+            continue
+        m = match(data, pos)
+        if m is None:  # stray delimiter
+            pos += 1
+            continue
+        token = m.group()
+        pos = m.end()
+        first = token[0]
+        if first in _WHITESPACE or first == 0x25:  # whitespace, "%"
+            continue
+        if first == 0x3C and token != b"<<":  # hex string
+            hex_digits = bytes(c for c in token[1:-1] if c not in _WHITESPACE)
+            operands.append((bytes.fromhex((hex_digits + b"0" * (len(hex_digits) % 2)).decode()),))
+            continue
+        if first in b"/[]{}<>" or _NUMBER.match(token) or token in (b"true", b"false", b"null"):
+            operands.append(token)
+            continue
+
+        # An operator
+        op = token
+        if op in _TEXT_SHOW:
+            if not invisible and fill != _WHITE:
+                strings = [o[0] for o in operands if isinstance(o, tuple)]
+                if any(s.strip(_WHITESPACE) for s in strings):
+                    if fill == _INK:
+                        return NOT_BLANK, "text"
+                    ambiguous = ambiguous or "text in an unknown colour"
+        elif op in _FILL or op in _STROKE or op in _FILL_STROKE:
+            used = []
+            if op not in _STROKE:
+                used.append(fill)
+            if op not in _FILL:
+                used.append(stroke)
+            if _INK in used:
+                return NOT_BLANK, "vector paint"
+            if _UNKNOWN in used:
+                ambiguous = ambiguous or "paint in an unknown colour"
+        elif op == b"Do":
+            return NOT_BLANK, REASON_IMAGE
+        elif op == b"BI":
+            return NOT_BLANK, REASON_INLINE_IMAGE
+        elif op == b"sh":
+            return NOT_BLANK, "shading"
+        elif op == b"q":
+            stack.append((fill, stroke, fill_n, stroke_n, invisible))
+        elif op == b"Q":
+            if stack:
+                fill, stroke, fill_n, stroke_n, invisible = stack.pop()
+        elif op == b"Tr":
+            invisible = bool(operands) and operands[-1] in (b"3", b"7")
+        elif op == b"g":
+            fill, fill_n = _colour(operands, 1), 1
+        elif op == b"G":
+            stroke, stroke_n = _colour(operands, 1), 1
+        elif op == b"rg":
+            fill, fill_n = _colour(operands, 3), 3
+        elif op == b"RG":
+            stroke, stroke_n = _colour(operands, 3), 3
+        elif op == b"k":
+            fill, fill_n = _colour(operands, 4), 4
+        elif op == b"K":
+            stroke, stroke_n = _colour(operands, 4), 4
+        elif op in (b"cs", b"CS"):
+            # A new colour space starts at its initial colour: black for
+            # the device spaces, unknown for anything else
+            space = operands[-1] if operands else b""
+            components = _DEVICE_SPACES.get(space, 0)
+            colour = _INK if components else _UNKNOWN
+            if op == b"cs":
+                fill, fill_n = colour, components
+            else:
+                stroke, stroke_n = colour, components
+        elif op in (b"sc", b"scn"):
+            fill = _colour(operands, fill_n) if fill_n else _UNKNOWN
+        elif op in (b"SC", b"SCN"):
+            stroke = _colour(operands, stroke_n) if stroke_n else _UNKNOWN
+        operands = []
+
+    if ambiguous:
+        return AMBIGUOUS, ambiguous
+    return BLANK, "nothing drawn"
+
+
+# ---------------------------------------------------------------------------
+# PyPDF2 pages
+# ---------------------------------------------------------------------------
+
+def _pypdf2_content(page) -> Optional[bytes]:
+    contents = page.get("/Contents")
+    if contents is None:
+        return b""
+    contents = contents.get_object()
+    if isinstance(contents, list):
+        return b"\n".join(part.get_object().get_data() for part in contents)
+    return contents.get_data()
+
+
+def _pypdf2_has_annotations(page) -> bool:
+    annots = page.get("/Annots")
+    if not annots:
+        return False
+    for annot in annots.get_object():
+        annot = annot.get_object()
+        # Flags 2 and 32: hidden, not viewed
+        if annot.get("/Subtype") != "/Popup" and not int(annot.get("/F", 0)) & 34:
+            return True
+    return False
+
+
+def text_heuristic_blank(page) -> bool:
+    """
+    The tier 2 heuristic: no extracted text, no XObjects (images), no
+    fonts.
+    """
+    try:
+        text = page.extract_text()
+        if text and text.strip():
+            return False
+
+        if "/Resources" in page:
+            resources = page["/Resources"]
+
+            if "/XObject" in resources:
+                xobjects = resources["/XObject"]
+                if xobjects and len(xobjects) > 0:
+                    return False
+
+            if "/Font" in resources and len(resources["/Font"]) > 0:
+                return False
+
+        return True
+
+    except Exception:
+        return False
+
+
+def classify_page(page) -> BlankVerdict:
+    """Blank-page verdict for a PyPDF2 page, using the cheapest tier that decides."""
+    try:
+        if _pypdf2_has_annotations(page):
+            return BlankVerdict(False, TIER_OPERATORS, "annotation")
+        verdict, reason = scan_content(_pypdf2_content(page))
+    except Exception as e:
+        verdict, reason = AMBIGUOUS, f"unreadable content ({type(e).__name__})"
+    if verdict != AMBIGUOUS:
+        return BlankVerdict(verdict == BLANK, TIER_OPERATORS, reason)
+    return BlankVerdict(text_heuristic_blank(page), TIER_TEXT, reason)
+
+
+def count_images(page) -> int:
+    """Image XObjects in a PyPDF2 page's resources (forms are not searched)."""
+    try:
+        xobjects = page["/Resources"].get_object()["/XObject"].get_object()
+        return sum(
+            1 for xobject in xobjects.values()
+            if xobject.get_object().get("/Subtype") == "/Image"
+        )
+    except (KeyError, AttributeError, TypeError):
+        return 0
+
+
+def analyse_page(page) -> PageAnalysis:
+    return PageAnalysis(classify_page(page), count_images(page))
+
+
+# ---------------------------------------------------------------------------
+# PyMuPDF pages
+# ---------------------------------------------------------------------------
+
+def fitz_text_heuristic_blank(page) -> bool:
+    """Tier 2 for PyMuPDF pages: no text, images, forms or fonts."""
+    try:
+        if page.get_text().strip():
+            return False
+        if page.get_images() or page.get_xobjects() or page.get_fonts():
+            return False
+        return True
+    except Exception:
+        return False
+
+
+def classify_fitz_page(page) -> BlankVerdict:
+    """Blank-page verdict for a PyMuPDF page."""
+    try:
+        if page.first_widget is not None or any(
+            # Flags 2 and 32: hidden, not viewed (as for PyPDF2 pages)
+            annot.type[1] != "Popup" and not annot.flags & 34 for annot in page.annots()
+        ):
+            return BlankVerdict(False, TIER_OPERATORS, "annotation")
+        verdict, reason = scan_content(page.read_contents())
+    except Exception as e:
+        verdict, reason = AMBIGUOUS, f"unreadable content ({type(e).__name__})"
+    if verdict != AMBIGUOUS:
+        return BlankVerdict(verdict == BLANK, TIER_OPERATORS, reason)
+    return BlankVerdict(fitz_text_heuristic_blank(page), TIER_TEXT, reason)
+
+
+def analyse_fitz_page(page) -> PageAnalysis:
+    try:
+        images = len(page.get_images())
+    except Exception:
+        images = 0
+    return PageAnalysis(classify_fitz_page(page), images)
@@ -0,0 +1,405 @@
+from __future__ import annotations
+
+# core/catalog.py
+
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from core.settings import user_cache_dir, user_config_dir
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif")
+
+
+# ---------------------------------------------------------------------------
+# Document catalog
+#
+# What the GUI shows about each input (size, date, page count, page sizes,
+# encryption, preview thumbnail) is recorded in a SQLite database in the
+# config directory, so the file list, status bar, sorting and validation
+# read a table instead of the filesystem.
+#
+# Rows are read from memory (loaded from the database on first use) and
+# never stat the file. Freshness is the background thread's job: request()
+# queues paths, and the thread stats each one and, if it is new or its size
+# or mtime changed, re-reads it (page tree, encryption) and stores the new
+# row; it then adds the content hash and a thumbnail of the first page.
+# changes() returns the paths updated since the last call, for the GUI to
+# redraw. ensure() does the same check synchronously, for callers that
+# need a current answer (adding files).
+#
+# Thumbnails are files named after the content hash, so identical inputs
+# share one; a thumbnail is deleted once no row refers to it any more.
+# ---------------------------------------------------------------------------
+
+CATALOG_VERSION = 2
+THUMBNAIL_SIZE = 240  # longest side, pixels
+
+_HASH_CHUNK = 1024 * 1024
+_COLUMNS = (
+    "path", "size", "mtime_ns", "content_hash", "kind", "page_count",
+    "page_sizes", "encrypted", "error", "thumbnail", "checked",
+)
+
+
+def default_catalog_path() -> str:
+    return str(user_config_dir() / "catalog.sqlite3")
+
+
+@dataclass
+class CatalogEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str = ""
+    kind: str = "pdf"  # "pdf" or "image"
+    page_count: int = 0
+    # (width, height) of each page as displayed (/Rotate applied), points
+    page_sizes: List[Tuple[float, float]] = field(default_factory=list)
+    encrypted: bool = False
+    # Why the file could not be read ("" = readable); for an encrypted
+    # file, the reader's message when it gave one
+    error: str = ""
+    # PNG preview of the first page ("" = none yet)
+    thumbnail: str = ""
+    checked: float = 0.0  # time of the last check against the file
+
+    @property
+    def mtime(self) -> float:
+        return self.mtime_ns / 1e9
+
+    @property
+    def readable(self) -> bool:
+        return not self.error and not self.encrypted
+
+
+def _content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_encryption_error(message: str) -> bool:
+    return any(k in message.lower() for k in ("encrypted", "password", "aes", "pycryptodome"))
+
+
+def _read_pdf(entry: CatalogEntry) -> None:
+    from core.doc_pool import get_document_pool
+    from core.geometry import scan_reader
+
+    try:
+        # The parsed reader stays pooled for the preview, validator and merge
+        with get_document_pool().reader(entry.path) as reader:
+            if reader.is_encrypted:
+                entry.encrypted = True
+                return
+            geometry = scan_reader(reader)
+    except Exception as e:
+        entry.encrypted = _is_encryption_error(str(e))
+        entry.error = str(e) or type(e).__name__
+        return
+    entry.page_count = geometry.page_count
+    entry.page_sizes = [
+        (box.height, box.width) if box.rotation % 180 == 90 else (box.width, box.height)
+        for box in geometry.pages
+    ]
+
+
+def _read_image(entry: CatalogEntry) -> None:
+    from PIL import Image
+
+    try:
+        with Image.open(entry.path) as img:
+            width, height = img.size
+    except Exception as e:
+        entry.error = str(e) or type(e).__name__
+        return
+    # Same page size as image_tools.image_to_pdf (96 dpi)
+    entry.page_count = 1
+    entry.page_sizes = [(width / 96 * 72, height / 96 * 72)]
+
+
+def _make_thumbnail(entry: CatalogEntry, directory: str) -> str:
+    """Render the first page to <directory>/<content hash>.png."""
+    thumb_path = os.path.join(directory, f"{entry.content_hash}.png")
+    if os.path.exists(thumb_path):
+        return thumb_path
+    from PIL import Image
+
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        if entry.kind == "image":
+            with Image.open(entry.path) as img:
+                img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                img.convert("RGB").save(tmp_path, "PNG")
+        else:
+            import fitz
+            from core.doc_pool import get_document_pool
+
+            with get_document_pool().fitz_document(entry.path) as doc:
+                page = doc.load_page(0)
+                zoom = THUMBNAIL_SIZE / max(page.rect.width, page.rect.height, 1)
+                pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            pix.save(tmp_path, "png")
+        os.replace(tmp_path, thumb_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return ""
+    return thumb_path
+
+
+class DocumentCatalog:
+    """SQLite-backed table of input file metadata, kept fresh in the background."""
+
+    def __init__(self, db_path: str, thumbnail_dir: str = "") -> None:
+        self.db_path = db_path
+        self.thumbnail_dir = thumbnail_dir or str(user_cache_dir("thumbnails"))
+        self._lock = threading.Lock()
+        self._rows: Dict[str, CatalogEntry] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_failed = False
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._queued: Set[str] = set()
+        self._changed: Set[str] = set()
+        self._worker: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        # Called with self._lock held
+        if self._db is None and not self._db_failed:
+            try:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+                if db.execute("PRAGMA user_version").fetchone()[0] != CATALOG_VERSION:
+                    db.execute("DROP TABLE IF EXISTS documents")
+                    db.execute(f"PRAGMA user_version = {CATALOG_VERSION}")
+                    # No row refers to the old thumbnails any more
+                    self._clear_thumbnails()
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS documents ("
+                    "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                    "content_hash TEXT, kind TEXT, page_count INTEGER, page_sizes TEXT, "
+                    "encrypted INTEGER, error TEXT, thumbnail TEXT, checked REAL)"
+                )
+                db.commit()
+                self._db = db
+            except (OSError, sqlite3.Error):
+                # A catalog that cannot be stored still works in memory
+                self._db_failed = True
+        return self._db
+
+    def _clear_thumbnails(self) -> None:
+        try:
+            names = os.listdir(self.thumbnail_dir)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith(".png"):
+                try:
+                    os.remove(os.path.join(self.thumbnail_dir, name))
+                except OSError:
+                    pass
+
+    def _load(self, path: str) -> Optional[CatalogEntry]:
+        # Called with self._lock held
+        db = self._connect()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM documents WHERE path = ?", (path,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        values = dict(zip(_COLUMNS, row))
+        values["page_sizes"] = [tuple(size) for size in json.loads(values["page_sizes"] or "[]")]
+        values["encrypted"] = bool(values["encrypted"])
+        return CatalogEntry(**values)
+
+    def _store(self, entry: CatalogEntry) -> None:
+        with self._lock:
+            self._rows[entry.path] = entry
+            self._changed.add(entry.path)
+            db = self._connect()
+            if db is None:
+                return
+            values = [getattr(entry, name) for name in _COLUMNS]
+            values[_COLUMNS.index("page_sizes")] = json.dumps(entry.page_sizes)
+            values[_COLUMNS.index("encrypted")] = int(entry.encrypted)
+            try:
+                db.execute(
+                    f"INSERT OR REPLACE INTO documents ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))})", values,
+                )
+                db.commit()
+            except sqlite3.Error:
+                pass
+
+    # ------------------------------------------------------------------
+    # Reads (no filesystem access)
+    # ------------------------------------------------------------------
+
+    def get(self, path: str) -> Optional[CatalogEntry]:
+        """The recorded row for ``path``, possibly stale; None if unknown."""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._rows.get(path)
+            if entry is None:
+                entry = self._load(path)
+                if entry is not None:
+                    self._rows[path] = entry
+            return entry
+
+    def pending(self) -> bool:
+        """True while queued paths are still being checked."""
+        with self._lock:
+            return bool(self._queued)
+
+    def changes(self) -> Set[str]:
+        """Paths whose rows changed since the last call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return changed
+
+    # ------------------------------------------------------------------
+    # Checks against the file
+    # ------------------------------------------------------------------
+
+    def ensure(self, path: str, complete: bool = False) -> Optional[CatalogEntry]:
+        """
+        The row for ``path``, re-read first if the file is new or its size or
+        mtime changed; None if the file does not exist. ``complete`` also
+        fills in the content hash and thumbnail (slow for large files, so
+        the background thread does it).
+        """
+        path = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._forget(path)
+            return None
+        entry = self.get(path)
+        if entry is None or (entry.size, entry.mtime_ns) != (st.st_size, st.st_mtime_ns):
+            old = entry
+            entry = CatalogEntry(
+                path, st.st_size, st.st_mtime_ns,
+                kind="image" if path.lower().endswith(IMAGE_EXTS) else "pdf",
+            )
+            (_read_image if entry.kind == "image" else _read_pdf)(entry)
+            entry.checked = time.time()
+            self._store(entry)
+            if old is not None:
+                self._drop_thumbnail(old.thumbnail)
+        if complete and not entry.content_hash:
+            try:
+                entry = replace(entry, content_hash=_content_hash(path))
+            except OSError:
+                return entry
+            self._store(entry)
+        if complete and entry.readable and entry.content_hash and not (
+            entry.thumbnail and os.path.exists(entry.thumbnail)
+        ):
+            thumb_path = _make_thumbnail(entry, self.thumbnail_dir)
+            if thumb_path:
+                entry = replace(entry, thumbnail=thumb_path)
+                self._store(entry)
+        return entry
+
+    def _forget(self, path: str) -> None:
+        old = self.get(path)
+        with self._lock:
+            known = self._rows.pop(path, None) is not None
+            db = self._connect()
+            if db is not None:
+                try:
+                    known = db.execute("DELETE FROM documents WHERE path = ?", (path,)).rowcount > 0 or known
+                    db.commit()
+                except sqlite3.Error:
+                    pass
+            if known:
+                self._changed.add(path)
+        if old is not None:
+            self._drop_thumbnail(old.thumbnail)
+
+    def _drop_thumbnail(self, thumb_path: str) -> None:
+        """Delete a thumbnail no row refers to any more."""
+        if not thumb_path:
+            return
+        with self._lock:
+            if any(entry.thumbnail == thumb_path for entry in self._rows.values()):
+                return
+            db = self._connect()
+            if db is not None:
+                try:
+                    if db.execute(
+                        "SELECT 1 FROM documents WHERE thumbnail = ? LIMIT 1", (thumb_path,)
+                    ).fetchone() is not None:
+                        return
+                except sqlite3.Error:
+                    return  # cannot tell; keep it
+        try:
+            os.remove(thumb_path)
+        except OSError:
+            pass
+
+    def request(self, paths: Iterable[str]) -> None:
+        """Check ``paths`` in the background (and make their thumbnails)."""
+        with self._lock:
+            for path in paths:
+                path = os.path.abspath(path)
+                if path not in self._queued:
+                    self._queued.add(path)
+                    self._queue.put(path)
+            if self._queued and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(
+                    target=self._run, name="document-catalog", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                path = self._queue.get(timeout=2.0)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+            try:
+                self.ensure(path, complete=True)
+            except Exception:
+                pass
+            finally:
+                with self._lock:
+                    self._queued.discard(path)
+
+
+_catalog: Optional[DocumentCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_document_catalog() -> DocumentCatalog:
+    """The process-wide catalog in the user's config directory."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = DocumentCatalog(default_catalog_path())
+        return _catalog
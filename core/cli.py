@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+# core/cli.py
+#
+# Headless merge runner; no GUI toolkit is imported.
+#
+#   python -m core job.json [more.json ...] [--jobs 4] [--json]
+#   python -m core binder.pdflist -o binder.pdf [--options opts.json]
+#   python -m core nightly/ --jobs 8 [--cache-dir DIR]   (see core/batch.py)
+#
+# Exit codes: 0 every job succeeded, 1 a merge failed, 2 usage error or
+# unreadable job spec, 3 a job failed validation (nothing written),
+# 130 interrupted. With --json a machine-readable summary goes to stdout.
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from core.batch import discover_jobs, format_summary, run_batch, summarize
+from core.jobs import (
+    STATUS_CANCELLED,
+    STATUS_FAILED,
+    STATUS_INVALID,
+    STATUS_OK,
+    JobResult,
+    JobSpecError,
+    load_job,
+)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INVALID = 3
+EXIT_INTERRUPTED = 130
+
+# Seconds from start-up until the merge machinery is imported and the
+# first job can run; exceeding it is reported as a warning
+STARTUP_BUDGET = 1.0
+
+
+def _exit_code(results: List[JobResult]) -> int:
+    statuses = {r.status for r in results}
+    if STATUS_CANCELLED in statuses:
+        return EXIT_INTERRUPTED
+    if STATUS_FAILED in statuses:
+        return EXIT_FAILED
+    if STATUS_INVALID in statuses:
+        return EXIT_INVALID
+    return EXIT_OK
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _print_result(result: JobResult, dry_run: bool) -> None:
+    if result.status == STATUS_OK:
+        if dry_run:
+            detail = (
+                f"{result.pages:,} pages, ~{_format_size(result.output_bytes)}, "
+                f"~{result.estimated_seconds:.1f}s, "
+                f"~{_format_size(result.estimated_peak_memory_bytes)} peak memory"
+            )
+        elif result.unchanged:
+            detail = "unchanged since the last merge"
+        else:
+            detail = (
+                f"{result.pages:,} pages, {_format_size(result.output_bytes)}, "
+                f"{result.seconds:.2f}s"
+            )
+        print(f"ok        {result.output}  ({detail})")
+        return
+    print(f"{result.status:<9} {result.spec}")
+    if result.error:
+        print(f"          {result.error}")
+    for problem in result.problems:
+        print(f"          {problem}")
+
+
+def main(argv: Optional[List[str]] = None, started: Optional[float] = None) -> int:
+    """``started`` is the perf_counter() at process start, for the cold-start time."""
+    started = time.perf_counter() if started is None else started
+    parser = argparse.ArgumentParser(
+        prog="python -m core",
+        description="Merge PDFs and images without the GUI, from .pdflist or JSON job specs.",
+    )
+    parser.add_argument("specs", nargs="+", metavar="JOB",
+                        help=".pdflist or JSON job spec (see core/jobs.py), or a "
+                             "directory of them")
+    parser.add_argument("-o", "--output",
+                        help="output PDF (one job only; overrides the spec's output)")
+    parser.add_argument("--options",
+                        help="JSON file with MergeOptions fields; a spec's own options win")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="merge up to N jobs in parallel processes (default 1)")
+    parser.add_argument("--cache-dir",
+                        help="root of the caches shared by a batch's jobs "
+                             "(default: the per-user cache directory)")
+    parser.add_argument("--no-shared-cache", action="store_true",
+                        help="do not share segment, page, image and analysis caches between jobs")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="validate and estimate each job without writing anything")
+    parser.add_argument("--json", action="store_true",
+                        help="print a JSON summary on stdout")
+    parser.add_argument("--progress", action="store_true",
+                        help="print progress lines on stderr")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET,
+                        help=f"warn if start-up takes longer (seconds, default {STARTUP_BUDGET})")
+    args = parser.parse_args(argv)
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    # Specs named on the command line must all load; a bad spec found in
+    # a directory only fails that job, not the whole batch
+    specs = []
+    rejected: List[JobResult] = []
+    try:
+        base_options: Dict = {}
+        if args.options:
+            with open(args.options, "r", encoding="utf-8") as f:
+                base_options = json.load(f)
+            if not isinstance(base_options, dict):
+                raise JobSpecError(f"{args.options}: expected an object of MergeOptions fields")
+        paths = []
+        for path in args.specs:
+            if os.path.isdir(path):
+                paths.extend(
+                    (p, True) for p in discover_jobs(path)
+                    if not (args.options and os.path.samefile(p, args.options))
+                )
+            else:
+                paths.append((path, False))
+        if not paths:
+            raise JobSpecError("no job specs (.pdflist or .json) found")
+        if args.output and len(paths) > 1:
+            parser.error("--output needs exactly one job")
+        for path, discovered in paths:
+            try:
+                specs.append(load_job(path, args.output or ""))
+            except JobSpecError as e:
+                if not discovered:
+                    raise
+                rejected.append(JobResult(path, "", STATUS_INVALID, error=str(e)))
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    # The merge machinery is what start-up is spent on
+    import core.pdf_merger  # noqa: F401
+    import core.plan  # noqa: F401
+    startup = time.perf_counter() - started
+    if startup > args.startup_budget:
+        print(
+            f"warning: start-up took {startup:.2f}s (budget {args.startup_budget:.2f}s)",
+            file=sys.stderr,
+        )
+
+    # A batch (more than one job) shares its caches between jobs
+    batch = len(specs) + len(rejected) > 1
+    on_result = None if args.json else (lambda r: _print_result(r, args.dry_run))
+    if on_result is not None:
+        for result in rejected:
+            on_result(result)
+    batch_started = time.perf_counter()
+    results = run_batch(
+        specs, base_options, workers=args.jobs, dry_run=args.dry_run,
+        progress=args.progress, shared_caches=batch and not args.no_shared_cache,
+        cache_root=args.cache_dir or "", on_result=on_result,
+    ) if specs else []
+    results = rejected + results
+    summary = summarize(results, time.perf_counter() - batch_started,
+                        max(1, min(args.jobs, len(specs))))
+    code = _exit_code(results)
+
+    if args.json:
+        print(json.dumps({
+            "exit_code": code,
+            "ok": code == EXIT_OK,
+            "dry_run": args.dry_run,
+            "startup_seconds": round(startup, 3),
+            "startup_budget_seconds": args.startup_budget,
+            "seconds": round(time.perf_counter() - started, 3),
+            "batch": summary.to_dict(),
+            "jobs": [r.to_dict() for r in results],
+        }, indent=2))
+    elif batch:
+        print()
+        for line in format_summary(summary):
+            print(line)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,15 +3,18 @@ from __future__ import annotations
 # core/compression.py
 
 import io
-from PIL import Image
 from PyPDF2.generic import NameObject
 
 
-def compress_page(page, compression_level: str):
+def compress_page(page, compression_level: str) -> int:
     """
     Compress images inside a PDF page.
     compression_level: "Low", "Medium", "High", "Maximum"
+    Returns the number of images replaced by a smaller JPEG.
     """
+    from PIL import Image
+
+    recompressed = 0
     try:
         quality_map = {
             "Low": 95,
@@ -24,7 +27,7 @@ def compress_page(page, compression_level: str):
 
         # No images → nothing to compress
         if "/Resources" not in page or "/XObject" not in page["/Resources"]:
-            return
+            return 0
 
         xobjects = page["/Resources"]["/XObject"].get_object()
 
@@ -80,6 +83,7 @@ def compress_page(page, compression_level: str):
                             obj[NameObject("/ColorSpace")] = NameObject("/DeviceRGB")
                             if "/DecodeParms" in obj:
                                 del obj["/DecodeParms"]
+                            recompressed += 1
 
                     except Exception:
                         # Fallback: Flate encode
@@ -97,4 +101,6 @@ def compress_page(page, compression_level: str):
 
     except Exception:
         # Fail silently — compression is optional
-        pass
\ No newline at end of file
+        pass
+
+    return recompressed
\ No newline at end of file
@@ -0,0 +1,566 @@
+from __future__ import annotations
+
+# core/daemon.py
+#
+# Warm local merge daemon (Unix only):
+#
+#   python -m core.daemon [--socket PATH] [--workers 2] [--max-queue 64]
+#
+# Submit jobs with the client, python -m core.daemon_client.
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from multiprocessing.connection import wait as wait_connections
+from typing import Any, Deque, Dict, List, Optional
+
+from core.batch import WORKER_POOL_HANDLES, _init_worker, shared_cache_options
+from core.daemon_client import default_socket_path
+from core.jobs import STATUS_CANCELLED, STATUS_FAILED, JobResult, JobSpec
+
+
+# ---------------------------------------------------------------------------
+# Merge daemon
+#
+# One long-lived process listens on a Unix domain socket and hands jobs to
+# a fixed pool of worker processes that have already imported the PDF
+# libraries, so a submitted job starts merging at once instead of paying
+# the start-up cost of python -m core.
+#
+# Protocol: one JSON object per line in each direction. Requests carry an
+# "op"; replies carry "ok" (and "error" when it is false).
+#
+#   {"op": "ping"}                         daemon and queue state
+#   {"op": "submit", "spec": {...},        queue a job (JobSpec fields);
+#    "options": {...}, "watch": true}      with "watch", progress follows
+#   {"op": "status", "id": "j3"}           one job, or all without "id"
+#   {"op": "watch", "id": "j3"}            stream a job's progress
+#   {"op": "cancel", "id": "j3"}           drop a queued job, stop a running one
+#   {"op": "shutdown", "cancel": false}    stop after the running jobs
+#
+# A watched job streams {"event": {...}} lines (ProgressEvent fields plus
+# "text") and ends with {"result": {...}} (JobResult fields).
+#
+# Backpressure: at most max_queue jobs wait for a worker; further submits
+# are refused with {"ok": false, "busy": true} until the queue drains.
+# ---------------------------------------------------------------------------
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_QUEUE = 64
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+
+# Finished jobs kept for status queries
+_FINISHED_KEPT = 256
+
+
+def _event_dict(event) -> Dict:
+    from core.progress import format_event
+
+    data = asdict(event)
+    data["text"] = format_event(event)
+    return data
+
+
+def _worker_main(control, events, pool_handles: int) -> None:
+    # Worker process: one job at a time. A reader thread takes jobs and
+    # cancel requests from the daemon while a job runs.
+    _init_worker(pool_handles)
+    from core.jobs import run_job
+
+    send_lock = threading.Lock()
+    jobs: "queue.Queue[Optional[tuple]]" = queue.Queue()
+    cancel = threading.Event()
+    current: List[Optional[str]] = [None]
+
+    def send(message) -> None:
+        with send_lock:
+            events.send(message)
+
+    def read_control() -> None:
+        while True:
+            try:
+                message = control.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is None:
+                jobs.put(None)
+                return
+            if message[0] == "cancel":
+                if current[0] == message[1]:
+                    cancel.set()
+            else:
+                cancel.clear()
+                current[0] = message[1]
+                jobs.put(message)
+
+    threading.Thread(target=read_control, daemon=True).start()
+    send(("ready", os.getpid()))
+    while True:
+        message = jobs.get()
+        if message is None:
+            return
+        _, job_id, spec, options = message
+        result = run_job(
+            JobSpec(**spec), options, cancel_callback=cancel.is_set,
+            event_callback=lambda event: send(("event", job_id, _event_dict(event))),
+        )
+        result.worker = os.getpid()
+        current[0] = None
+        send(("result", job_id, result.to_dict()))
+
+
+@dataclass
+class _Job:
+    id: str
+    spec: JobSpec
+    options: Dict
+    state: str = STATE_QUEUED
+    submitted: float = field(default_factory=time.time)
+    started: float = 0.0
+    finished: float = 0.0
+    worker: int = 0
+    last_event: Optional[Dict] = None
+    result: Optional[Dict] = None
+    watchers: List["queue.Queue[Dict]"] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "spec": self.spec.source,
+            "output": self.spec.output,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "worker": self.worker,
+            "progress": self.last_event,
+            "result": self.result,
+        }
+
+
+class _Worker:
+    def __init__(self, context, pool_handles: int) -> None:
+        control_recv, self.control = context.Pipe(duplex=False)
+        self.events, events_send = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_worker_main, args=(control_recv, events_send, pool_handles),
+            daemon=True,
+        )
+        self.process.start()
+        control_recv.close()
+        events_send.close()
+        self.pid = 0  # set once the worker reports ready
+        self.job: Optional[_Job] = None
+
+    @property
+    def idle(self) -> bool:
+        return self.pid != 0 and self.job is None
+
+    def stop(self) -> None:
+        try:
+            self.control.send(None)
+        except (OSError, ValueError):
+            pass
+
+
+class MergeDaemon:
+    """Socket server that queues jobs onto warm worker processes."""
+
+    def __init__(
+        self,
+        socket_path: str = "",
+        workers: int = DEFAULT_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        base_options: Optional[Dict] = None,
+        shared_caches: bool = True,
+        cache_root: str = "",
+    ) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.max_queue = max_queue
+        options = dict(base_options or {})
+        if shared_caches:
+            options = {**shared_cache_options(cache_root), **options}
+        self.base_options = options
+        # Spawned workers do not inherit the daemon's threads or sockets
+        self._context = multiprocessing.get_context("spawn")
+        self._worker_count = max(1, workers)
+        self._workers: List[_Worker] = []
+        self._queue: Deque[_Job] = deque()
+        self._jobs: "OrderedDict[str, _Job]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._closing = threading.Event()
+        self._listener: Optional[socket.socket] = None
+        self.started = time.time()
+
+    # ------------------------------------------------------------------
+    # Life cycle
+    # ------------------------------------------------------------------
+
+    def start(self, ready_timeout: float = 60.0) -> None:
+        """Start the workers, wait until they are warm, then listen."""
+        self._listener = self._bind()
+        self._workers = [
+            _Worker(self._context, WORKER_POOL_HANDLES) for _ in range(self._worker_count)
+        ]
+        threading.Thread(target=self._collect, name="daemon-collector", daemon=True).start()
+        deadline = time.monotonic() + ready_timeout
+        with self._lock:
+            while not all(w.pid for w in self._workers):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RuntimeError("merge workers did not start")
+                self._idle.wait(remaining)
+
+    def _bind(self) -> socket.socket:
+        path = self.socket_path
+        if os.path.exists(path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except OSError:
+                os.remove(path)  # left behind by a daemon that died
+            else:
+                raise RuntimeError(f"a daemon is already listening on {path}")
+            finally:
+                probe.close()
+        # A directory created here is private (default_socket_path)
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # the socket is for this user only
+        try:
+            listener.bind(path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(16)
+        return listener
+
+    def serve_forever(self) -> None:
+        """Accept clients until shutdown() is called."""
+        listener = self._listener
+        while not self._closing.is_set():
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                break  # closed by shutdown()
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        self._stop()
+
+    def shutdown(self, cancel_running: bool = False) -> None:
+        """Stop accepting jobs, drop queued ones and let serve_forever return."""
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        with self._lock:
+            while self._queue:
+                self._finish(self._queue.popleft(), self._cancelled_result)
+            if cancel_running:
+                for worker in self._workers:
+                    if worker.job is not None:
+                        self._send(worker, ("cancel", worker.job.id))
+        try:
+            # Wakes accept(); shutdown() first for platforms where close
+            # alone does not
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
+
+    def _stop(self) -> None:
+        with self._lock:
+            while any(w.job is not None for w in self._workers):
+                self._idle.wait()
+            workers = list(self._workers)
+        for worker in workers:
+            worker.stop()
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Scheduling (self._lock held)
+    # ------------------------------------------------------------------
+
+    def _send(self, worker: _Worker, message) -> None:
+        try:
+            worker.control.send(message)
+        except (OSError, ValueError):
+            pass  # the collector notices the dead worker
+
+    def _dispatch(self) -> None:
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if worker.idle:
+                job = self._queue.popleft()
+                job.state = STATE_RUNNING
+                job.started = time.time()
+                job.worker = worker.pid
+                worker.job = job
+                self._send(worker, ("job", job.id, asdict(job.spec), job.options))
+
+    def _cancelled_result(self, job: _Job) -> Dict:
+        return JobResult(job.spec.source, job.spec.output, STATUS_CANCELLED).to_dict()
+
+    def _finish(self, job: _Job, result) -> None:
+        job.result = result(job) if callable(result) else result
+        job.state = job.result["status"]
+        job.finished = time.time()
+        self._notify(job, {"result": job.result})
+        job.watchers.clear()
+        finished = [j for j in self._jobs.values() if j.finished]
+        for old in finished[:max(0, len(finished) - _FINISHED_KEPT)]:
+            del self._jobs[old.id]
+        self._idle.notify_all()
+
+    def _notify(self, job: _Job, message: Dict) -> None:
+        for watcher in job.watchers:
+            watcher.put(message)
+
+    # ------------------------------------------------------------------
+    # Worker messages
+    # ------------------------------------------------------------------
+
+    def _collect(self) -> None:
+        while True:
+            with self._lock:
+                workers = list(self._workers)
+            if not workers:
+                return
+            ready = wait_connections([w.events for w in workers], timeout=0.5)
+            for worker in workers:
+                if worker.events not in ready:
+                    continue
+                try:
+                    message = worker.events.recv()
+                except (EOFError, OSError):
+                    self._worker_exited(worker)
+                    continue
+                with self._lock:
+                    self._handle(worker, message)
+                    self._dispatch()
+
+    def _handle(self, worker: _Worker, message) -> None:
+        kind = message[0]
+        if kind == "ready":
+            worker.pid = message[1]
+            self._idle.notify_all()
+        elif kind == "event" and worker.job is not None and worker.job.id == message[1]:
+            worker.job.last_event = message[2]
+            self._notify(worker.job, {"event": message[2]})
+        elif kind == "result" and worker.job is not None and worker.job.id == message[1]:
+            job, worker.job = worker.job, None
+            self._finish(job, message[2])
+
+    def _worker_exited(self, worker: _Worker) -> None:
+        worker.process.join(timeout=1)
+        with self._lock:
+            if worker not in self._workers:
+                return
+            self._workers.remove(worker)
+            job, worker.job = worker.job, None
+            if job is not None:
+                result = JobResult(job.spec.source, job.spec.output, STATUS_FAILED)
+                result.error = f"merge worker exited (code {worker.process.exitcode})"
+                self._finish(job, result.to_dict())
+            if not self._closing.is_set():
+                # Replace it; the new worker takes jobs once it is warm
+                self._workers.append(_Worker(self._context, WORKER_POOL_HANDLES))
+            self._idle.notify_all()
+
+    # ------------------------------------------------------------------
+    # Client requests
+    # ------------------------------------------------------------------
+
+    def _serve_client(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rb") as reader:
+            def reply(message: Dict) -> None:
+                conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+            try:
+                for line in reader:
+                    try:
+                        request = json.loads(line)
+                        if not isinstance(request, dict):
+                            raise ValueError("expected a JSON object")
+                    except ValueError as e:
+                        reply({"ok": False, "error": f"bad request: {e}"})
+                        continue
+                    watch = self._request(request, reply)
+                    if watch is not None:
+                        # Streams until the job ends; the connection then closes
+                        while True:
+                            message = watch.get()
+                            reply(message)
+                            if "result" in message:
+                                return
+            except OSError:
+                pass  # client went away; its jobs carry on
+
+    def _request(self, request: Dict, reply) -> Optional["queue.Queue[Dict]"]:
+        op = request.get("op")
+        if op == "ping":
+            with self._lock:
+                reply({
+                    "ok": True, "pid": os.getpid(), "uptime": round(time.time() - self.started, 1),
+                    "workers": sum(1 for w in self._workers if w.pid),
+                    "busy": sum(1 for w in self._workers if w.job is not None),
+                    "queued": len(self._queue), "max_queue": self.max_queue,
+                })
+            return None
+        if op == "submit":
+            return self._submit(request, reply)
+        if op == "status":
+            with self._lock:
+                if request.get("id"):
+                    job = self._jobs.get(request["id"])
+                    if job is None:
+                        reply({"ok": False, "error": f"unknown job {request['id']}"})
+                    else:
+                        reply({"ok": True, "job": job.to_dict()})
+                else:
+                    reply({"ok": True, "jobs": [j.to_dict() for j in self._jobs.values()]})
+            return None
+        if op == "watch":
+            with self._lock:
+                job = self._jobs.get(request.get("id", ""))
+                if job is None:
+                    reply({"ok": False, "error": f"unknown job {request.get('id')}"})
+                    return None
+                reply({"ok": True, "id": job.id, "state": job.state})
+                return self._watch(job)
+        if op == "cancel":
+            with self._lock:
+                job = self._jobs.get(request.get("id", ""))
+                if job is None:
+                    reply({"ok": False, "error": f"unknown job {request.get('id')}"})
+                elif job.state == STATE_QUEUED:
+                    self._queue.remove(job)
+                    self._finish(job, self._cancelled_result)
+                    reply({"ok": True, "id": job.id, "state": job.state})
+                elif job.state == STATE_RUNNING:
+                    # The worker stops at its next cancellation point
+                    for worker in self._workers:
+                        if worker.job is job:
+                            self._send(worker, ("cancel", job.id))
+                    reply({"ok": True, "id": job.id, "state": "cancelling"})
+                else:
+                    reply({"ok": True, "id": job.id, "state": job.state})
+            return None
+        if op == "shutdown":
+            reply({"ok": True})
+            self.shutdown(cancel_running=bool(request.get("cancel")))
+            return None
+        reply({"ok": False, "error": f"unknown op {op!r}"})
+        return None
+
+    def _submit(self, request: Dict, reply) -> Optional["queue.Queue[Dict]"]:
+        try:
+            spec = JobSpec(**request["spec"])
+            options = request.get("options") or {}
+            if not isinstance(options, dict):
+                raise TypeError("'options' must be an object")
+        except (KeyError, TypeError) as e:
+            reply({"ok": False, "error": f"bad job spec: {e}"})
+            return None
+        with self._lock:
+            if self._closing.is_set():
+                reply({"ok": False, "error": "daemon is shutting down"})
+                return None
+            if len(self._queue) >= self.max_queue:
+                reply({"ok": False, "busy": True, "error": "queue full",
+                       "queued": len(self._queue)})
+                return None
+            job = _Job(f"j{self._next_id}", spec, {**self.base_options, **options})
+            self._next_id += 1
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            reply({"ok": True, "id": job.id, "position": len(self._queue)})
+            watch = self._watch(job) if request.get("watch") else None
+            self._dispatch()
+            return watch
+
+    def _watch(self, job: _Job) -> "queue.Queue[Dict]":
+        # self._lock held
+        watcher: "queue.Queue[Dict]" = queue.Queue()
+        if job.result is not None:
+            watcher.put({"result": job.result})
+        else:
+            if job.last_event is not None:
+                watcher.put({"event": job.last_event})
+            job.watchers.append(watcher)
+        return watcher
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.daemon",
+        description="Keep merge workers warm and take jobs over a Unix socket.",
+    )
+    parser.add_argument("--socket", default="", help=f"socket path (default {default_socket_path()})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"merge worker processes (default {DEFAULT_WORKERS})")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f"jobs that may wait for a worker (default {DEFAULT_MAX_QUEUE})")
+    parser.add_argument("--options",
+                        help="JSON file with MergeOptions fields for every job")
+    parser.add_argument("--cache-dir",
+                        help="root of the caches shared by all jobs "
+                             "(default: the per-user cache directory)")
+    parser.add_argument("--no-shared-cache", action="store_true",
+                        help="do not share segment, page, image and analysis caches between jobs")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, "AF_UNIX"):
+        print("error: the merge daemon needs Unix domain sockets", file=sys.stderr)
+        return 2
+    base_options: Dict[str, Any] = {}
+    if args.options:
+        try:
+            with open(args.options, "r", encoding="utf-8") as f:
+                base_options = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"error: {args.options}: {e}", file=sys.stderr)
+            return 2
+
+    daemon = MergeDaemon(
+        args.socket, workers=args.workers, max_queue=args.max_queue,
+        base_options=base_options, shared_caches=not args.no_shared_cache,
+        cache_root=args.cache_dir or "",
+    )
+    try:
+        daemon.start()
+    except (OSError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    def on_signal(signum, frame):
+        # Ctrl+C / SIGTERM: stop the running jobs too
+        threading.Thread(target=daemon.shutdown, args=(True,), daemon=True).start()
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    print(f"listening on {daemon.socket_path} with {args.workers} workers", file=sys.stderr,
+          flush=True)
+    daemon.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+# core/daemon_client.py
+#
+# Client for the merge daemon (core/daemon.py):
+#
+#   python -m core.daemon_client submit job.json [-o out.pdf] [--wait 30] [--json]
+#   python -m core.daemon_client status [JOB_ID]
+#   python -m core.daemon_client watch JOB_ID
+#   python -m core.daemon_client cancel JOB_ID
+#   python -m core.daemon_client ping | shutdown [--cancel]
+#
+# Only the standard library and core.jobs are imported, so a submit costs
+# a few milliseconds of start-up; the daemon's workers do the merging.
+# Exit codes follow python -m core, plus 4 when the daemon is not running
+# or stays busy.
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+from dataclasses import asdict
+from typing import Dict, Iterator, List, Optional
+
+from core.jobs import JobResult, JobSpec, load_job
+from core.settings import user_cache_dir
+
+EXIT_NO_DAEMON = 4
+
+
+class DaemonError(RuntimeError):
+    """The daemon is unreachable or refused a request."""
+
+
+class DaemonUnavailable(DaemonError):
+    """No daemon is listening on the socket."""
+
+
+class DaemonBusy(DaemonError):
+    """The daemon's queue is full; retry later."""
+
+
+def default_socket_path() -> str:
+    """
+    The socket in a directory only this user can enter: the session's
+    runtime directory, else the per-user cache directory (the daemon
+    creates it with mode 0o700), never the shared temp directory.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "combinepdfs.sock")
+    return str(user_cache_dir("daemon") / "combinepdfs.sock")
+
+
+class DaemonClient:
+    """Talks to a running merge daemon; one connection per request."""
+
+    def __init__(self, socket_path: str = "", timeout: Optional[float] = 10.0) -> None:
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def _connect(self) -> socket.socket:
+        try:
+            owner = os.stat(self.socket_path).st_uid
+        except OSError as e:
+            raise DaemonUnavailable(f"no merge daemon on {self.socket_path} ({e.strerror or e})")
+        if hasattr(os, "getuid") and owner != os.getuid():
+            # Jobs name files to read and write; never hand them to a
+            # daemon run by someone else
+            raise DaemonError(f"{self.socket_path} belongs to another user; not connecting")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(f"no merge daemon on {self.socket_path} ({e.strerror or e})")
+        return sock
+
+    @staticmethod
+    def _check(reply: Dict) -> Dict:
+        if not reply.get("ok"):
+            error = DaemonBusy if reply.get("busy") else DaemonError
+            raise error(reply.get("error") or "request failed")
+        return reply
+
+    def _stream(self, request: Dict) -> Iterator[Dict]:
+        """Send one request; yield the reply and anything streamed after it."""
+        sock = self._connect()
+        try:
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            # Progress can be quiet for a long time; only connecting times out
+            sock.settimeout(None)
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    yield json.loads(line)
+        except OSError as e:
+            raise DaemonError(f"lost the connection to the merge daemon ({e})")
+        finally:
+            sock.close()
+
+    def _request(self, request: Dict) -> Dict:
+        for reply in self._stream(request):
+            return self._check(reply)
+        raise DaemonError("the merge daemon closed the connection")
+
+    def ping(self) -> Dict:
+        return self._request({"op": "ping"})
+
+    def status(self, job_id: str = "") -> Dict:
+        reply = self._request({"op": "status", "id": job_id} if job_id else {"op": "status"})
+        return reply.get("job") or {"jobs": reply.get("jobs", [])}
+
+    def cancel(self, job_id: str) -> str:
+        """Cancel a job; returns its state afterwards."""
+        return self._request({"op": "cancel", "id": job_id})["state"]
+
+    def shutdown(self, cancel_running: bool = False) -> None:
+        self._request({"op": "shutdown", "cancel": cancel_running})
+
+    def submit(self, spec: JobSpec, options: Optional[Dict] = None) -> str:
+        """Queue a job and return its id."""
+        return self._request(
+            {"op": "submit", "spec": asdict(spec), "options": options or {}}
+        )["id"]
+
+    def run(self, spec: JobSpec, options: Optional[Dict] = None,
+            wait: float = 0.0) -> Iterator[Dict]:
+        """
+        Submit a job and follow it: yields {"id": ...} first, then
+        {"event": {...}} progress messages and finally {"result": {...}}.
+        While the daemon is busy, retries for up to ``wait`` seconds.
+        """
+        request = {"op": "submit", "spec": asdict(spec), "options": options or {},
+                   "watch": True}
+        deadline = time.monotonic() + wait
+        delay = 0.1
+        while True:
+            messages = self._stream(request)
+            try:
+                reply = self._check(next(messages, {"ok": False, "error": "no reply"}))
+            except DaemonBusy:
+                messages.close()
+                if time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+            yield {"id": reply["id"]}
+            yield from messages
+            return
+
+    def watch(self, job_id: str) -> Iterator[Dict]:
+        """Progress of a submitted job, ending with its result."""
+        messages = self._stream({"op": "watch", "id": job_id})
+        self._check(next(messages, {"ok": False, "error": "no reply"}))
+        yield from messages
+
+
+def _follow(client: DaemonClient, messages: Iterator[Dict], as_json: bool,
+            job_id: str = "") -> int:
+    from core.cli import _exit_code, _print_result
+
+    try:
+        for message in messages:
+            if "id" in message:
+                job_id = message["id"]
+                print(f"{job_id}: queued", file=sys.stderr, flush=True)
+            elif "event" in message:
+                print(f"{job_id}: {message['event']['text']}", file=sys.stderr, flush=True)
+            elif "result" in message:
+                result = JobResult(**message["result"])
+                if as_json:
+                    print(json.dumps(message["result"], indent=2))
+                else:
+                    _print_result(result, dry_run=False)
+                return _exit_code([result])
+    except KeyboardInterrupt:
+        # Ctrl+C cancels the job, not just the client
+        if job_id:
+            client.cancel(job_id)
+            print(f"{job_id}: cancelling", file=sys.stderr)
+            return _follow(client, client.watch(job_id), as_json, job_id)
+        raise
+    raise DaemonError("the merge daemon closed the connection")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.daemon_client", description="Submit jobs to the merge daemon.",
+    )
+    parser.add_argument("--socket", default="", help=f"socket path (default {default_socket_path()})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="run a job and follow its progress")
+    submit.add_argument("spec", metavar="JOB", help=".pdflist or JSON job spec")
+    submit.add_argument("-o", "--output", help="output PDF (overrides the spec's output)")
+    submit.add_argument("--options", help="JSON file with MergeOptions fields")
+    submit.add_argument("--detach", action="store_true",
+                        help="print the job id and return without waiting")
+    submit.add_argument("--wait", type=float, default=0.0,
+                        help="retry for up to N seconds while the daemon is busy")
+    submit.add_argument("--json", action="store_true", help="print the result as JSON")
+    status = commands.add_parser("status", help="show one job or all jobs")
+    status.add_argument("job_id", nargs="?", default="")
+    watch = commands.add_parser("watch", help="follow a submitted job")
+    watch.add_argument("job_id")
+    watch.add_argument("--json", action="store_true", help="print the result as JSON")
+    cancel = commands.add_parser("cancel", help="cancel a queued or running job")
+    cancel.add_argument("job_id")
+    commands.add_parser("ping", help="check that the daemon is running")
+    shutdown = commands.add_parser("shutdown", help="stop the daemon")
+    shutdown.add_argument("--cancel", action="store_true",
+                          help="cancel running jobs instead of letting them finish")
+    args = parser.parse_args(argv)
+
+    client = DaemonClient(args.socket)
+    try:
+        if args.command == "submit":
+            try:
+                spec = load_job(args.spec, args.output or "")
+                options: Dict = {}
+                if args.options:
+                    with open(args.options, "r", encoding="utf-8") as f:
+                        options = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"error: {e}", file=sys.stderr)
+                return 2
+            if args.detach:
+                print(client.submit(spec, options))
+                return 0
+            return _follow(client, client.run(spec, options, wait=args.wait), args.json)
+        if args.command == "watch":
+            return _follow(client, client.watch(args.job_id), args.json, args.job_id)
+        if args.command == "status":
+            print(json.dumps(client.status(args.job_id), indent=2))
+        elif args.command == "cancel":
+            print(client.cancel(args.job_id))
+        elif args.command == "ping":
+            print(json.dumps(client.ping(), indent=2))
+        elif args.command == "shutdown":
+            client.shutdown(args.cancel)
+        return 0
+    except DaemonError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_NO_DAEMON if isinstance(e, (DaemonBusy, DaemonUnavailable)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+# core/doc_pool.py
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Tuple
+
+from PyPDF2 import PdfReader
+
+from core.fd_budget import get_file_budget
+
+
+# ---------------------------------------------------------------------------
+# Process-wide pool of open document handles
+#
+# The same PDF is opened by the add-files readability check, the page-range
+# validator, the hover preview, the status bar and the merge. Handles are
+# kept here between those uses, keyed by (path, size, mtime), so a file is
+# parsed once per session until it changes on disk.
+#
+# Handles are checked out exclusively: acquire() removes a handle from the
+# pool and release() puts it back (or closes it). Two users never share a
+# handle at the same time, so PyPDF2 readers are safe across threads.
+#
+# Idle handles must not keep their files open (on Windows an open file
+# cannot be renamed or deleted): an idle PyPDF2 reader's file is parked in
+# the file budget and reopens on the next read, and an idle PyMuPDF
+# document, which cannot give up its file, is closed after idle_seconds.
+# ---------------------------------------------------------------------------
+
+PYPDF2 = "pypdf2"
+FITZ = "fitz"
+
+DEFAULT_MAX_HANDLES = 32
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_IDLE_SECONDS = 10.0
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    idle_handles: int = 0
+    idle_bytes: int = 0
+    checked_out: int = 0
+
+
+@dataclass
+class _Entry:
+    path: str
+    stamp: Tuple[int, int]  # (size, mtime_ns)
+    kind: str
+    handle: Any
+    file: Any = None  # underlying file object for PyPDF2 readers
+    idle_since: float = 0.0  # time.monotonic() when last released
+
+    @property
+    def cost(self) -> int:
+        # File size is a cheap stand-in for the memory a parsed handle holds
+        return self.stamp[0]
+
+    def close(self) -> None:
+        try:
+            if self.kind == FITZ:
+                self.handle.close()
+            elif self.file is not None:
+                self.file.close()
+        except Exception:
+            pass
+
+
+def _stamp(path: str) -> Tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _open(path: str, stamp: Tuple[int, int], kind: str) -> _Entry:
+    if kind == FITZ:
+        import fitz  # PyMuPDF
+        return _Entry(path, stamp, kind, fitz.open(path))
+    if kind != PYPDF2:
+        raise ValueError(f"Unknown document kind '{kind}'")
+    # Counted against the process-wide file-descriptor budget, so idle
+    # pooled readers give up their OS handle when inputs need it
+    f = get_file_budget().open(path)
+    try:
+        return _Entry(path, stamp, kind, PdfReader(f), f)
+    except Exception:
+        f.close()
+        raise
+
+
+class DocumentPool:
+    """LRU pool of open PyPDF2 readers and PyMuPDF documents."""
+
+    def __init__(self, max_handles: int = DEFAULT_MAX_HANDLES,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 idle_seconds: float = DEFAULT_IDLE_SECONDS) -> None:
+        self.max_handles = max_handles
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._idle: List[_Entry] = []  # least recently used first
+        self._out: dict = {}  # id(handle) -> entry
+        self._lock = threading.Lock()
+        self._stats = PoolStats()
+        self._timer: Optional[threading.Timer] = None
+
+    def configure(self, max_handles: Optional[int] = None,
+                  max_bytes: Optional[int] = None,
+                  idle_seconds: Optional[float] = None) -> None:
+        """Change the budgets; 0 disables pooling (every release closes)."""
+        with self._lock:
+            if max_handles is not None:
+                self.max_handles = max(0, int(max_handles))
+            if max_bytes is not None:
+                self.max_bytes = max(0, int(max_bytes))
+            if idle_seconds is not None:
+                self.idle_seconds = max(0.0, float(idle_seconds))
+            closing = self._trim()
+        for entry in closing:
+            entry.close()
+
+    # ------------------------------------------------------------------
+    # Checkout
+    # ------------------------------------------------------------------
+
+    def acquire(self, path: str, kind: str = PYPDF2):
+        """Return an open handle for ``path`` for exclusive use."""
+        path = os.path.abspath(path)
+        stamp = _stamp(path)
+        closing = []
+        found = None
+        with self._lock:
+            for entry in list(self._idle):
+                if entry.path != path:
+                    continue
+                if entry.stamp != stamp:
+                    # The file changed on disk since this handle was opened
+                    self._idle.remove(entry)
+                    closing.append(entry)
+                    self._stats.invalidations += 1
+                elif found is None and entry.kind == kind:
+                    found = entry
+            if found is not None:
+                self._idle.remove(found)
+                self._stats.hits += 1
+            else:
+                self._stats.misses += 1
+        for entry in closing:
+            entry.close()
+
+        if found is None:
+            found = _open(path, stamp, kind)
+        with self._lock:
+            self._out[id(found.handle)] = found
+        return found.handle
+
+    def release(self, handle, reusable: bool = True) -> None:
+        """
+        Return a handle from acquire(). Pass ``reusable=False`` when the
+        caller modified the parsed document (e.g. rotated PyPDF2 pages in
+        place); such handles are closed instead of pooled.
+        """
+        with self._lock:
+            entry = self._out.pop(id(handle), None)
+        if entry is None:
+            return
+        try:
+            current = _stamp(entry.path)
+        except OSError:
+            current = None
+        if not reusable or current != entry.stamp:
+            entry.close()
+            return
+        if entry.file is not None:
+            get_file_budget().park(entry.file)
+        entry.idle_since = time.monotonic()
+        with self._lock:
+            self._idle.append(entry)
+            closing = self._trim()
+            if entry.kind == FITZ:
+                self._schedule_expiry()
+        for old in closing:
+            old.close()
+
+    @contextmanager
+    def reader(self, path: str, reusable: bool = True) -> Iterator[PdfReader]:
+        """Pooled PyPDF2 reader for read-only use."""
+        handle = self.acquire(path, PYPDF2)
+        try:
+            yield handle
+        finally:
+            self.release(handle, reusable)
+
+    @contextmanager
+    def fitz_document(self, path: str) -> Iterator[Any]:
+        """Pooled PyMuPDF document for read-only use (e.g. rendering)."""
+        handle = self.acquire(path, FITZ)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """Close idle handles for one path, or all of them."""
+        target = os.path.abspath(path) if path is not None else None
+        with self._lock:
+            closing = [e for e in self._idle if target is None or e.path == target]
+            self._idle = [e for e in self._idle if e not in closing]
+            self._stats.invalidations += len(closing)
+        for entry in closing:
+            entry.close()
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            return PoolStats(
+                hits=self._stats.hits,
+                misses=self._stats.misses,
+                evictions=self._stats.evictions,
+                invalidations=self._stats.invalidations,
+                idle_handles=len(self._idle),
+                idle_bytes=sum(e.cost for e in self._idle),
+                checked_out=len(self._out),
+            )
+
+    def _schedule_expiry(self) -> None:
+        """Arm the idle timer for the oldest idle PyMuPDF document (lock held)."""
+        if self._timer is not None:
+            return
+        pending = [e.idle_since for e in self._idle if e.kind == FITZ]
+        if not pending:
+            return
+        delay = max(0.0, min(pending) + self.idle_seconds - time.monotonic())
+        self._timer = threading.Timer(delay, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self) -> None:
+        """Close PyMuPDF documents idle for idle_seconds or longer."""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            self._timer = None
+            closing = [e for e in self._idle if e.kind == FITZ and e.idle_since <= deadline]
+            self._idle = [e for e in self._idle if e not in closing]
+            self._stats.evictions += len(closing)
+            self._schedule_expiry()
+        for entry in closing:
+            entry.close()
+
+    def _trim(self) -> List[_Entry]:
+        """Drop least recently used idle handles until within budget (lock held)."""
+        closing = []
+        total = sum(e.cost for e in self._idle)
+        while self._idle and (len(self._idle) > self.max_handles or total > self.max_bytes):
+            entry = self._idle.pop(0)
+            total -= entry.cost
+            closing.append(entry)
+            self._stats.evictions += 1
+        return closing
+
+
+_pool = DocumentPool()
+
+
+def get_document_pool() -> DocumentPool:
+    """The process-wide pool shared by the GUI, validation and merge."""
+    return _pool
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+# core/engine_compare.py
+#
+# Run the same merge job through every merge engine and check that the
+# outputs agree on page count and per-page geometry, reporting throughput.
+#
+#   python -m core.engine_compare a.pdf b.pdf scan.png [--options opts.json] [--repeat 3]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+from core.pdf_merger import MERGE_ENGINES, FileEntry, MergeOptions, merge_files
+from core.geometry import FileGeometry, scan_pdf
+from core.jobs import options_from_dict
+
+TOLERANCE = 0.5  # points
+
+
+@dataclass
+class EngineResult:
+    engine: str
+    seconds: float
+    pages: int
+    geometry: Optional[FileGeometry] = None
+    error: str = ""
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+
+def _run_engine(engine: str, files: List[FileEntry], options: MergeOptions,
+                repeat: int, workdir: str) -> EngineResult:
+    output_path = os.path.join(workdir, f"{engine}.pdf")
+    engine_options = replace(options, merge_engine=engine)
+    best = None
+    try:
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            merge_files(files, output_path, engine_options)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        geometry = scan_pdf(output_path)
+    except Exception as e:
+        return EngineResult(engine, best or 0.0, 0, error=str(e))
+    return EngineResult(engine, best, geometry.page_count, geometry)
+
+
+def compare_geometry(reference: FileGeometry, other: FileGeometry,
+                     tolerance: float = TOLERANCE) -> List[str]:
+    """
+    Human-readable differences between two outputs; empty if equivalent.
+    Pages are compared by their visible (CropBox) size: a scaled PyMuPDF
+    page is only as large as the area it shows, while the PyPDF2 engine
+    scales the MediaBox around it.
+    """
+    if reference.page_count != other.page_count:
+        return [f"page count {reference.page_count} != {other.page_count}"]
+    problems = []
+    for index, (a, b) in enumerate(zip(reference.pages, other.pages)):
+        if (
+            abs(a.crop_width - b.crop_width) > tolerance
+            or abs(a.crop_height - b.crop_height) > tolerance
+            or a.rotation != b.rotation
+        ):
+            problems.append(
+                f"page {index + 1}: {a.crop_width:g}x{a.crop_height:g} rot {a.rotation} != "
+                f"{b.crop_width:g}x{b.crop_height:g} rot {b.rotation}"
+            )
+    return problems
+
+
+def compare_engines(files: List[FileEntry], options: MergeOptions,
+                    repeat: int = 1, engines: Optional[List[str]] = None) -> Dict:
+    # The default engine is the reference the others are checked against
+    engines = engines or ["pypdf2"] + sorted(set(MERGE_ENGINES) - {"pypdf2"})
+    # Outputs are inspected with PyPDF2, which cannot open AES-256 files;
+    # encryption is a final-save step and does not change page geometry.
+    options = replace(options, encrypt_enabled=False)
+
+    with tempfile.TemporaryDirectory(prefix="combinepdfs_compare_") as workdir:
+        results = [_run_engine(name, files, options, repeat, workdir) for name in engines]
+
+    reference = results[0]
+    mismatches = {}
+    for result in results[1:]:
+        if result.error or reference.error:
+            continue
+        problems = compare_geometry(reference.geometry, result.geometry)
+        if problems:
+            mismatches[result.engine] = problems
+
+    return {
+        "reference": reference.engine,
+        "engines": [
+            {
+                "engine": r.engine,
+                "seconds": round(r.seconds, 4),
+                "pages": r.pages,
+                "pages_per_second": round(r.pages_per_second, 1),
+                "error": r.error,
+            }
+            for r in results
+        ],
+        "mismatches": mismatches,
+        "equivalent": not mismatches and not any(r.error for r in results),
+    }
+
+
+def _load_options(path: Optional[str]) -> MergeOptions:
+    if not path:
+        return MergeOptions()
+    with open(path, "r", encoding="utf-8") as f:
+        return options_from_dict(json.load(f))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.engine_compare",
+        description="Merge the same inputs with each engine and compare the results.",
+    )
+    parser.add_argument("files", nargs="+", help="PDF or image inputs, in merge order")
+    parser.add_argument("--options", help="JSON file with MergeOptions fields")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per engine; best time is reported")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = compare_engines(
+        [FileEntry(path) for path in args.files], _load_options(args.options), args.repeat
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for r in report["engines"]:
+            status = f"ERROR: {r['error']}" if r["error"] else (
+                f"{r['pages']} pages  {r['seconds']:.3f}s  {r['pages_per_second']:.1f} pages/s"
+            )
+            print(f"{r['engine']:<10} {status}")
+        for engine, problems in report["mismatches"].items():
+            print(f"\n{engine} differs from {report['reference']}:")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+            if len(problems) > 20:
+                print(f"  ... {len(problems) - 20} more")
+        print("\nequivalent" if report["equivalent"] else "\nNOT equivalent")
+
+    return 0 if report["equivalent"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
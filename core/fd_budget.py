@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+# core/fd_budget.py
+
+import mmap
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+# ---------------------------------------------------------------------------
+# File-descriptor budget
+#
+# Parsed PyPDF2 readers keep their input file open because stream data is
+# read lazily. With thousands of inputs that exceeds the process ulimit, so
+# inputs are opened through BudgetedFile: a read-only file proxy whose OS
+# handle may be closed ("parked") whenever the budget is exceeded and is
+# reopened transparently, at the same position, on the next read.
+#
+# With FileBudget.use_mmap set, handles are (re)opened as read-only memory
+# maps instead of buffered files: PyPDF2's many small seeks and reads
+# become slices of the mapping, with no system call or buffer refill, and
+# the OS page cache holds the data. Time spent in reads is counted either
+# way so the two can be compared.
+# ---------------------------------------------------------------------------
+
+def _default_max_open() -> int:
+    """A quarter of the soft descriptor limit (between 16 and 256)."""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        return 256  # Windows: no rlimit, the CRT allows far more
+    if soft == resource.RLIM_INFINITY:
+        return 256
+    return max(16, min(256, soft // 4))
+
+
+DEFAULT_MAX_OPEN = _default_max_open()
+
+
+@dataclass
+class BudgetStats:
+    max_open: int
+    open_now: int
+    peak_open: int
+    opens: int
+    reopens: int
+    parked: int
+    # Bytes returned by read()/readline() and the time spent in them
+    bytes_read: int = 0
+    read_seconds: float = 0.0
+    mapped: bool = False
+
+
+def _map_file(f):
+    """A read-only mmap of an open file, or None (empty or unmappable)."""
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+class BudgetedFile:
+    """Binary read-only file proxy that counts against a FileBudget."""
+
+    mode = "rb"
+
+    def __init__(self, path: str, budget: "FileBudget") -> None:
+        self.name = path
+        self._budget = budget
+        self._file = None
+        self._pos = 0
+        self._opened_before = False
+        self.closed = False
+        # Read counters, folded into the budget when the handle is parked
+        # or closed
+        self._bytes_read = 0
+        self._read_seconds = 0.0
+        # Held while the handle is in use so another thread never parks it
+        # mid-read
+        self._io_lock = threading.Lock()
+        with self._io_lock:
+            self._activate()
+
+    def _activate(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        if self._file is None:
+            self._budget._opening(self)
+            f = open(self.name, "rb")
+            if self._budget.use_mmap:
+                mapped = _map_file(f)
+                if mapped is not None:
+                    # The mapping keeps its own reference to the file
+                    f.close()
+                    f = mapped
+            self._file = f
+            self._file.seek(self._pos)
+            if self._opened_before:
+                self._budget._count_reopen()
+            self._opened_before = True
+        return self._file
+
+    def _try_park(self) -> bool:
+        """
+        Close the OS handle but remember the position. Called with the
+        budget lock held; gives up if the handle is busy in another thread.
+        """
+        if not self._io_lock.acquire(blocking=False):
+            return False
+        try:
+            if self._file is not None:
+                self._pos = self._file.tell()
+                self._file.close()
+                self._file = None
+            # The budget lock is already held here
+            self._budget._bytes_read += self._bytes_read
+            self._budget._read_seconds += self._read_seconds
+            self._bytes_read = 0
+            self._read_seconds = 0.0
+            return True
+        finally:
+            self._io_lock.release()
+
+    # File API used by PyPDF2 ------------------------------------------------
+
+    def read(self, size: int = -1) -> bytes:
+        with self._io_lock:
+            start = time.perf_counter()
+            data = (self._file or self._activate()).read(size)
+            self._read_seconds += time.perf_counter() - start
+            self._bytes_read += len(data)
+            return data
+
+    def readline(self, size: int = -1) -> bytes:
+        with self._io_lock:
+            start = time.perf_counter()
+            f = self._file or self._activate()
+            # mmap.readline() takes no size
+            data = f.readline(size) if size >= 0 else f.readline()
+            self._read_seconds += time.perf_counter() - start
+            self._bytes_read += len(data)
+            return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        with self._io_lock:
+            f = self._file or self._activate()
+            f.seek(offset, whence)
+            return f.tell()  # mmap.seek() returns None before Python 3.13
+
+    def tell(self) -> int:
+        with self._io_lock:
+            if self._file is None:
+                return self._pos
+            return self._file.tell()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self._budget._closing(self)
+        with self._io_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._budget._count_reads(self._bytes_read, self._read_seconds)
+            self._bytes_read = 0
+            self._read_seconds = 0.0
+            self.closed = True
+
+    def __enter__(self) -> "BudgetedFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class FileBudget:
+    """
+    Keeps at most ``max_open`` BudgetedFile handles open at once. When a
+    file needs its handle and the budget is full, the least recently
+    opened one is parked.
+    """
+
+    def __init__(self, max_open: int = DEFAULT_MAX_OPEN, use_mmap: bool = False) -> None:
+        self.max_open = max(1, int(max_open))
+        self.use_mmap = use_mmap
+        self._open: "OrderedDict[int, BudgetedFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._peak = 0
+        self._opens = 0
+        self._reopens = 0
+        self._parked = 0
+        self._bytes_read = 0
+        self._read_seconds = 0.0
+
+    def configure(self, max_open: Optional[int] = None,
+                  use_mmap: Optional[bool] = None) -> None:
+        """
+        Set the limit (0 restores the default derived from the ulimit) and
+        whether handles are memory maps. Changing the backing parks every
+        open handle, so pooled readers reopen with the new one.
+        """
+        with self._lock:
+            if max_open is not None:
+                self.max_open = max(1, int(max_open) or DEFAULT_MAX_OPEN)
+            if use_mmap is not None and bool(use_mmap) != self.use_mmap:
+                self.use_mmap = bool(use_mmap)
+                self._evict(0)
+            self._evict(self.max_open)
+
+    def open(self, path: str) -> BudgetedFile:
+        return BudgetedFile(path, self)
+
+    def stats(self) -> BudgetStats:
+        with self._lock:
+            # Counters of open handles are read without their I/O lock;
+            # a read in progress is counted by the next call
+            bytes_read = self._bytes_read + sum(h._bytes_read for h in self._open.values())
+            read_seconds = self._read_seconds + sum(
+                h._read_seconds for h in self._open.values()
+            )
+            return BudgetStats(
+                max_open=self.max_open,
+                open_now=len(self._open),
+                peak_open=self._peak,
+                opens=self._opens,
+                reopens=self._reopens,
+                parked=self._parked,
+                bytes_read=bytes_read,
+                read_seconds=read_seconds,
+                mapped=self.use_mmap,
+            )
+
+    def park(self, handle: BudgetedFile) -> None:
+        """
+        Close a handle's OS file now, e.g. while its reader sits idle in
+        the document pool; it reopens transparently on the next read.
+        """
+        with self._lock:
+            if id(handle) in self._open and handle._try_park():
+                del self._open[id(handle)]
+                self._parked += 1
+
+    def reset_peak(self) -> None:
+        with self._lock:
+            self._peak = len(self._open)
+
+    # Called by BudgetedFile --------------------------------------------------
+
+    def _opening(self, handle: BudgetedFile) -> None:
+        with self._lock:
+            self._evict(self.max_open - 1)
+            self._open[id(handle)] = handle
+            self._opens += 1
+            self._peak = max(self._peak, len(self._open))
+
+    def _closing(self, handle: BudgetedFile) -> None:
+        with self._lock:
+            self._open.pop(id(handle), None)
+
+    def _count_reads(self, nbytes: int, seconds: float) -> None:
+        if nbytes or seconds:
+            with self._lock:
+                self._bytes_read += nbytes
+                self._read_seconds += seconds
+
+    def _count_reopen(self) -> None:
+        with self._lock:
+            self._reopens += 1
+
+    def _evict(self, limit: int) -> None:
+        # Oldest first; handles busy in another thread are skipped, so the
+        # budget can be exceeded briefly under heavy concurrency
+        excess = len(self._open) - max(0, limit)
+        for key, handle in list(self._open.items()):
+            if excess <= 0:
+                break
+            if handle._try_park():
+                del self._open[key]
+                self._parked += 1
+                excess -= 1
+
+
+_budget = FileBudget()
+
+
+def get_file_budget() -> FileBudget:
+    """The process-wide budget shared by the document pool and merges."""
+    return _budget
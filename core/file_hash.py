@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+# core/file_hash.py
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from core.settings import make_private_dir
+
+_HASH_CHUNK = 1024 * 1024
+
+
+# ---------------------------------------------------------------------------
+# Content hashes of input files
+#
+# SHA-256 of a file's bytes, remembered per (path, size, mtime) in a JSON
+# index so unchanged inputs are not read again, across runs too. Used by
+# the caches that key work by input content. The index lists the user's
+# document paths, so its directory is kept private like the caches.
+# ---------------------------------------------------------------------------
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path: str, data: dict) -> None:
+    """Replace a JSON file atomically (safe against concurrent writers)."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class HashIndex:
+    def __init__(self, index_path: str) -> None:
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._hashes: Optional[Dict[str, list]] = None
+
+    def content_hash(self, path: str) -> str:
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = read_json(self.index_path)
+            known = self._hashes.get(path)
+        if known and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            # Other processes may have added entries since it was read
+            self._hashes = {**read_json(self.index_path), **self._hashes}
+            self._hashes[path] = [st.st_size, st.st_mtime_ns, value]
+            make_private_dir(os.path.dirname(os.path.abspath(self.index_path)))
+            write_json(self.index_path, self._hashes)
+        return value
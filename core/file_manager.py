@@ -2,18 +2,28 @@
 
 from pathlib import Path
 from typing import List, Dict, Tuple
-import PyPDF2
+
+from core.doc_pool import get_document_pool
 
 SUPPORTED_EXTS = (
     '.pdf', '.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.tif'
 )
 
 
-def is_pdf_readable(path: str) -> Tuple[bool, str | None]:
-    """Return (True, None) if readable, (False, error_message) if not."""
+def is_pdf_readable(path: str, catalog=None) -> Tuple[bool, str | None]:
+    """
+    Return (True, None) if readable, (False, error_message) if not.
+    With the GUI's DocumentCatalog the answer comes from its table, and the
+    file is only parsed when it is new or changed since it was catalogued.
+    """
+    if catalog is not None:
+        entry = catalog.ensure(path)
+        if entry is not None and entry.encrypted:
+            return False, entry.error or "Encrypted PDF"
+        return True, None
     try:
-        with open(path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
+        # The parsed reader stays pooled for the preview, validator and merge
+        with get_document_pool().reader(path) as reader:
             if reader.is_encrypted:
                 return False, "Encrypted PDF"
         return True, None
@@ -44,11 +54,13 @@ def add_file(file_list: List[Dict], path: str) -> bool:
 
 def add_files_to_list(
     file_list: List[Dict],
-    paths: List[str]
+    paths: List[str],
+    catalog=None,
 ) -> Tuple[int, int, List[str], int, List[str]]:
     """
     Add multiple files and return:
     (added_count, duplicate_count, duplicate_names, unsupported_count, unsupported_names)
+    ``catalog`` is passed on to is_pdf_readable.
     """
 
     added_count = 0
@@ -70,7 +82,7 @@ def add_files_to_list(
 
         # PDF readability check
         if lower.endswith(".pdf"):
-            ok, err = is_pdf_readable(file)
+            ok, err = is_pdf_readable(file, catalog)
             if not ok:
                 unsupported_count += 1
                 unsupported_files.append(Path(file).name)
@@ -0,0 +1,577 @@
+from __future__ import annotations
+
+# core/fitz_merger.py
+
+import io
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from core.pdf_merger import IMAGE_EXTS, FileEntry, MergeOptions, MergeReport
+from core.page_ops import parse_page_range, render_filename_page
+from core.blank_pages import analyse_fitz_page
+from core.raster_blank import blank_pages
+from core.image_tools import image_to_pdf
+from core.image_cache import image_pdf
+from core.watermark import render_watermark
+from core.toc import insert_toc_into_document
+from core.doc_pool import FITZ, get_document_pool
+from core.segment_cache import open_prepass_journal, open_segment_store
+from core.page_cache import open_page_cache, page_transform_hash
+from core.progress import (
+    STAGE_PAGES,
+    STAGE_PREPARE,
+    STAGE_TOC,
+    STAGE_WRITE,
+    ProgressEvent,
+    ProgressTracker,
+)
+
+
+# ---------------------------------------------------------------------------
+# Page helpers
+# ---------------------------------------------------------------------------
+
+QUALITY_MAP = {"Low": 95, "Medium": 75, "High": 50, "Maximum": 30}
+
+
+def _compress_images(doc, page, quality: int, done: set) -> int:
+    """
+    Recompress a page's images as JPEG, keeping the result only if smaller.
+    Returns the number of images replaced.
+    """
+    replaced = 0
+    for image in page.get_images(full=True):
+        xref = image[0]
+        if xref in done:
+            continue
+        done.add(xref)
+        try:
+            info = doc.extract_image(xref)
+            if not info or info.get("smask"):
+                continue
+            img = Image.open(io.BytesIO(info["image"]))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            output = io.BytesIO()
+            img.save(output, format="JPEG", quality=quality, optimize=True)
+            if len(output.getvalue()) < len(info["image"]):
+                page.replace_image(xref, stream=output.getvalue())
+                replaced += 1
+        except Exception:
+            # Never break the merge due to compression failure
+            pass
+    return replaced
+
+
+def _insert_scaled(out_doc, src_doc, index: int, target_width: float,
+                   target_height: float, rotation: int) -> None:
+    """
+    Append a target-sized page that shows the source page's content centered
+    and scaled to fit, then apply the page's combined rotation (like
+    page_ops.scale_page, the MediaBox is resized in unrotated space).
+    """
+    work = fitz.open()
+    work.insert_pdf(src_doc, from_page=index, to_page=index)
+    work[0].set_rotation(0)
+    page = out_doc.new_page(width=target_width, height=target_height)
+    page.show_pdf_page(page.rect, work, 0, keep_proportion=True)
+    page.set_rotation(rotation)
+    work.close()
+
+
+def _visible_rect(src_page):
+    """The page's CropBox in PDF space (unrotated, y up)."""
+    # Page.cropbox is unrotated but measured down from the MediaBox top
+    crop, media = src_page.cropbox, src_page.mediabox
+    return fitz.Rect(crop.x0, media.y1 - crop.y1, crop.x1, media.y1 - crop.y0)
+
+
+def _scaled_size(src_page, scale: float) -> Tuple[float, float]:
+    """
+    The size of a page scaled uniformly by ``scale``: like page_ops
+    scale_page, every box shrinks with the content, so the visible area
+    keeps its own aspect ratio and is not padded out to the target.
+    """
+    visible = _visible_rect(src_page)
+    return visible.width * scale, visible.height * scale
+
+
+def _fit_matrix(src_page, target_width: float, target_height: float) -> Tuple[float, ...]:
+    """
+    The PDF-space transform _insert_scaled gives a source page's content:
+    its visible area scaled uniformly to fit and centered on the target.
+    """
+    visible = _visible_rect(src_page)
+    scale = min(target_width / visible.width, target_height / visible.height)
+    return (
+        scale, 0.0, 0.0, scale,
+        (target_width - visible.width * scale) / 2 - visible.x0 * scale,
+        (target_height - visible.height * scale) / 2 - visible.y0 * scale,
+    )
+
+
+def _pdf_numbers(values) -> str:
+    return " ".join(f"{v:.4f}".rstrip("0").rstrip(".") for v in values)
+
+
+def _carry_links(doc, src_doc, placed: List[Tuple[int, int, Optional[tuple]]]) -> None:
+    """
+    Copy the link annotations of one input's pages into doc. ``placed``
+    holds (page number in doc, source page index, PDF-space matrix or None)
+    for every page added. Pages are inserted one at a time, which keeps
+    their external links but drops links to other pages of the same input,
+    and scaled pages lose all of them; these are recreated here. Links to
+    pages that were not selected are dropped.
+    """
+    moved: Dict[int, Tuple[int, Optional[tuple]]] = {}
+    for number, index, matrix in placed:
+        moved.setdefault(index, (number, matrix))
+    for number, index, matrix in placed:
+        annots = []
+        for link in src_doc[index].get_links():
+            kind = link["kind"]
+            if kind == fitz.LINK_GOTO and link.get("page", -1) in moved:
+                target_number, target_matrix = moved[link["page"]]
+                action = "/Dest " + _goto_dest(
+                    src_doc, link["xref"], doc[target_number].xref, target_matrix
+                )
+            elif kind == fitz.LINK_URI and matrix is not None:
+                action = f"/A << /S /URI /URI {fitz.get_pdf_str(link['uri'])} >>"
+            else:
+                continue  # kept by insert_pdf, or its target is not in the output
+            rect = fitz.Rect(*_raw_numbers(src_doc.xref_get_key(link["xref"], "Rect")))
+            if matrix is not None:
+                rect = rect * fitz.Matrix(*matrix)
+            xref = doc.get_new_xref()
+            doc.update_object(xref, (
+                f"<< /Type /Annot /Subtype /Link /Rect [{_pdf_numbers(rect)}]"
+                f" /Border [0 0 0] {action} >>"
+            ))
+            annots.append(f"{xref} 0 R")
+        if annots:
+            page = doc[number]
+            kind, value = doc.xref_get_key(page.xref, "Annots")
+            existing = value.strip("[]") if kind == "array" else ""
+            doc.xref_set_key(page.xref, "Annots", f"[{existing} {' '.join(annots)}]")
+
+
+def _raw_numbers(key) -> List[float]:
+    return [float(v) for v in key[1].strip("[]").split()]
+
+
+def _goto_dest(src_doc, link_xref: int, page_xref: int, matrix: Optional[tuple]) -> str:
+    """A link's explicit /XYZ destination moved to page_xref; else /Fit."""
+    for key in ("Dest", "A/D"):
+        kind, value = src_doc.xref_get_key(link_xref, key)
+        if kind == "array":
+            break
+    else:
+        return f"[{page_xref} 0 R /Fit]"
+    tokens = value.strip("[]").replace("/", " /").split()
+    if len(tokens) != 7 or tokens[3] != "/XYZ":
+        return f"[{page_xref} 0 R /Fit]"
+    left, top, zoom = tokens[4:]
+    if matrix is not None:
+        if left != "null":
+            left = _pdf_numbers([float(left) * matrix[0] + matrix[4]])
+        if top != "null":
+            top = _pdf_numbers([float(top) * matrix[3] + matrix[5]])
+    return f"[{page_xref} 0 R /XYZ {left} {top} {zoom}]"
+
+
+def _single_page_pdf(doc) -> bytes:
+    """The document's last page as a standalone PDF, for the page cache."""
+    single = fitz.open()
+    single.insert_pdf(doc, from_page=doc.page_count - 1, to_page=doc.page_count - 1)
+    data = single.tobytes(garbage=3, deflate=True)
+    single.close()
+    return data
+
+
+def _insert_cached_page(doc, data: Optional[bytes]) -> bool:
+    """Append a page-cache entry to doc; False if missing or unreadable."""
+    if data is None:
+        return False
+    try:
+        cached = fitz.open("pdf", data)
+    except Exception:
+        return False
+    try:
+        if cached.page_count != 1:
+            return False
+        doc.insert_pdf(cached)
+        return True
+    finally:
+        cached.close()
+
+
+# ---------------------------------------------------------------------------
+# Merge engine
+# ---------------------------------------------------------------------------
+
+def merge_files_fitz(
+    files: List[FileEntry],
+    output_path: str,
+    options: MergeOptions,
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    cancel_callback: Optional[Callable[[], bool]] = None,
+    event_callback: Optional[Callable[[ProgressEvent], None]] = None,
+):
+    """
+    PyMuPDF merge engine. Same inputs, options and output layout as the
+    PyPDF2 engine in core.pdf_merger; the whole job is built in one fitz
+    document and written with a single save (including encryption).
+    """
+    def cancelled():
+        return cancel_callback and cancel_callback()
+
+    progress = ProgressTracker(event_callback, len(files))
+
+    temp_pdf_files = []
+    sources = []
+    resumed_segments = 0
+    pool = get_document_pool()
+    checked_out = []  # pooled documents currently in use
+
+    def open_source(pdf_path):
+        # Temp PDFs made from images are opened directly; inputs (and
+        # cached image conversions) go through the document pool
+        if pdf_path in temp_pdf_files:
+            return fitz.open(pdf_path)
+        src = pool.acquire(pdf_path, FITZ)
+        checked_out.append(src)
+        return src
+
+    def close_source(src):
+        # Sources are only read from, so pooled ones can always go back.
+        # Each input is open only while it is being read, so the number of
+        # open files does not grow with the number of inputs.
+        if any(src is doc for doc in checked_out):
+            checked_out[:] = [doc for doc in checked_out if doc is not src]
+            pool.release(src)
+        else:
+            src.close()
+
+    max_width = 0.0
+    max_height = 0.0
+
+    try:
+        # ------------------------------------------------------------------
+        # Prepass: select pages and find max page size
+        # ------------------------------------------------------------------
+        progress.stage_start(STAGE_PREPARE)
+        journal = open_prepass_journal(files, options)
+        pages_total = 0
+        for i, entry in enumerate(files):
+            if cancelled():
+                raise RuntimeError("Merge cancelled")
+            if progress_callback:
+                progress_callback(i, len(files), f"Preparing: {os.path.basename(entry.path)}")
+            progress.file_started(i, entry.path)
+
+            is_image = entry.path.lower().endswith(IMAGE_EXTS)
+            pdf_path = entry.path
+            if is_image and options.image_cache_dir:
+                pdf_path, temporary = image_pdf(entry.path, options.image_cache_dir)
+                if temporary:
+                    temp_pdf_files.append(pdf_path)
+            elif is_image:
+                pdf_path = image_to_pdf(entry.path)
+                temp_pdf_files.append(pdf_path)
+
+            src = open_source(pdf_path)
+            try:
+                total_pages = src.page_count
+                try:
+                    page_indices = parse_page_range(entry.page_range, total_pages)
+                except ValueError as e:
+                    raise ValueError(
+                        f"{Path(entry.path).name} (Total pages: {total_pages})\n\n{e}"
+                    )
+                if entry.reverse:
+                    page_indices = list(reversed(page_indices))
+
+                has_explicit_range = (
+                    entry.page_range and entry.page_range.strip().lower() not in ["all", ""]
+                )
+                # Inputs a resumed journal already holds need no blank
+                # analysis; their segment recorded their share of the
+                # scaling target
+                resumed = journal.completed(i) if journal is not None else None
+                if resumed is not None and resumed.size is not None:
+                    kept = list(page_indices)
+                elif options.delete_blank_pages and not has_explicit_range:
+                    blanks = blank_pages(
+                        pdf_path, page_indices, lambda idx: analyse_fitz_page(src[idx]),
+                        options, cancelled, engine="pymupdf", cache_path=entry.path,
+                    )
+                    kept = [idx for idx in page_indices if idx not in blanks]
+                else:
+                    kept = list(page_indices)
+
+                first_size = None
+                if total_pages > 0:
+                    box = src[0].mediabox
+                    first_size = (float(box.width), float(box.height))
+
+                size = (0.0, 0.0)
+                if resumed is not None and resumed.size is not None:
+                    size = resumed.size
+                    pages_total += resumed.pages
+                else:
+                    if not is_image:
+                        for idx in kept:
+                            box = src[idx].mediabox
+                            width, height = float(box.width), float(box.height)
+                            if entry.rotation in [90, 270]:
+                                width, height = height, width
+                            size = (max(size[0], width), max(size[1], height))
+                    pages_total += len(kept) + (1 if options.add_breaker_pages else 0)
+                max_width = max(max_width, size[0])
+                max_height = max(max_height, size[1])
+            finally:
+                close_source(src)
+
+            sources.append((entry, pdf_path, is_image, page_indices, kept, first_size, size))
+
+        # Finished inputs are kept as segments in the segment cache or the
+        # resumable journal, when either is enabled
+        journal = open_segment_store(files, options, (max_width, max_height), journal)
+
+        progress.pages_total = pages_total
+        progress.stage_end()
+
+        # ------------------------------------------------------------------
+        # Build the output document
+        # ------------------------------------------------------------------
+        out = fitz.open()
+        outline = []
+        file_toc_entries = []
+        compressed_xrefs = set()
+        quality = QUALITY_MAP.get(options.compression_level, 75)
+        watermark_text = options.watermark_text.strip() if options.watermark_enabled else ""
+        page_cache = open_page_cache(options)
+
+        def build_pages(target, entry, pdf_path, is_image, kept, first_size, xrefs) -> int:
+            """Append one input's breaker and pages to target; returns breaker pages."""
+            breaker_pages = 0
+            if options.add_breaker_pages:
+                if options.breaker_uniform_size or first_size is None:
+                    breaker_width, breaker_height = 612.0, 792.0
+                else:
+                    breaker_width, breaker_height = first_size
+                    if entry.rotation in [90, 270]:
+                        breaker_width, breaker_height = breaker_height, breaker_width
+                breaker = fitz.open(
+                    "pdf", render_filename_page(Path(entry.path).name, breaker_width, breaker_height)
+                )
+                target.insert_pdf(breaker)
+                breaker.close()
+                breaker_pages = 1
+                progress.page_done()
+
+            file_key = None
+            if page_cache is not None:
+                transform = page_transform_hash(
+                    options, entry.rotation, (max_width, max_height), "pymupdf"
+                )
+                if transform is not None:
+                    file_key = page_cache.file_key(entry.path, transform)
+
+            src = open_source(pdf_path)
+            try:
+                placed = []  # (page in target, source page, matrix) for _carry_links
+                for idx in kept:
+                    if cancelled():
+                        raise RuntimeError("Merge cancelled")
+                    fit = None
+                    if options.scaling_enabled and options.scaling_mode == "Percent":
+                        # Scale by percent (relative to current size)
+                        scale = max(1, min(100, options.scaling_percent)) / 100.0
+                        fit = _scaled_size(src[idx], scale)
+                    elif options.scaling_enabled and max_width > 0 and max_height > 0:
+                        # Fit within the target, as the PyPDF2 engine does:
+                        # the scale comes from the MediaBox, unrotated
+                        box = src[idx].mediabox
+                        scale = min(max_width / box.width, max_height / box.height)
+                        fit = _scaled_size(src[idx], scale)
+                    matrix = _fit_matrix(src[idx], *fit) if fit is not None else None
+                    placed.append((target.page_count, idx, matrix))
+
+                    cache_key = None
+                    if file_key is not None:
+                        cache_key = page_cache.page_key(file_key, idx)
+                        if _insert_cached_page(target, page_cache.get(cache_key)):
+                            progress.page_done()
+                            continue
+
+                    rotation = (src[idx].rotation + entry.rotation) % 360
+                    if fit is not None:
+                        _insert_scaled(target, src, idx, fit[0], fit[1], rotation)
+                    else:
+                        target.insert_pdf(src, from_page=idx, to_page=idx)
+                    page = target[target.page_count - 1]
+                    if page.rotation != rotation:
+                        page.set_rotation(rotation)
+
+                    if watermark_text:
+                        box = page.mediabox
+                        mark = fitz.open("pdf", render_watermark(
+                            float(box.width), float(box.height), watermark_text,
+                            options.watermark_opacity, options.watermark_font_size,
+                            options.watermark_rotation, options.watermark_position.lower(),
+                            options.watermark_safe_mode, options.watermark_font_color,
+                        ))
+                        rotation = page.rotation
+                        page.set_rotation(0)
+                        page.show_pdf_page(page.rect, mark, 0, overlay=True)
+                        page.set_rotation(rotation)
+                        mark.close()
+
+                    if options.compression_enabled:
+                        progress.images(_compress_images(target, page, quality, xrefs))
+                    if cache_key is not None:
+                        page_cache.put(cache_key, _single_page_pdf(target))
+                    progress.page_done()
+                _carry_links(target, src, placed)
+            finally:
+                close_source(src)
+            return breaker_pages
+
+        progress.stage_start(STAGE_PAGES)
+        for i, (entry, pdf_path, is_image, page_indices, kept, first_size, size) in enumerate(sources):
+            if cancelled():
+                raise RuntimeError("Merge cancelled")
+            if progress_callback:
+                progress_callback(i, len(files), entry.path)
+            progress.file_started(i, entry.path)
+
+            file_page_base = out.page_count
+            segment = journal.completed(i) if journal is not None else None
+            if segment is not None:
+                # Finished by an earlier run of the same job
+                resumed_segments += 1
+                breaker_pages = segment.breaker_pages
+                progress.page_done(segment.pages)
+                if segment.pages:
+                    done = fitz.open(segment.path)
+                    out.insert_pdf(done)
+                    done.close()
+            elif journal is not None:
+                # Build the input's pages in their own document and
+                # checkpoint them before they join the output
+                work = fitz.open()
+                try:
+                    breaker_pages = build_pages(
+                        work, entry, pdf_path, is_image, kept, first_size, set()
+                    )
+                    work.save(journal.begin(i), garbage=3, deflate=True)
+                except BaseException:
+                    journal.abandon(i)
+                    work.close()
+                    raise
+                journal.commit(i, work.page_count, breaker_pages, size)
+                out.insert_pdf(work)
+                work.close()
+            else:
+                breaker_pages = build_pages(
+                    out, entry, pdf_path, is_image, kept, first_size, compressed_xrefs
+                )
+
+            file_start_page = file_page_base + breaker_pages
+            if options.add_filename_bookmarks and len(page_indices) > 0:
+                outline.append([1, Path(entry.path).stem, file_start_page + 1])
+
+            if options.insert_toc and len(page_indices) > 0:
+                toc_entry = {"filename": Path(entry.path).name, "page": file_start_page}
+                if getattr(options, 'toc_fileinfo_mode', 'none') == 'fullpath':
+                    toc_entry["fullpath"] = str(Path(entry.path).resolve())
+                file_toc_entries.append(toc_entry)
+
+        if cancelled():
+            raise RuntimeError("Merge cancelled")
+        progress.stage_end()
+
+        if outline:
+            out.set_toc(outline)
+
+        # ------------------------------------------------------------------
+        # Metadata, TOC pages and the single final save
+        # ------------------------------------------------------------------
+        if options.metadata_enabled:
+            metadata = dict(out.metadata or {})
+            for key, attr in (("title", "pdf_title"), ("author", "pdf_author"),
+                              ("subject", "pdf_subject"), ("keywords", "pdf_keywords")):
+                value = getattr(options, attr)
+                if value.strip():
+                    metadata[key] = value
+            out.set_metadata(metadata)
+
+        if progress_callback:
+            progress_callback(len(files), len(files), "Writing combined PDF...")
+
+        if options.insert_toc and file_toc_entries:
+            toc_fileinfo_mode = getattr(options, 'toc_fileinfo_mode', 'none')
+            file_info_list = None
+            if toc_fileinfo_mode == "filename":
+                file_info_list = [str(Path(output_path).name)]
+            elif toc_fileinfo_mode == "fullpath":
+                file_info_list = [str(Path(output_path).resolve())]
+            progress.stage_start(STAGE_TOC)
+            insert_toc_into_document(out, file_toc_entries, file_info_list)
+            progress.stage_end()
+
+        # garbage=3 merges duplicate objects; 4 also compares stream
+        # contents, which stores identical fonts and images once (needed
+        # when pages came from the page cache, each with its own resources)
+        dedupe = options.dedupe_resources or page_cache is not None
+        save_kwargs = {"garbage": 4 if dedupe else 3, "deflate": True}
+        user_pw = getattr(options, "encrypt_user_pw", "")
+        owner_pw = getattr(options, "encrypt_owner_pw", "")
+        if getattr(options, "encrypt_enabled", False) and (user_pw or owner_pw):
+            save_kwargs.update(
+                encryption=fitz.PDF_ENCRYPT_AES_256,
+                owner_pw=owner_pw if owner_pw else user_pw,
+                user_pw=user_pw if user_pw else owner_pw,
+                permissions=fitz.PDF_PERM_ACCESSIBILITY | fitz.PDF_PERM_PRINT | fitz.PDF_PERM_COPY | fitz.PDF_PERM_ANNOTATE,
+            )
+        page_count = out.page_count
+        progress.stage_start(STAGE_WRITE)
+        # Saved under a temporary name and renamed, so a failed save leaves
+        # an existing output untouched
+        partial_output = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            out.save(partial_output, **save_kwargs)
+            out.close()
+            os.replace(partial_output, output_path)
+        except BaseException:
+            try:
+                os.remove(partial_output)
+            except OSError:
+                pass
+            raise
+        progress.bytes(os.path.getsize(output_path))
+        progress.stage_end()
+
+        if journal is not None:
+            journal.finish()
+
+        return MergeReport(
+            output_path, pages=page_count, output_bytes=os.path.getsize(output_path),
+            resumed_segments=resumed_segments, stages=list(progress.stages),
+            peak_rss_bytes=progress.peak_rss,
+        )
+
+    finally:
+        for src in list(checked_out):
+            close_source(src)
+        for temp_path in temp_pdf_files:
+            try:
+                os.remove(temp_path)
+            except Exception:
+                pass
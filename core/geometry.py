@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+# core/geometry.py
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.errors import PdfReadError
+from PyPDF2.generic import IndirectObject
+
+from core.doc_pool import get_document_pool
+
+
+# ---------------------------------------------------------------------------
+# Compact per-file geometry table
+# ---------------------------------------------------------------------------
+
+class PageBox(NamedTuple):
+    width: float
+    height: float
+    crop_width: float
+    crop_height: float
+    rotation: int
+
+
+@dataclass(frozen=True)
+class FileGeometry:
+    """Page sizes of one PDF, in page order, as read from the page tree."""
+    pages: Tuple[PageBox, ...]
+    # (idnum, generation) of each page object, for raw page copying
+    refs: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    def placed_size(self, index: int, rotation: int = 0) -> Tuple[float, float]:
+        """MediaBox size of a page after the merge rotation is applied."""
+        box = self.pages[index]
+        if rotation in (90, 270):
+            return box.height, box.width
+        return box.width, box.height
+
+
+LETTER = (0.0, 0.0, 612.0, 792.0)
+_MAX_DEPTH = 64
+
+
+# ---------------------------------------------------------------------------
+# Raw dictionary reader
+#
+# Page and page-tree dictionaries are read straight from their xref offsets
+# and only the top-level keys needed here are matched. Anything the fast
+# path cannot handle (objects in object streams, indirect box values,
+# literal strings) falls back to PyPDF2's object parser for that one object.
+# ---------------------------------------------------------------------------
+
+_DICT_DELIM = re.compile(rb"<<|>>")
+_KIDS = re.compile(rb"/Kids\s*\[([^\]]*)\]")
+_BOXES = (
+    ("mediabox", b"/MediaBox", re.compile(rb"/MediaBox\s*\[([^\]]*)\]")),
+    ("cropbox", b"/CropBox", re.compile(rb"/CropBox\s*\[([^\]]*)\]")),
+)
+# A direct integer only; an indirect "/Rotate 8 0 R" takes the slow path
+_ROTATE = re.compile(rb"/Rotate\s+(-?\d+)(?![\d.])(?!\s+\d+\s+R)")
+_CHUNK = 512
+
+
+def _read_raw_object(reader: PdfReader, idnum: int, generation: int) -> Optional[bytes]:
+    offsets = reader.xref.get(generation)
+    if not offsets or idnum not in offsets or idnum in reader.xref_objStm:
+        return None
+    stream = reader.stream
+    stream.seek(offsets[idnum])
+    data = b""
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            return None
+        data += chunk
+        end = data.find(b"endobj")
+        if end >= 0:
+            return data[:end]
+        if b"stream" in data:
+            return None
+
+
+def top_level_text(data: bytes) -> Optional[bytes]:
+    """
+    Body of the outermost dictionary in ``data`` (raw object bytes) with
+    all nested dictionaries cut out, so a regex over it only sees the
+    dictionary's own keys. None when the dictionary contains a literal
+    string (which may hide delimiters) or does not end in ``data``; the
+    caller then parses the object instead. Shared with the streaming
+    writer's raw page path.
+    """
+    if b"(" in data:
+        return None  # literal strings may hide delimiters; use the slow path
+    parts = []
+    depth = 0
+    last = 0
+    for m in _DICT_DELIM.finditer(data):
+        if m.group() == b"<<":
+            depth += 1
+            if depth == 2:
+                parts.append(data[last:m.start()])
+            elif depth == 1:
+                last = m.end()
+        else:
+            depth -= 1
+            if depth == 1:
+                last = m.end()
+            elif depth == 0:
+                parts.append(data[last:m.start()])
+                return b" ".join(parts)
+    return None
+
+
+def _fast_node(text: bytes) -> dict:
+    node = {}
+    if b"/Kids" in text:
+        m = _KIDS.search(text)
+        if m is None:
+            raise ValueError
+        body = m.group(1).split()
+        if len(body) % 3 or any(body[k] != b"R" for k in range(2, len(body), 3)):
+            raise ValueError
+        node["kids"] = [(int(body[k]), int(body[k + 1])) for k in range(0, len(body), 3)]
+    for name, key, pattern in _BOXES:
+        if key in text:
+            m = pattern.search(text)
+            if m is None:
+                raise ValueError
+            box = tuple(float(v) for v in m.group(1).split())
+            if len(box) != 4:
+                raise ValueError
+            node[name] = box
+    if b"/Rotate" in text:
+        m = _ROTATE.search(text)
+        if m is None:
+            raise ValueError
+        node["rotate"] = int(m.group(1))
+    return node
+
+
+def _node(reader: PdfReader, ref: IndirectObject) -> dict:
+    """
+    Return the wanted entries of a page-tree node as plain Python values:
+    kids as (idnum, generation) pairs, boxes as 4-tuples, rotate as int.
+    """
+    raw = _read_raw_object(reader, ref.idnum, ref.generation)
+    text = top_level_text(raw) if raw is not None else None
+    if text is not None:
+        try:
+            return _fast_node(text)
+        except ValueError:
+            pass
+
+    # Slow path: let PyPDF2 parse this one object
+    obj = reader.get_object(ref)
+    node = {}
+    if "/Kids" in obj:
+        node["kids"] = [(k.idnum, k.generation) for k in obj["/Kids"]]
+    for key, name in (("/MediaBox", "mediabox"), ("/CropBox", "cropbox")):
+        if key in obj:
+            node[name] = tuple(float(v) for v in obj[key].get_object())
+    if "/Rotate" in obj:
+        node["rotate"] = int(obj["/Rotate"].get_object())
+    return node
+
+
+def _page_box(mediabox, cropbox, rotate: int) -> PageBox:
+    cropbox = cropbox or mediabox
+    return PageBox(
+        abs(mediabox[2] - mediabox[0]),
+        abs(mediabox[3] - mediabox[1]),
+        abs(cropbox[2] - cropbox[0]),
+        abs(cropbox[3] - cropbox[1]),
+        rotate % 360,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def scan_reader(reader: PdfReader) -> FileGeometry:
+    """
+    Walk the page tree of an open reader and collect each page's inherited
+    MediaBox, CropBox and Rotate without building PyPDF2 page objects.
+    Raises PdfReadError for a page tree with a cycle or deeper than
+    _MAX_DEPTH levels, rather than returning fewer pages than the merge
+    would copy.
+    """
+    root = reader.trailer["/Root"].get_object()
+    pages_ref = root.raw_get("/Pages")
+    if not isinstance(pages_ref, IndirectObject):
+        return FileGeometry(tuple(
+            _page_box(
+                tuple(float(v) for v in page.mediabox),
+                tuple(float(v) for v in page.cropbox),
+                int(page.get("/Rotate", 0)),
+            )
+            for page in reader.pages
+        ))
+
+    boxes = []
+    refs = []
+    seen = set()
+    # (ref, inherited mediabox, inherited cropbox, inherited rotate, depth)
+    stack = [(pages_ref, LETTER, None, 0, 0)]
+    while stack:
+        ref, mediabox, cropbox, rotate, depth = stack.pop()
+        key = (ref.idnum, ref.generation)
+        if key in seen:
+            raise PdfReadError(f"Page tree node {key[0]} {key[1]} R is referenced twice")
+        if depth > _MAX_DEPTH:
+            raise PdfReadError(f"Page tree is deeper than {_MAX_DEPTH} levels")
+        seen.add(key)
+
+        node = _node(reader, ref)
+        mediabox = node.get("mediabox", mediabox)
+        cropbox = node.get("cropbox", cropbox)
+        rotate = node.get("rotate", rotate)
+
+        kids = node.get("kids")
+        if kids is None:
+            boxes.append(_page_box(mediabox, cropbox, rotate))
+            refs.append(key)
+            continue
+        for idnum, generation in reversed(kids):
+            stack.append(
+                (IndirectObject(idnum, generation, reader), mediabox, cropbox, rotate, depth + 1)
+            )
+
+    return FileGeometry(tuple(boxes), tuple(refs))
+
+
+_cache: Dict[Tuple[str, int, float], FileGeometry] = {}
+_cache_lock = threading.Lock()
+_CACHE_LIMIT = 4096
+
+
+def scan_pdf(path: str) -> FileGeometry:
+    """
+    Geometry table for a PDF on disk. Results are cached per (path, size,
+    mtime), so callers such as the status bar can ask repeatedly.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    with get_document_pool().reader(path) as reader:
+        geometry = scan_reader(reader)
+
+    with _cache_lock:
+        if len(_cache) >= _CACHE_LIMIT:
+            _cache.clear()
+        _cache[key] = geometry
+    return geometry
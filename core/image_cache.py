@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+# core/image_cache.py
+
+import os
+from typing import Tuple
+
+from core.image_tools import image_to_pdf
+from core.page_cache import DEFAULT_MAX_BYTES, get_page_cache
+from core.settings import user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Image-conversion cache
+#
+# Every image input is normally converted to a temporary one-page PDF on
+# each use. With MergeOptions.image_cache_dir set, the converted PDF is
+# kept under the image's content hash instead, so the same scan or logo
+# used by many jobs (or by concurrent batch workers sharing the directory)
+# is converted once. Cached PDFs are ordinary files, so merges open them
+# through the document pool like any other input. The store is a
+# PageCache, with the same LRU size limit.
+# ---------------------------------------------------------------------------
+
+# Bump when image_to_pdf's layout changes
+IMAGE_TRANSFORM = "image-v1"
+
+
+def default_image_cache_dir() -> str:
+    return str(user_cache_dir("images"))
+
+
+def image_pdf(image_path: str, root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> Tuple[str, bool]:
+    """
+    The one-page PDF for an image, converting it on a cache miss. Returns
+    (path, temporary): cached files belong to the cache and must not be
+    deleted; a temporary file (the cache could not store the PDF) must be.
+    """
+    cache = get_page_cache(root, max_bytes)
+    key = cache.page_key(cache.file_key(image_path, IMAGE_TRANSFORM), 0)
+    path = cache.get_path(key)
+    if path is not None:
+        return path, False
+
+    temp_path = image_to_pdf(image_path)
+    try:
+        with open(temp_path, "rb") as f:
+            path = cache.put(key, f.read())
+    except OSError:
+        path = None
+    if path is None:
+        return temp_path, True
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+    return path, False
@@ -6,9 +6,30 @@ import tempfile
 import os
 from io import BytesIO
 
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader as RLImageReader
+# Pillow and reportlab are imported by the functions that use them, so
+# importing the merge engine does not load them
+
+
+def _prepare_image(img):
+    """RGB copy of the image and its page size in points (at 96 dpi)."""
+    from PIL import Image
+
+    # Convert to RGB if needed (JPEG cannot handle transparency)
+    if img.mode in ("RGBA", "LA", "P"):
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode == "P":
+            img = img.convert("RGBA")
+        background.paste(
+            img,
+            mask=img.split()[-1] if len(img.split()) > 3 else None
+        )
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    img_width, img_height = img.size
+    dpi = 96
+    return img, (img_width / dpi) * 72, (img_height / dpi) * 72
 
 
 def image_to_pdf(image_path: str) -> str:
@@ -16,6 +37,10 @@ def image_to_pdf(image_path: str) -> str:
     Convert an image file (JPG, PNG, TIFF, etc.) into a 1‑page PDF and write to a temp file.
     Returns the path to the temp PDF file.
     """
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader as RLImageReader
+    from reportlab.pdfgen import canvas
+
     try:
         img = None
         try:
@@ -27,23 +52,7 @@ def image_to_pdf(image_path: str) -> str:
         if img is None:
             raise Exception(f"Image file '{image_path}' could not be loaded (None returned).")
 
-        # Convert to RGB if needed (JPEG cannot handle transparency)
-        if img.mode in ("RGBA", "LA", "P"):
-            background = Image.new("RGB", img.size, (255, 255, 255))
-            if img.mode == "P":
-                img = img.convert("RGBA")
-            background.paste(
-                img,
-                mask=img.split()[-1] if len(img.split()) > 3 else None
-            )
-            img = background
-        elif img.mode != "RGB":
-            img = img.convert("RGB")
-
-        img_width, img_height = img.size
-        dpi = 96
-        page_width = (img_width / dpi) * 72
-        page_height = (img_height / dpi) * 72
+        img, page_width, page_height = _prepare_image(img)
 
         # Write PDF to a temp file
         fd, temp_pdf_path = tempfile.mkstemp(suffix=".pdf")
@@ -71,4 +80,36 @@ def image_to_pdf(image_path: str) -> str:
         raise Exception(
             f"Failed to convert image to PDF for file '{image_path}': {str(e)}\n"
             "If this error persists, check the file format and try re-saving the image."
-        )
\ No newline at end of file
+        )
+
+
+def image_to_pdf_bytes(image_stream, name: str = "image") -> bytes:
+    """
+    Convert an image given as a binary stream into a 1-page PDF in memory,
+    laid out like image_to_pdf. ``name`` is only used in error messages.
+    """
+    from PIL import Image
+    from reportlab.pdfgen import canvas
+
+    data = image_stream.read()
+    try:
+        img = Image.open(BytesIO(data))
+        img.load()
+    except Exception as e:
+        raise Exception(f"Failed to open image file '{name}': {str(e)}")
+
+    img, page_width, page_height = _prepare_image(img)
+    if img.format == "JPEG":
+        # Unconverted JPEGs are embedded as they are, which reportlab reads
+        # back from the image's (unloaded) file object
+        img = Image.open(BytesIO(data))
+
+    output = BytesIO()
+    try:
+        c = canvas.Canvas(output, pagesize=(page_width, page_height))
+        c.drawInlineImage(img, 0, 0, width=page_width, height=page_height)
+        c.showPage()
+        c.save()
+    except Exception as e:
+        raise Exception(f"Failed to render image file '{name}' into PDF: {str(e)}")
+    return output.getvalue()
\ No newline at end of file
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+# core/jobs.py
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+# ---------------------------------------------------------------------------
+# Merge job specs for headless runs (python -m core)
+#
+# A job is either a .pdflist, as saved by the GUI (a JSON list of file
+# entries; the output path comes from the command line), or a JSON object:
+#
+#   {
+#     "output": "binder.pdf",
+#     "files": ["cover.pdf", {"path": "scan.png", "rotation": 90},
+#               {"path": "report.pdf", "page_range": "1-3", "reverse": false}],
+#     "options": {"insert_toc": true, "add_filename_bookmarks": true}
+#   }
+#
+# "options" holds MergeOptions fields. Relative paths are resolved against
+# the spec's directory. Specs are read without importing the PDF
+# libraries, so malformed jobs are reported before any of that start-up
+# cost is paid.
+# ---------------------------------------------------------------------------
+
+STATUS_OK = "ok"
+STATUS_INVALID = "invalid"  # spec or plan problems; nothing was written
+STATUS_FAILED = "failed"  # the merge itself raised
+STATUS_CANCELLED = "cancelled"
+
+_ENTRY_KEYS = {"path", "rotation", "page_range", "reverse"}
+
+
+class JobSpecError(ValueError):
+    """A job spec cannot be read or is malformed."""
+
+
+@dataclass
+class JobSpec:
+    source: str  # the spec file
+    output: str
+    files: List[Dict]  # FileEntry fields, paths absolute
+    options: Dict = field(default_factory=dict)  # MergeOptions fields
+
+
+@dataclass
+class JobResult:
+    spec: str
+    output: str
+    status: str
+    seconds: float = 0.0
+    pages: int = 0
+    output_bytes: int = 0
+    resumed_segments: int = 0
+    unchanged: bool = False
+    # Dry runs: estimated wall time and peak memory
+    estimated_seconds: float = 0.0
+    estimated_peak_memory_bytes: int = 0
+    error: str = ""
+    problems: List[str] = field(default_factory=list)
+    # Batch runs: worker process id and start time (seconds into the batch)
+    worker: int = 0
+    started: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _file_entry(item, base_dir: Path, source: str) -> Dict:
+    if isinstance(item, str):
+        item = {"path": item}
+    if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+        raise JobSpecError(f"{source}: every file needs a 'path'")
+    unknown = sorted(set(item) - _ENTRY_KEYS)
+    if unknown:
+        raise JobSpecError(f"{source}: unknown file entry keys: {', '.join(unknown)}")
+    entry = dict(item)
+    entry["path"] = str(base_dir / os.path.expanduser(entry["path"]))
+    return entry
+
+
+def load_job(path: str, output: str = "") -> JobSpec:
+    """
+    Read a .pdflist or JSON job spec. ``output`` (relative to the current
+    directory) overrides the spec's own output; a .pdflist without one
+    writes next to itself, with a .pdf suffix.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except OSError as e:
+        raise JobSpecError(f"{path}: {e.strerror or e}")
+    except ValueError as e:
+        raise JobSpecError(f"{path}: not valid JSON ({e})")
+
+    base_dir = Path(path).resolve().parent
+    if isinstance(data, list):
+        data = {"files": data}
+    if not isinstance(data, dict):
+        raise JobSpecError(f"{path}: expected a list of files or a job object")
+    unknown = sorted(set(data) - {"output", "files", "options"})
+    if unknown:
+        raise JobSpecError(f"{path}: unknown job keys: {', '.join(unknown)}")
+
+    files = data.get("files")
+    if not isinstance(files, list) or not files:
+        raise JobSpecError(f"{path}: 'files' must be a non-empty list")
+    options = data.get("options", {})
+    if not isinstance(options, dict):
+        raise JobSpecError(f"{path}: 'options' must be an object of MergeOptions fields")
+
+    if output:
+        output = os.path.abspath(output)
+    elif isinstance(data.get("output"), str) and data["output"]:
+        output = str(base_dir / os.path.expanduser(data["output"]))
+    else:
+        output = str(Path(path).resolve().with_suffix(".pdf"))
+
+    return JobSpec(
+        source=path,
+        output=output,
+        files=[_file_entry(item, base_dir, path) for item in files],
+        options=options,
+    )
+
+
+def options_from_dict(data: Dict, base=None):
+    """MergeOptions from a dict of its fields, on top of ``base``."""
+    from core.pdf_merger import MergeOptions
+
+    known = {f.name for f in fields(MergeOptions)}
+    unknown = sorted(set(data) - known)
+    if unknown:
+        raise JobSpecError(f"Unknown MergeOptions fields: {', '.join(unknown)}")
+    return replace(base or MergeOptions(), **data)
+
+
+def run_job(
+    spec: JobSpec,
+    base_options: Optional[Dict] = None,
+    dry_run: bool = False,
+    cancel_callback: Optional[Callable[[], bool]] = None,
+    event_callback=None,
+) -> JobResult:
+    """
+    Validate, plan and run one job; never raises for job problems, which
+    are reported in the result. ``base_options`` (MergeOptions fields) are
+    applied first and the spec's own options on top.
+    """
+    from core.pdf_merger import FileEntry
+    from core.plan import PlanError, compile_plan, estimate_plan
+
+    start = time.perf_counter()
+    result = JobResult(spec.source, spec.output, STATUS_OK)
+    try:
+        options = options_from_dict(spec.options, options_from_dict(base_options or {}))
+        entries = [
+            FileEntry(
+                path=f["path"],
+                rotation=int(f.get("rotation", 0)),
+                page_range=str(f.get("page_range", "") or ""),
+                reverse=bool(f.get("reverse", False)),
+            )
+            for f in spec.files
+        ]
+        plan = compile_plan(entries, options)
+    except PlanError as e:
+        result.status = STATUS_INVALID
+        result.problems = list(e.problems)
+    except (JobSpecError, TypeError, ValueError) as e:
+        result.status = STATUS_INVALID
+        result.error = str(e)
+    else:
+        if dry_run:
+            estimate = estimate_plan(plan)
+            result.pages = estimate.pages
+            result.output_bytes = estimate.output_bytes
+            result.estimated_seconds = round(estimate.seconds, 3)
+            result.estimated_peak_memory_bytes = estimate.peak_memory_bytes
+        else:
+            try:
+                output_dir = os.path.dirname(spec.output)
+                if output_dir:
+                    os.makedirs(output_dir, exist_ok=True)
+                report = plan.execute(
+                    spec.output, cancel_callback=cancel_callback,
+                    event_callback=event_callback,
+                )
+                result.pages = report.pages
+                result.output_bytes = report.output_bytes
+                result.resumed_segments = report.resumed_segments
+                result.unchanged = report.unchanged
+            except PlanError as e:
+                result.status = STATUS_INVALID
+                result.problems = list(e.problems)
+            except Exception as e:
+                cancelled = cancel_callback is not None and cancel_callback()
+                result.status = STATUS_CANCELLED if cancelled else STATUS_FAILED
+                result.error = str(e) or type(e).__name__
+    result.seconds = round(time.perf_counter() - start, 3)
+    return result
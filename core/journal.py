@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+# core/journal.py
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+from core.settings import make_private_dir, user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Resumable merge journal
+#
+# Each input's finished output pages (breaker page included) are written to
+# their own small PDF, a "segment", and recorded in journal.json. A job that
+# is cancelled or crashes leaves its completed segments behind; running the
+# same files with the same options again copies those segments instead of
+# reprocessing the inputs. The journal is removed once the output is written.
+#
+# A job is identified by the inputs (path, size, mtime and the per-file
+# settings) and every option that changes page content. Options applied to
+# the assembled output (TOC, bookmarks, metadata, encryption, dedup) are
+# not part of the key, so changing them still resumes.
+#
+# Segments are unencrypted output, so journal directories are private to
+# the user (0o700) and must belong to them. Each segment also records the
+# largest placed size of its kept pages, so a resumed job finds the scaling
+# target without running the blank-page analysis of inputs that are
+# already done.
+# ---------------------------------------------------------------------------
+
+JOURNAL_VERSION = 2
+
+_OUTPUT_ONLY_OPTIONS = {
+    "toc_fileinfo_mode",
+    "insert_toc",
+    "add_filename_bookmarks",
+    "metadata_enabled",
+    "pdf_title",
+    "pdf_author",
+    "pdf_subject",
+    "pdf_keywords",
+    "encrypt_enabled",
+    "encrypt_user_pw",
+    "encrypt_owner_pw",
+    "streaming_output",
+    "dedupe_resources",
+    "max_open_files",
+    "journal_dir",
+    "segment_cache_dir",
+    "page_cache_dir",
+    "page_cache_max_mb",
+    "image_cache_dir",
+    "mmap_inputs",
+    "spool_max_mb",
+    "raster_blank_workers",
+    "analysis_cache_dir",
+}
+
+
+def default_journal_dir() -> str:
+    """Per-user location for merge journals (kept across restarts)."""
+    return str(user_cache_dir("journal"))
+
+
+def job_key(files, options) -> str:
+    """Stable identifier of a merge job's per-file output."""
+    inputs = []
+    for entry in files:
+        path = os.path.abspath(entry.path)
+        st = os.stat(path)
+        inputs.append([
+            path, st.st_size, st.st_mtime_ns,
+            entry.rotation, entry.page_range or "", bool(entry.reverse),
+        ])
+    settings = {
+        k: v for k, v in sorted(asdict(options).items())
+        if k not in _OUTPUT_ONLY_OPTIONS
+    }
+    payload = json.dumps(
+        {"version": JOURNAL_VERSION, "inputs": inputs, "options": settings},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class JournalSegment:
+    path: str
+    pages: int  # all pages in the segment
+    breaker_pages: int  # leading breaker pages (0 or 1)
+    # Largest placed (width, height) of the input's kept PDF pages, its
+    # share of the scaling target; None when not recorded
+    size: Optional[Tuple[float, float]] = None
+
+
+class MergeJournal:
+    """On-disk record of the completed per-file segments of one merge job."""
+
+    def __init__(self, root: str, files, options) -> None:
+        self.key = job_key(files, options)
+        self.directory = os.path.join(root, self.key)
+        make_private_dir(root)
+        make_private_dir(self.directory)
+        self._manifest_path = os.path.join(self.directory, "journal.json")
+        self._segments: Dict[int, JournalSegment] = self._load()
+        self.resumed = len(self._segments)
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"segment-{index:05d}.pdf")
+
+    def _load(self) -> Dict[int, JournalSegment]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("key") != self.key:
+            return {}
+        segments = {}
+        for index, info in data.get("segments", {}).items():
+            path = self._segment_path(int(index))
+            # A segment is only trusted if its file is complete on disk
+            if os.path.exists(path) and os.path.getsize(path) == info.get("bytes"):
+                size = info.get("size")
+                segments[int(index)] = JournalSegment(
+                    path, int(info["pages"]), int(info["breaker_pages"]),
+                    (float(size[0]), float(size[1])) if size else None,
+                )
+        return segments
+
+    def _save(self) -> None:
+        data = {
+            "key": self.key,
+            "version": JOURNAL_VERSION,
+            "segments": {
+                str(index): {
+                    "pages": seg.pages,
+                    "breaker_pages": seg.breaker_pages,
+                    "bytes": os.path.getsize(seg.path),
+                    "size": list(seg.size) if seg.size else None,
+                }
+                for index, seg in sorted(self._segments.items())
+            },
+        }
+        tmp_path = self._manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+
+    def completed(self, index: int) -> Optional[JournalSegment]:
+        return self._segments.get(index)
+
+    def begin(self, index: int) -> str:
+        """Path to write a new segment to; becomes visible on commit()."""
+        return self._segment_path(index) + ".part"
+
+    def commit(self, index: int, pages: int, breaker_pages: int,
+               size: Optional[Tuple[float, float]] = None) -> JournalSegment:
+        part_path = self.begin(index)
+        with open(part_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(part_path, self._segment_path(index))
+        segment = JournalSegment(self._segment_path(index), pages, breaker_pages, size)
+        self._segments[index] = segment
+        self._save()
+        return segment
+
+    def abandon(self, index: int) -> None:
+        """Drop a partially written segment (cancel or error)."""
+        try:
+            os.remove(self.begin(index))
+        except OSError:
+            pass
+
+    def finish(self) -> None:
+        """The output is written; the journal is no longer needed."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def open_journal(files, options) -> Optional[MergeJournal]:
+    """The job's journal when MergeOptions.journal_dir is set, else None."""
+    root = getattr(options, "journal_dir", "")
+    if not root:
+        return None
+    return MergeJournal(root, files, options)
+
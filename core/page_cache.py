@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+# core/page_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from core.file_hash import HashIndex
+from core.settings import make_private_dir, user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Transformed-page cache
+#
+# Scaling, watermarking and image recompression dominate merge time, and
+# the same inputs go through the same settings again and again. With
+# MergeOptions.page_cache_dir set, each transformed page is stored as a
+# one-page PDF keyed by (input content hash, page index, hash of every
+# parameter that shapes the transformed page), and later jobs copy it
+# instead of transforming the page again. Pages without an expensive
+# transform are never cached.
+#
+# Entries are files under the cache directory; the directory is kept under
+# max_bytes by removing the least recently used pages. It holds document
+# pages, so like journal directories it must belong to the user and is
+# kept private (0o700).
+# ---------------------------------------------------------------------------
+
+CACHE_VERSION = 2  # 2: PyMuPDF pages scaled to their own size
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def default_page_cache_dir() -> str:
+    return str(user_cache_dir("pages"))
+
+
+def page_transform_hash(options, rotation: int, scale_target: Optional[Tuple[float, float]],
+                        engine: str) -> Optional[str]:
+    """
+    Hash of the transform parameters for one input's pages, or None when
+    no cached transform (scaling, watermark, compression) is enabled.
+    """
+    watermark = bool(options.watermark_enabled and options.watermark_text.strip())
+    if not (options.scaling_enabled or watermark or options.compression_enabled):
+        return None
+    params = {
+        "version": CACHE_VERSION,
+        "engine": engine,
+        "rotation": rotation,
+        "scaling": [
+            options.scaling_mode, options.scaling_percent, scale_target,
+            options.scaling_form_xobject,
+        ] if options.scaling_enabled else None,
+        "watermark": [
+            options.watermark_text.strip(), options.watermark_opacity,
+            options.watermark_font_size, options.watermark_rotation,
+            options.watermark_position.lower(), options.watermark_safe_mode,
+            options.watermark_font_color,
+        ] if watermark else None,
+        "compression": options.compression_level if options.compression_enabled else None,
+    }
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """Size-bounded LRU directory of transformed pages."""
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        make_private_dir(root)
+        self._hashes = HashIndex(os.path.join(root, "hashes.json"))
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None  # bytes on disk, scanned lazily
+        self.hits = 0
+        self.misses = 0
+
+    def file_key(self, path: str, transform: str) -> str:
+        """Key prefix for one input's pages under one set of transforms."""
+        return f"{self._hashes.content_hash(path)}:{transform}"
+
+    def page_key(self, file_key: str, index: int) -> str:
+        return hashlib.sha256(f"{file_key}:{index}".encode("ascii")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".pdf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def get_path(self, key: str) -> Optional[str]:
+        """Path of a cached entry, for readers that open files lazily."""
+        path = self._path(key)
+        try:
+            os.utime(path)  # recently used
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def put(self, key: str, data: bytes) -> Optional[str]:
+        """Store an entry; returns its path, or None if it was not stored."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # A full or read-only cache never fails the merge
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return None
+        with self._lock:
+            if self._total is not None:
+                self._total += len(data)
+            over = self._total is None or self._total > self.max_bytes
+        if over:
+            self.trim()
+        return path
+
+    def trim(self) -> None:
+        """Remove least recently used pages until within max_bytes."""
+        entries = []
+        total = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total > self.max_bytes:
+            # Trim to 90% so a full cache is not rescanned on every put
+            target = self.max_bytes * 0.9
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+        with self._lock:
+            self._total = total
+
+
+_caches: Dict[str, PageCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_page_cache(root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> PageCache:
+    """The process-wide PageCache for a directory."""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = PageCache(root, max_bytes)
+        cache.max_bytes = max_bytes
+        return cache
+
+
+def open_page_cache(options) -> Optional[PageCache]:
+    root = getattr(options, "page_cache_dir", "")
+    if not root:
+        return None
+    max_mb = getattr(options, "page_cache_max_mb", 0)
+    return get_page_cache(root, max_mb * 1024 * 1024 if max_mb > 0 else DEFAULT_MAX_BYTES)
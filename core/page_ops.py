@@ -8,7 +8,17 @@ import math
 
 import PyPDF2
 from PyPDF2 import PdfReader, PdfWriter
-from reportlab.pdfgen import canvas
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    FloatObject,
+    NameObject,
+    StreamObject,
+)
+
+from core.blank_pages import classify_page
 
 
 # ---------------------------------------------------------------------------
@@ -76,31 +86,11 @@ def parse_page_range(range_text: str, total_pages: int) -> List[int]:
 
 def is_page_blank(page) -> bool:
     """
-    Heuristic blank-page detection:
-    - No extracted text
-    - No XObjects (images)
-    - No fonts
+    Blank-page detection: a content stream operator scan, falling back to
+    text extraction only when the scan cannot decide (see
+    core/blank_pages.py).
     """
-    try:
-        text = page.extract_text()
-        if text and text.strip():
-            return False
-
-        if "/Resources" in page:
-            resources = page["/Resources"]
-
-            if "/XObject" in resources:
-                xobjects = resources["/XObject"]
-                if xobjects and len(xobjects) > 0:
-                    return False
-
-            if "/Font" in resources and len(resources["/Font"]) > 0:
-                return False
-
-        return True
-
-    except Exception:
-        return False
+    return classify_page(page).blank
 
 
 # ---------------------------------------------------------------------------
@@ -137,90 +127,176 @@ def scale_page(page, target_width: float, target_height: float):
         pass
 
 
+_FORM_NAME = "/PageForm"
+_BOXES = ("/CropBox", "/BleedBox", "/TrimBox", "/ArtBox")
+
+
+def _transform_rect(rect, matrix) -> ArrayObject:
+    a, _, _, d, e, f = matrix
+    x0, y0, x1, y1 = (float(v) for v in rect)
+    return ArrayObject(FloatObject(v) for v in (a * x0 + e, d * y0 + f, a * x1 + e, d * y1 + f))
+
+
+def _form_content(page) -> StreamObject:
+    """
+    The page's content as a form XObject stream. A single content stream
+    keeps its encoded bytes; an array of streams has to be decoded and
+    joined (parts may split an operator), and is deflated again.
+    """
+    contents = page.get("/Contents")
+    contents = contents.get_object() if contents is not None else None
+    if isinstance(contents, StreamObject):
+        form = EncodedStreamObject() if "/Filter" in contents else DecodedStreamObject()
+        form._data = contents._data
+        for key in ("/Filter", "/DecodeParms"):
+            if key in contents:
+                form[NameObject(key)] = contents.raw_get(key)
+        return form
+    form = DecodedStreamObject()
+    if isinstance(contents, ArrayObject):
+        form.set_data(b"\n".join(part.get_object().get_data() for part in contents))
+        form = form.flate_encode()
+    return form
+
+
+def scale_page_as_form(page, target_width: float, target_height: float):
+    """
+    Same result as scale_page, but the original content is moved into a form
+    XObject and drawn through one cm matrix by a new, tiny content stream.
+    The original content stream is not parsed, and its data is copied
+    encoded. Like scale_page, the page is scaled uniformly to fit the target
+    and keeps its own aspect ratio: the media box and every other page box
+    and annotation rectangle are scaled with the content.
+    """
+    try:
+        box = page.mediabox
+        scale = min(target_width / float(box.width), target_height / float(box.height))
+        if scale == 1.0:
+            return
+        matrix = (scale, 0.0, 0.0, scale, 0.0, 0.0)
+
+        form = _form_content(page)
+        form[NameObject("/Type")] = NameObject("/XObject")
+        form[NameObject("/Subtype")] = NameObject("/Form")
+        # The visible area; PyPDF2's cropbox accessor would add a /CropBox
+        visible = page["/CropBox"] if "/CropBox" in page else box
+        form[NameObject("/BBox")] = ArrayObject(FloatObject(float(v)) for v in visible)
+        if "/Resources" in page:
+            form[NameObject("/Resources")] = page.raw_get("/Resources")
+
+        content = DecodedStreamObject()
+        numbers = " ".join(f"{v:.6f}".rstrip("0").rstrip(".") for v in matrix)
+        content.set_data(f"q {numbers} cm {_FORM_NAME} Do Q".encode())
+        page[NameObject("/Contents")] = content
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/XObject"): DictionaryObject({NameObject(_FORM_NAME): form}),
+        })
+
+        page[NameObject("/MediaBox")] = _transform_rect(box, matrix)
+        for key in _BOXES:
+            if key in page:
+                page[NameObject(key)] = _transform_rect(page[key], matrix)
+        for annot in page.get("/Annots") or ():
+            annot = annot.get_object()
+            if "/Rect" in annot:
+                annot[NameObject("/Rect")] = _transform_rect(annot["/Rect"], matrix)
+
+    except Exception:
+        pass
+
+
 # ---------------------------------------------------------------------------
 # Breaker Page Creation
 # ---------------------------------------------------------------------------
 
+def render_filename_page(filename: str, width: float, height: float) -> bytes:
+    """
+    Render a one-page PDF with the filename centered and return its bytes.
+    Shared by the PyPDF2 and PyMuPDF merge engines.
+    """
+    width = float(width)
+    height = float(height)
+
+    scale_factor = height / 792.0
+    base_font_size = 14
+    scaled_font_size = int(base_font_size * scale_factor)
+    scaled_line_height = int(18 * scale_factor)
+    scaled_spacing_below_file = int(35 * scale_factor)
+    scaled_line_spacing = int(20 * scale_factor)
+    scaled_margin = int(50 * scale_factor)
+    scaled_line_width = max(1, int(2 * scale_factor))
+
+    max_chars = 25
+    if len(filename) > max_chars:
+        filename_lines = [
+            filename[i:i + max_chars]
+            for i in range(0, len(filename), max_chars)
+        ]
+    else:
+        filename_lines = [filename]
+
+    from reportlab.pdfgen import canvas
+
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=(width, height))
+
+    filename_height = len(filename_lines) * scaled_line_height
+    total_text_height = (
+        40 * scale_factor +
+        filename_height +
+        15 * scale_factor +
+        15 * scale_factor
+    )
+
+    vertical_center = height / 2
+    current_y = vertical_center + (total_text_height / 2) - 10 * scale_factor
+
+    c.setFont("Helvetica", scaled_font_size)
+    c.setFillGray(0.3)
+    c.drawCentredString(width / 2, current_y, "File")
+
+    c.setFont("Helvetica-Bold", scaled_font_size)
+    current_y -= scaled_spacing_below_file
+
+    c.setStrokeGray(0.3)
+    c.setLineWidth(scaled_line_width)
+    c.line(
+        scaled_margin,
+        current_y + scaled_line_spacing,
+        width - scaled_margin,
+        current_y + scaled_line_spacing
+    )
+
+    for line in filename_lines:
+        c.drawCentredString(width / 2, current_y, line)
+        current_y -= scaled_line_height
+
+    c.line(
+        scaled_margin,
+        current_y + scaled_line_height - 10 * scale_factor,
+        width - scaled_margin,
+        current_y + scaled_line_height - 10 * scale_factor
+    )
+
+    c.setFont("Helvetica", scaled_font_size)
+    current_y -= 10 * scale_factor
+    c.drawCentredString(width / 2, current_y, "follows")
+
+    c.save()
+    return packet.getvalue()
+
+
 def create_page_with_filename(filename: str, width: float, height: float):
     """
     Create a blank PDF page with the filename centered.
     Used for breaker pages between merged files.
     """
     try:
-        width = float(width)
-        height = float(height)
-
-        scale_factor = height / 792.0
-        base_font_size = 14
-        scaled_font_size = int(base_font_size * scale_factor)
-        scaled_line_height = int(18 * scale_factor)
-        scaled_spacing_below_file = int(35 * scale_factor)
-        scaled_line_spacing = int(20 * scale_factor)
-        scaled_margin = int(50 * scale_factor)
-        scaled_line_width = max(1, int(2 * scale_factor))
-
-        max_chars = 25
-        if len(filename) > max_chars:
-            filename_lines = [
-                filename[i:i + max_chars]
-                for i in range(0, len(filename), max_chars)
-            ]
-        else:
-            filename_lines = [filename]
-
-        packet = io.BytesIO()
-        c = canvas.Canvas(packet, pagesize=(width, height))
-
-        filename_height = len(filename_lines) * scaled_line_height
-        total_text_height = (
-            40 * scale_factor +
-            filename_height +
-            15 * scale_factor +
-            15 * scale_factor
-        )
-
-        vertical_center = height / 2
-        current_y = vertical_center + (total_text_height / 2) - 10 * scale_factor
-
-        c.setFont("Helvetica", scaled_font_size)
-        c.setFillGray(0.3)
-        c.drawCentredString(width / 2, current_y, "File")
-
-        c.setFont("Helvetica-Bold", scaled_font_size)
-        current_y -= scaled_spacing_below_file
-
-        c.setStrokeGray(0.3)
-        c.setLineWidth(scaled_line_width)
-        c.line(
-            scaled_margin,
-            current_y + scaled_line_spacing,
-            width - scaled_margin,
-            current_y + scaled_line_spacing
-        )
-
-        for line in filename_lines:
-            c.drawCentredString(width / 2, current_y, line)
-            current_y -= scaled_line_height
-
-        c.line(
-            scaled_margin,
-            current_y + scaled_line_height - 10 * scale_factor,
-            width - scaled_margin,
-            current_y + scaled_line_height - 10 * scale_factor
-        )
-
-        c.setFont("Helvetica", scaled_font_size)
-        current_y -= 10 * scale_factor
-        c.drawCentredString(width / 2, current_y, "follows")
-
-        c.save()
-        packet.seek(0)
-
-        page_pdf = PdfReader(packet)
+        page_pdf = PdfReader(io.BytesIO(render_filename_page(filename, width, height)))
         if len(page_pdf.pages) > 0:
             return page_pdf.pages[0]
 
-        return PdfWriter().add_blank_page(width=width, height=height)
+        return PdfWriter().add_blank_page(width=float(width), height=float(height))
 
     except Exception:
-        return PdfWriter().add_blank_page(width=float(width), height=float(height))
\ No newline at end of file
+        return PdfWriter().add_blank_page(width=float(width), height=float(height))
@@ -2,17 +2,16 @@ from __future__ import annotations
 
 # core/pdf_merger.py
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import List, Dict, Callable, Optional
+from typing import Any, BinaryIO, List, Dict, Callable, Optional, Tuple, Union
 
+import io
 import os
-import tempfile
+import threading
 
-import tkinter as tk
-from tkinter import messagebox
-
-from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, FloatObject, NameObject, NumberObject
 
 @dataclass
 class MergeOptions:
@@ -21,6 +20,20 @@ class MergeOptions:
     delete_blank_pages: bool = False
     insert_toc: bool = False
 
+    # With delete_blank_pages, also drop scanned pages that look blank:
+    # pages drawn from images are rendered in grayscale at raster_blank_dpi
+    # and are blank when at most raster_blank_max_ink of their pixels are
+    # darker than raster_blank_white_level (0-255), ignoring
+    # raster_blank_margin of each edge and isolated specks. Rendering runs
+    # on up to raster_blank_workers processes (0 = one per CPU). Needs
+    # PyMuPDF and NumPy (see core/raster_blank.py)
+    raster_blank_enabled: bool = False
+    raster_blank_dpi: int = 36
+    raster_blank_white_level: int = 200
+    raster_blank_max_ink: float = 0.001
+    raster_blank_margin: float = 0.05
+    raster_blank_workers: int = 0
+
     add_breaker_pages: bool = False
     breaker_uniform_size: bool = False
 
@@ -46,23 +59,107 @@ class MergeOptions:
 
     scaling_enabled: bool = False
     scaling_mode: str = "Fit"
+    # Percent mode: every page is scaled to this share of its own size (1-100)
+    scaling_percent: int = 100
+    # Scale by drawing each page's original content as a form XObject
+    # through one transform, instead of rewriting its content stream
+    # (PyPDF2 engine; the PyMuPDF engine always places pages this way).
+    # Much faster for vector-heavy pages such as CAD drawings, and the
+    # content streams are copied still compressed
+    scaling_form_xobject: bool = False
 
     # Encryption
     encrypt_enabled: bool = False
     encrypt_user_pw: str = ""
     encrypt_owner_pw: str = ""
 
+    # Write each finished input straight to the output and release its
+    # reader, so peak memory follows the largest input, not the whole job
+    streaming_output: bool = False
+
+    # Merge backend: "pypdf2" (default) or "pymupdf"
+    merge_engine: str = "pypdf2"
+
+    # Store byte-identical fonts, images, ICC profiles and forms once
+    dedupe_resources: bool = False
+
+    # Most input files held open at once (0 = derived from the ulimit);
+    # parsed inputs beyond this are closed and reopened on demand, so any
+    # number of files can be merged
+    max_open_files: int = 0
+
+    # Directory for resumable merge journals ("" = off). Each finished
+    # input is checkpointed there, and re-running the same job after a
+    # cancel or crash continues from the last completed input
+    journal_dir: str = ""
+
+    # Directory of the content-addressed segment cache ("" = off). Each
+    # input's processed pages are kept there, keyed by its content and
+    # settings, so re-merging mostly unchanged inputs only reprocesses the
+    # changed ones, and an identical re-merge does no work at all
+    segment_cache_dir: str = ""
+
+    # Directory of the transformed-page cache ("" = off). Pages that were
+    # scaled, watermarked or recompressed are kept there as one-page PDFs,
+    # keyed by the input's content, the page index and those settings, and
+    # reused by later jobs; least recently used pages are evicted beyond
+    # page_cache_max_mb (0 = 1 GB)
+    page_cache_dir: str = ""
+    page_cache_max_mb: int = 0
+
+    # Directory of the image-conversion cache ("" = off). Images are
+    # converted to one-page PDFs once per content and reused from there,
+    # instead of through a temporary PDF on every use
+    image_cache_dir: str = ""
+
+    # Directory of the page analysis cache ("" = off). What blank-page
+    # removal learns about each page (content verdict, image count, ink
+    # ratio) is kept there, keyed by the input's content and the page
+    # index, so later merges skip the analysis of pages already seen
+    analysis_cache_dir: str = ""
+
+    # Intermediate PDFs (the unencrypted output before encryption, inputs
+    # given as non-seekable streams) stay in memory up to this size and
+    # only then spill to a temporary file
+    spool_max_mb: int = 64
+
+    # Read inputs through read-only memory maps instead of buffered file
+    # reads (PyPDF2 engine). Mostly helps very large local inputs, where
+    # the OS page cache then serves stream data directly; mapped pages
+    # count toward RSS but are file-backed and reclaimable
+    mmap_inputs: bool = False
+
 # Import modular helpers
 from core.page_ops import (
     parse_page_range,
-    is_page_blank,
     scale_page,
+    scale_page_as_form,
     create_page_with_filename,
 )
-from core.image_tools import image_to_pdf
+from core.image_tools import image_to_pdf, image_to_pdf_bytes
+from core.blank_pages import analyse_page
+from core.raster_blank import blank_pages
 from core.watermark import add_watermark
 from core.compression import compress_page
-from core.toc import insert_toc_pages
+from core.toc import TOC_PAGE_HEIGHT, render_toc_pages
+from core.geometry import FileGeometry, scan_reader
+from core.stream_writer import StreamingPdfWriter
+from core.doc_pool import get_document_pool
+from core.fd_budget import get_file_budget
+from core.segment_cache import get_segment_cache, open_prepass_journal, open_segment_store
+from core.page_cache import PageCache, open_page_cache, page_transform_hash
+from core.image_cache import image_pdf
+from core.spool import SpillBuffer, seekable_input
+from core.progress import (
+    STAGE_ENCRYPT,
+    STAGE_PAGES,
+    STAGE_PREPARE,
+    STAGE_TOC,
+    STAGE_WRITE,
+    ProgressEvent,
+    ProgressTracker,
+    StageTiming,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -75,336 +172,1020 @@ class FileEntry:
     rotation: int = 0
     page_range: str = ""
     reverse: bool = False
+    # In-memory input (bytes or a binary stream) for merge_streams; path
+    # is then only its name (breaker label, bookmarks, image detection)
+    data: Any = field(default=None, repr=False, compare=False)
+
+
+@dataclass
+class MergeReport:
+    """Summary of a finished merge, returned by merge_files."""
+    output_path: str
+    pages: int = 0
+    output_bytes: int = 0
+    # Resource streams written once instead of once per input
+    duplicate_streams: int = 0
+    bytes_deduplicated: int = 0
+    # File-descriptor budget: most inputs open at once, and reopens
+    peak_open_files: int = 0
+    file_reopens: int = 0
+    # Inputs taken from the merge journal or segment cache instead of
+    # being reprocessed
+    resumed_segments: int = 0
+    # Nothing changed since the previous identical merge: the existing
+    # output was confirmed and left untouched
+    unchanged: bool = False
+    # Per-stage duration, input read time and resident memory; totals of
+    # input reads (PyPDF2 engine) and the highest resident memory sampled
+    stages: List[StageTiming] = field(default_factory=list)
+    read_seconds: float = 0.0
+    bytes_read: int = 0
+    mapped_inputs: bool = False
+    peak_rss_bytes: int = 0
+
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif")
 
 
 # ---------------------------------------------------------------------------
-# Main merge pipeline
+# Per-file state shared by the prepass and the page copy pass
 # ---------------------------------------------------------------------------
 
+@dataclass
+class PageGeometry:
+    """Placed size of one selected source page (after the file's rotation)."""
+    index: int
+    width: float
+    height: float
+    blank: bool = False
+
 
-def merge_files(
-    files: List[FileEntry],
-    output_path: str,
+@dataclass
+class _SourceFile:
+    entry: FileEntry
+    pdf_path: str
+    is_image: bool
+    # None between the prepass and the copy pass of a streaming merge (see
+    # _park_source)
+    reader: Optional[PdfReader]
+    geometry: FileGeometry
+    page_indices: List[int]
+    pages: List[PageGeometry]
+    # Reader came from the document pool and goes back there afterwards,
+    # unless its parsed pages were modified in place
+    pooled: bool = False
+    mutated: bool = False
+    # The generated breaker page. PdfWriter tracks copied objects by id()
+    # of their reader, so the page (and its reader) must outlive the copy
+    breaker_page: Optional[PageObject] = None
+    # Unpooled readers close their stream when released, unless it is the
+    # caller's (merge_streams inputs given as seekable streams)
+    owns_stream: bool = True
+    # An in-memory input's seekable stream, to parse it again after parking
+    stream: Any = None
+
+
+def _open_source(
+    entry: FileEntry,
     options: MergeOptions,
-    progress_callback: Optional[Callable[[int, int, str], None]] = None,
-    cancel_callback: Optional[Callable[[], bool]] = None,
-):
-    def cancelled():
-        return cancel_callback and cancel_callback()
+    temp_pdf_files: List[str],
+    open_files: list,
+    checked_out: list,
+    cancelled: Optional[Callable[[], bool]] = None,
+    check_blanks: bool = True,
+) -> _SourceFile:
+    """
+    Open and parse one input exactly once and record the geometry of every
+    selected page. The returned reader is reused by the copy pass.
+    ``check_blanks`` False skips blank-page detection (the input's pages
+    come from a finished journal segment).
+    """
+    file_path = entry.path
+    is_image = file_path.lower().endswith(IMAGE_EXTS)
+    owns_stream = True
+
+    pdf_path = file_path
+    if entry.data is not None:
+        # In-memory input (merge_streams): no pool, no temp files
+        stream, owns_stream = seekable_input(
+            entry.data, options.spool_max_mb * 1024 * 1024
+        )
+        if is_image:
+            image_stream = stream
+            try:
+                stream = io.BytesIO(image_to_pdf_bytes(image_stream, file_path))
+            finally:
+                if owns_stream:
+                    _close_quietly(image_stream)
+            owns_stream = True
+        if owns_stream:
+            open_files.append(stream)
+        pdf_reader = PdfReader(stream)
+    elif is_image and not options.image_cache_dir:
+        # Every image usage gets its own temporary PDF
+        pdf_path = image_to_pdf(file_path)
+        temp_pdf_files.append(pdf_path)
+        pdf_file = get_file_budget().open(pdf_path)
+        open_files.append(pdf_file)
+        pdf_reader = PdfReader(pdf_file)
+    else:
+        if is_image:
+            # Cached conversions are ordinary files and can be pooled
+            pdf_path, temporary = image_pdf(file_path, options.image_cache_dir)
+            if temporary:
+                temp_pdf_files.append(pdf_path)
+        pdf_reader = get_document_pool().acquire(pdf_path)
+        checked_out.append(pdf_reader)
+    geometry = scan_reader(pdf_reader)
+    total_pages = geometry.page_count
+
+    try:
+        page_indices = parse_page_range(entry.page_range, total_pages)
+    except ValueError as e:
+        raise ValueError(
+            f"{Path(file_path).name} (Total pages: {total_pages})\n\n{e}"
+        )
 
-    pdf_writer = PdfWriter()
-    file_toc_entries = []
-    current_page_num = 0
-    max_width = 0.0
-    max_height = 0.0
-    temp_pdf_files = []  # Track temp files for cleanup
-    open_files = []  # Keep all file handles open for the entire merge
-    image_temp_map = {}  # Map (image_path, usage_index) to temp PDF path
+    if entry.reverse:
+        page_indices = list(reversed(page_indices))
+
+    has_explicit_range = (
+        entry.page_range and entry.page_range.strip().lower() not in ["all", ""]
+    )
+    check_blank = options.delete_blank_pages and not has_explicit_range and check_blanks
+
+    # Sizes come from the page tree scan; page objects are only
+    # materialised when a page has to be checked for blankness.
+    blanks = set()
+    if check_blank:
+        blanks = blank_pages(
+            _raster_source(pdf_path, entry, pdf_reader, options), page_indices,
+            lambda idx: analyse_page(pdf_reader.pages[idx]), options, cancelled,
+            cache_path=file_path if entry.data is None else "",
+        )
+    pages = [
+        PageGeometry(idx, *geometry.placed_size(idx, entry.rotation), idx in blanks)
+        for idx in page_indices
+    ]
+
+    return _SourceFile(
+        entry, pdf_path, is_image, pdf_reader, geometry, page_indices, pages,
+        pooled=entry.data is None and (not is_image or bool(options.image_cache_dir)),
+        owns_stream=owns_stream,
+        stream=stream if entry.data is not None else None,
+    )
+
+
+def _raster_source(pdf_path: str, entry: FileEntry, reader: PdfReader,
+                   options: MergeOptions):
+    """What the raster blank check renders: the file, or an in-memory input's bytes."""
+    if entry.data is None or not options.raster_blank_enabled:
+        return pdf_path
+    stream = reader.stream
+    position = stream.tell()
+    try:
+        stream.seek(0)
+        return stream.read()
+    finally:
+        stream.seek(position)
+
+
+def _park_source(source: _SourceFile, open_files: list, checked_out: list) -> None:
+    """
+    Drop a prepared input's parsed reader until the copy pass needs it
+    (streaming merges), so the prepass holds one parsed input at a time.
+    Pooled readers go back to the pool, which keeps them within its own
+    budget; temporary image PDFs are closed; in-memory inputs keep only
+    their stream.
+    """
+    if source.pooled:
+        checked_out.remove(source.reader)
+        get_document_pool().release(source.reader)
+    elif source.entry.data is None:
+        pdf_file = source.reader.stream
+        pdf_file.close()
+        open_files.remove(pdf_file)
+    source.reader = None
+
+
+def _unpark_source(source: _SourceFile, open_files: list, checked_out: list) -> None:
+    """Parse a parked input again for the copy pass."""
+    if source.reader is not None:
+        return
+    if source.pooled:
+        reader = get_document_pool().acquire(source.pdf_path)
+        checked_out.append(reader)
+    elif source.entry.data is None:
+        pdf_file = get_file_budget().open(source.pdf_path)
+        open_files.append(pdf_file)
+        reader = PdfReader(pdf_file)
+    else:
+        reader = PdfReader(source.stream)
+    source.reader = reader
+
+
+def _release_source(source: _SourceFile, open_files: list, checked_out: list) -> None:
+    if source.reader is None:
+        return  # parked, and not needed again
+    if source.pooled:
+        checked_out.remove(source.reader)
+        get_document_pool().release(source.reader, reusable=not source.mutated)
+    elif source.owns_stream:
+        pdf_file = source.reader.stream
+        pdf_file.close()
+        open_files.remove(pdf_file)
+
+
+def _scaling_size(source: _SourceFile) -> Tuple[float, float]:
+    """Largest placed size of the input's kept pages, for the scaling target."""
+    # Image pages never contributed to the scaling target
+    if source.is_image:
+        return 0.0, 0.0
+    kept = [geometry for geometry in source.pages if not geometry.blank]
+    return (
+        max((geometry.width for geometry in kept), default=0.0),
+        max((geometry.height for geometry in kept), default=0.0),
+    )
+
+
+def _close_quietly(f) -> None:
+    try:
+        f.close()
+    except Exception:
+        pass
+
+
+def _is_passthrough(options: MergeOptions) -> bool:
+    """
+    True when no enabled option rewrites page content, so pages can be
+    copied byte-for-byte. Per-file rotation only changes /Rotate and is
+    still allowed.
+    """
+    return not (
+        options.delete_blank_pages
+        or options.scaling_enabled
+        or options.compression_enabled
+        or (options.watermark_enabled and options.watermark_text.strip())
+    )
+
+
+def _page_ops_enabled(options: MergeOptions) -> bool:
+    """True when an option modifies parsed source pages in place."""
+    return bool(
+        options.scaling_enabled
+        or options.compression_enabled
+        or (options.watermark_enabled and options.watermark_text.strip())
+    )
+
+
+def uses_streaming_writer(options: MergeOptions, to_sink: bool = False) -> bool:
+    """
+    True when the PyPDF2 engine writes the job through StreamingPdfWriter,
+    one input at a time, rather than building it in a PdfWriter. Plain
+    concatenations always take the raw pass-through fast path, and
+    resource deduplication happens as objects are copied; both need the
+    streaming writer, as do journalled or cached segments, the page cache
+    and writing to a sink (``to_sink``) that may not be seekable.
+    """
+    return bool(
+        options.streaming_output
+        or _is_passthrough(options)
+        or options.dedupe_resources
+        or options.journal_dir
+        or options.segment_cache_dir
+        or (options.page_cache_dir and _page_ops_enabled(options))
+        or to_sink
+    )
+
+
+def _page_reference(pdf_writer, index: int):
+    if isinstance(pdf_writer, StreamingPdfWriter):
+        return pdf_writer.page_reference(index)
+    return pdf_writer.pages[index].indirect_reference
+
+
+def _insert_toc(pdf_writer, toc_entries: List[Dict], content_pages: int,
+                file_info_list: Optional[List[str]]) -> int:
+    """
+    Put the rendered TOC pages at the front of the writer, with link
+    annotations to the already-written destination pages, so the TOC is
+    part of the single output write. Returns the number of TOC pages.
+    """
+    toc_doc, links = render_toc_pages(toc_entries, file_info_list)
+    num_toc_pages = toc_doc.page_count
+    toc_reader = PdfReader(io.BytesIO(toc_doc.tobytes()))
+    toc_doc.close()
+
+    annots: Dict[int, ArrayObject] = {}
+    for toc_page_idx, rect, dest_page_index in links:
+        # Destinations are given in final numbering; the content pages
+        # are still at their pre-TOC positions in the writer.
+        target = dest_page_index - num_toc_pages
+        if not 0 <= target < content_pages:
+            continue
+        annots.setdefault(toc_page_idx, ArrayObject()).append(DictionaryObject({
+            NameObject("/Type"): NameObject("/Annot"),
+            NameObject("/Subtype"): NameObject("/Link"),
+            NameObject("/Rect"): ArrayObject([
+                FloatObject(rect.x0), FloatObject(TOC_PAGE_HEIGHT - rect.y1),
+                FloatObject(rect.x1), FloatObject(TOC_PAGE_HEIGHT - rect.y0),
+            ]),
+            NameObject("/Border"): ArrayObject([NumberObject(0)] * 3),
+            NameObject("/Dest"): ArrayObject(
+                [_page_reference(pdf_writer, target), NameObject("/Fit")]
+            ),
+        }))
+
+    for toc_page_idx, page in enumerate(toc_reader.pages):
+        if toc_page_idx in annots:
+            page[NameObject("/Annots")] = annots[toc_page_idx]
+        pdf_writer.insert_page(page, toc_page_idx)
+    if isinstance(pdf_writer, StreamingPdfWriter):
+        pdf_writer.end_segment()
+    return num_toc_pages
+
+
+def _write_source_pages(
+    pdf_writer,
+    source: _SourceFile,
+    options: MergeOptions,
+    passthrough: bool,
+    page_ops_enabled: bool,
+    max_width: float,
+    max_height: float,
+    cancelled: Callable[[], bool],
+    progress: ProgressTracker,
+    page_cache: Optional[PageCache] = None,
+) -> Tuple[int, int]:
+    """
+    Write one input's output pages: its breaker page, if enabled, followed
+    by the selected pages with every page option applied. Cancellation is
+    checked before each page. Transformed pages are taken from, or added
+    to, page_cache if given (streaming writers only). Returns (breaker
+    pages, pages written).
+    """
+    file_path = source.entry.path
+    rotation = source.entry.rotation
+    pdf_reader = source.reader
+    breaker_pages = 0
+    written = 0
+
+    # ------------------------------------------------------------------
+    # Insert breaker page before every file if enabled
+    # ------------------------------------------------------------------
+    if options.add_breaker_pages:
+        breaker_label = Path(file_path).name
+        if options.breaker_uniform_size:
+            breaker_width = 612.0  # 8.5 inches * 72
+            breaker_height = 792.0 # 11 inches * 72
+        else:
+            if source.geometry.page_count > 0:
+                breaker_width, breaker_height = source.geometry.placed_size(
+                    0, rotation
+                )
+            else:
+                breaker_width = 612.0
+                breaker_height = 792.0
+        breaker_page = create_page_with_filename(
+            breaker_label, breaker_width, breaker_height
+        )
+        pdf_writer.add_page(breaker_page)
+        source.breaker_page = breaker_page
+        breaker_pages = written = 1
+        progress.page_done()
+
+    # ------------------------------------------------------------------
+    # Process each page
+    # ------------------------------------------------------------------
+    raw_refs = None
+    if passthrough and len(source.geometry.refs) == source.geometry.page_count:
+        raw_refs = source.geometry.refs
+
+    file_key = None
+    if page_cache is not None and raw_refs is None:
+        transform = page_transform_hash(
+            options, rotation, (max_width, max_height), "pypdf2"
+        )
+        if transform is not None:
+            file_key = page_cache.file_key(file_path, transform)
 
-    # ----------------------------------------------------------------------
-    # First pass: determine max page size (for scaling)
-    # ----------------------------------------------------------------------
-    image_usage_counter = {}
-    for i, entry in enumerate(files):
+    for geometry in source.pages:
         if cancelled():
             raise RuntimeError("Merge cancelled")
-        if progress_callback:
-            progress_callback(i, len(files), f"Preparing: {os.path.basename(entry.path)}")
-        file_path = entry.path
-        rotation = entry.rotation
-        page_range = entry.page_range
-        reverse = entry.reverse
-
-        pdf_path = file_path
-        is_image = file_path.lower().endswith(
-            (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif")
-        )
-
-        # Convert images to unique temporary PDFs (do not open them yet)
-        if is_image:
-            usage_idx = image_usage_counter.get(file_path, 0)
-            image_usage_counter[file_path] = usage_idx + 1
-            pdf_path = image_to_pdf(file_path)
-            temp_pdf_files.append(pdf_path)
-            image_temp_map[(file_path, usage_idx)] = pdf_path
-
-        # Only open the file for reading if not an image (for first pass)
-        if not is_image:
-            pdf_file = open(pdf_path, "rb")
-            open_files.append(pdf_file)
-            pdf_reader = PdfReader(pdf_file)
-            total_pages = len(pdf_reader.pages)
 
-            try:
-                page_indices = parse_page_range(page_range, total_pages)
-            except ValueError:
+        if raw_refs is not None:
+            pdf_writer.add_raw_page(
+                pdf_reader,
+                raw_refs[geometry.index],
+                rotation,
+                source.geometry.pages[geometry.index],
+            )
+            written += 1
+            progress.page_done()
+            continue
+
+        # Skip blank pages (classified once during the prepass)
+        if geometry.blank:
+            continue
+
+        cache_key = None
+        if file_key is not None:
+            cache_key = page_cache.page_key(file_key, geometry.index)
+            cached = page_cache.get(cache_key)
+            if cached is not None and _add_cached_page(pdf_writer, cached):
+                written += 1
+                progress.page_done()
                 continue
 
-            if reverse:
-                page_indices = list(reversed(page_indices))
+        page = pdf_reader.pages[geometry.index]
+        if page_ops_enabled or rotation != 0:
+            source.mutated = True
+
+        # Rotation
+        if rotation != 0:
+            page.rotate(rotation)
 
-            has_explicit_range = (
-                page_range and page_range.strip().lower() not in ["all", ""]
+        # Image recompression first: form scaling moves the page's images
+        # into the form, out of the page's own resources
+        if options.compression_enabled:
+            progress.images(compress_page(page, options.compression_level))
+
+        # Scaling
+        fit_page = scale_page_as_form if options.scaling_form_xobject else scale_page
+        if options.scaling_enabled:
+            if options.scaling_mode == "Percent":
+                # Scale by percent (relative to current size)
+                percent = max(1, min(100, options.scaling_percent))
+                box = page.mediabox
+                current_width = float(box.width)
+                current_height = float(box.height)
+                scale = percent / 100.0
+                target_width = current_width * scale
+                target_height = current_height * scale
+                fit_page(page, target_width, target_height)
+            elif max_width > 0 and max_height > 0:
+                fit_page(page, max_width, max_height)
+
+        # Watermark
+        if (
+            options.watermark_enabled
+            and options.watermark_text.strip()
+        ):
+            add_watermark(
+                page,
+                options.watermark_text.strip(),
+                options.watermark_opacity,
+                options.watermark_font_size,
+                options.watermark_rotation,
+                options.watermark_position.lower(),
+                options.watermark_safe_mode,
+                options.watermark_font_color
             )
 
-            for idx in page_indices:
-                page = pdf_reader.pages[idx]
+        if cache_key is not None:
+            page_cache.put(cache_key, _single_page_pdf(page))
+        pdf_writer.add_page(page)
+        written += 1
+        progress.page_done()
+
+    return breaker_pages, written
+
+
+def _single_page_pdf(page: PageObject) -> bytes:
+    """A transformed page as a standalone one-page PDF, for the page cache."""
+    buffer = io.BytesIO()
+    writer = StreamingPdfWriter(buffer)
+    writer.add_page(page)
+    writer.finish()
+    return buffer.getvalue()
+
+
+def _add_cached_page(pdf_writer: StreamingPdfWriter, data: bytes) -> bool:
+    """Copy a page-cache entry to the output; False if it is unreadable."""
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        geometry = scan_reader(reader)
+    except Exception:
+        return False
+    if geometry.page_count != 1:
+        return False
+    if len(geometry.refs) == 1:
+        pdf_writer.add_raw_page(reader, geometry.refs[0], 0, geometry.pages[0])
+    else:
+        pdf_writer.add_page(reader.pages[0])
+    return True
+
+
+def _append_segment(pdf_writer: StreamingPdfWriter, segment) -> None:
+    """Copy a journalled segment's already-processed pages unchanged."""
+    if segment.pages == 0:
+        return
+    with get_file_budget().open(segment.path) as segment_file:
+        reader = PdfReader(segment_file)
+        geometry = scan_reader(reader)
+        if len(geometry.refs) == geometry.page_count:
+            for ref, box in zip(geometry.refs, geometry.pages):
+                pdf_writer.add_raw_page(reader, ref, 0, box)
+        else:
+            for page in reader.pages:
+                pdf_writer.add_page(page)
+        pdf_writer.end_segment()
 
-                if (
-                    options.delete_blank_pages
-                    and not has_explicit_range
-                    and is_page_blank(page)
-                ):
-                    continue
 
-                box = page.mediabox
-                width = float(box.width)
-                height = float(box.height)
-                if rotation in [90, 270]:
-                    width, height = height, width
-
-                max_width = max(max_width, width)
-                max_height = max(max_height, height)
-
-    # ----------------------------------------------------------------------
-    # Second pass: process files
-    # ----------------------------------------------------------------------
-    image_usage_counter = {}
-    for i, entry in enumerate(files):
-        if cancelled():
-            raise RuntimeError("Merge cancelled")
+# ---------------------------------------------------------------------------
+# Merge engines
+# ---------------------------------------------------------------------------
 
-        file_path = entry.path
-        rotation = entry.rotation
-        page_range = entry.page_range
-        reverse = entry.reverse
+def _load_pymupdf_engine():
+    from core.fitz_merger import merge_files_fitz
+    return merge_files_fitz
 
-        if progress_callback:
-            progress_callback(i, len(files), file_path)
 
-        pdf_path = file_path
-        is_image = file_path.lower().endswith(
-            (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tiff", ".tif")
+# Engine name -> loader returning a callable with merge_files' signature.
+# Loaders are imported lazily so an engine's dependencies are only needed
+# when it is actually selected.
+MERGE_ENGINES: Dict[str, Callable[[], Callable]] = {
+    "pypdf2": lambda: _merge_pypdf2,
+    "pymupdf": _load_pymupdf_engine,
+}
+
+
+def get_merge_engine(name: str) -> Callable:
+    loader = MERGE_ENGINES.get((name or "pypdf2").lower())
+    if loader is None:
+        raise ValueError(
+            f"Unknown merge engine '{name}'. Available: {', '.join(sorted(MERGE_ENGINES))}"
         )
+    return loader()
 
-        # Convert images to unique temporary PDFs (use the correct temp file for each usage)
-        if is_image:
-            usage_idx = image_usage_counter.get(file_path, 0)
-            image_usage_counter[file_path] = usage_idx + 1
-            pdf_path = image_temp_map[(file_path, usage_idx)]
-            pdf_file = open(pdf_path, "rb")
-            open_files.append(pdf_file)
-        else:
-            pdf_file = open(pdf_path, "rb")
-            open_files.append(pdf_file)
-        pdf_reader = PdfReader(pdf_file)
-        total_pages = len(pdf_reader.pages)
-
-        # --------------------------------------------------------------
-        # Insert breaker page before every file if enabled
-        # --------------------------------------------------------------
-        if options.add_breaker_pages:
-            breaker_label = Path(file_path).name
-            if options.breaker_uniform_size:
-                breaker_width = 612.0  # 8.5 inches * 72
-                breaker_height = 792.0 # 11 inches * 72
-            else:
-                if len(pdf_reader.pages) > 0:
-                    first_page = pdf_reader.pages[0]
-                    breaker_width = float(first_page.mediabox.width)
-                    breaker_height = float(first_page.mediabox.height)
-                    if rotation in [90, 270]:
-                        breaker_width, breaker_height = breaker_height, breaker_width
-                else:
-                    breaker_width = 612.0
-                    breaker_height = 792.0
-            breaker_page = create_page_with_filename(
-                breaker_label, breaker_width, breaker_height
-            )
-            pdf_writer.add_page(breaker_page)
-            current_page_num += 1
-
-        # --------------------------------------------------------------
-        # Parse page range
-        # --------------------------------------------------------------
-        try:
-            page_indices = parse_page_range(page_range, total_pages)
-        except ValueError as e:
-            raise ValueError(
-                f"{Path(file_path).name} (Total pages: {total_pages})\n\n{e}"
+
+def merge_files(
+    files: List[FileEntry],
+    output_path: str,
+    options: MergeOptions,
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    cancel_callback: Optional[Callable[[], bool]] = None,
+    event_callback: Optional[Callable[[ProgressEvent], None]] = None,
+):
+    """
+    Merge ``files`` into ``output_path`` and return a MergeReport.
+
+    ``progress_callback(index, total, label)`` is called once per input;
+    ``event_callback`` receives structured ProgressEvents (stages, pages,
+    bytes, recompressed images, rates and ETA), see core.progress.
+    """
+    engine = get_merge_engine(getattr(options, "merge_engine", "pypdf2"))
+
+    cache = job_key = None
+    if getattr(options, "segment_cache_dir", ""):
+        cache = get_segment_cache(options.segment_cache_dir)
+        job_key = cache.job_key(files, options, output_path)
+        previous = cache.unchanged_output(job_key, output_path)
+        if previous is not None:
+            return MergeReport(
+                output_path, pages=previous["pages"],
+                output_bytes=os.path.getsize(output_path), unchanged=True,
             )
 
-        if reverse:
-            page_indices = list(reversed(page_indices))
+    report = engine(
+        files, output_path, options, progress_callback, cancel_callback, event_callback
+    )
+    if cache is not None:
+        cache.record_output(job_key, output_path, report.pages)
+    return report
+
+
+def merge_streams(
+    inputs: List[Union[FileEntry, Tuple[str, Any]]],
+    sink: BinaryIO,
+    options: MergeOptions,
+    output_name: str = "",
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    cancel_callback: Optional[Callable[[], bool]] = None,
+    event_callback: Optional[Callable[[ProgressEvent], None]] = None,
+) -> MergeReport:
+    """
+    Merge in-memory inputs into any writable binary ``sink`` (only write()
+    is needed) and return a MergeReport.
+
+    Each input is a FileEntry whose ``data`` is bytes or a binary stream,
+    or a (name, data) pair; the name stands in for the file name (breaker
+    labels, bookmarks, TOC entries, images recognised by extension).
+    Seekable streams are parsed in place, other streams are spooled.
+    Nothing touches the filesystem unless an intermediate (the unencrypted
+    output of an encrypted job, a spooled input) outgrows
+    options.spool_max_mb. ``output_name`` names the output in the TOC.
+
+    Runs the PyPDF2 engine. The journal, segment cache and page cache key
+    their work by input file and are not used.
+    """
+    if getattr(options, "merge_engine", "pypdf2") != "pypdf2":
+        raise ValueError("merge_streams supports the 'pypdf2' merge engine only")
+    entries = []
+    for item in inputs:
+        if isinstance(item, FileEntry):
+            if item.data is None:
+                raise ValueError(f"No data given for input '{item.path}'")
+            entries.append(item)
+        else:
+            name, data = item
+            entries.append(FileEntry(name, data=data))
+    options = replace(options, journal_dir="", segment_cache_dir="", page_cache_dir="",
+                      image_cache_dir="", analysis_cache_dir="")
+    report = _merge_pypdf2(
+        entries, output_name, options, progress_callback, cancel_callback,
+        event_callback, sink=sink,
+    )
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Main merge pipeline (PyPDF2 engine)
+# ---------------------------------------------------------------------------
 
-        has_explicit_range = (
-            page_range and page_range.strip().lower() not in ["all", ""]
+
+def _merge_pypdf2(
+    files: List[FileEntry],
+    output_path: str,
+    options: MergeOptions,
+    progress_callback: Optional[Callable[[int, int, str], None]] = None,
+    cancel_callback: Optional[Callable[[], bool]] = None,
+    event_callback: Optional[Callable[[ProgressEvent], None]] = None,
+    sink: Optional[BinaryIO] = None,
+):
+    # Pooled readers still checked out when the merge stops early (error or
+    # cancel) may be half-modified; close them instead of pooling them
+    checked_out: List[PdfReader] = []
+    budget = get_file_budget()
+    budget.configure(max_open=options.max_open_files, use_mmap=options.mmap_inputs)
+    budget.reset_peak()
+    stats_before = budget.stats()
+    progress = ProgressTracker(
+        event_callback, len(files), read_clock=lambda: budget.stats().read_seconds
+    )
+    try:
+        report = _merge_pypdf2_inputs(
+            files, output_path, options, progress_callback, cancel_callback, checked_out,
+            progress, sink,
         )
+        budget_stats = budget.stats()
+        report.peak_open_files = budget_stats.peak_open
+        report.file_reopens = budget_stats.reopens - stats_before.reopens
+        report.read_seconds = budget_stats.read_seconds - stats_before.read_seconds
+        report.bytes_read = budget_stats.bytes_read - stats_before.bytes_read
+        report.mapped_inputs = budget_stats.mapped
+        report.stages = list(progress.stages)
+        report.peak_rss_bytes = progress.peak_rss
+        return report
+    finally:
+        for reader in checked_out:
+            get_document_pool().release(reader, reusable=False)
+
+
+def _merge_pypdf2_inputs(
+    files: List[FileEntry],
+    output_path: str,
+    options: MergeOptions,
+    progress_callback: Optional[Callable[[int, int, str], None]],
+    cancel_callback: Optional[Callable[[], bool]],
+    checked_out: List[PdfReader],
+    progress: ProgressTracker,
+    sink: Optional[BinaryIO] = None,
+):
+    """
+    The PyPDF2 merge. The output goes to ``sink`` if given (output_path is
+    then only its name, for the TOC), else to the file output_path.
+    """
+    def cancelled():
+        return cancel_callback and cancel_callback()
 
-        file_start_page = current_page_num
+    resumed_segments = 0
 
-        # --------------------------------------------------------------
-        # Add filename bookmark
-        # --------------------------------------------------------------
-        parent_bookmark = None
-        if options.add_filename_bookmarks and len(page_indices) > 0:
-            bookmark_title = Path(file_path).stem
-            parent_bookmark = pdf_writer.add_outline_item(
-                bookmark_title, current_page_num
+    file_toc_entries = []
+    bookmarks = []  # (title, page index) per input
+    current_page_num = 0
+    max_width = 0.0
+    max_height = 0.0
+    temp_pdf_files = []  # Track temp files for cleanup
+    open_files = []  # Keep all file handles open for the entire merge
+    sources: List[_SourceFile] = []
+    # The output file is written under a temporary name next to it and
+    # renamed over output_path only once complete, so a failed or
+    # cancelled merge leaves an existing file untouched
+    partial_output = None
+    if sink is None:
+        partial_output = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+
+    try:
+        # ----------------------------------------------------------------------
+        # Prepass: parse every input once and determine max page size (for scaling)
+        # ----------------------------------------------------------------------
+        progress.stage_start(STAGE_PREPARE)
+        journal = open_prepass_journal(files, options)
+        # A streaming merge copies one input at a time, so the prepass keeps
+        # only one parsed at a time too and the copy pass parses each again;
+        # peak memory then follows the largest input, not the whole job
+        streaming = uses_streaming_writer(options, sink is not None)
+        pages_total = 0
+        for i, entry in enumerate(files):
+            if cancelled():
+                raise RuntimeError("Merge cancelled")
+            if progress_callback:
+                progress_callback(i, len(files), f"Preparing: {os.path.basename(entry.path)}")
+            progress.file_started(i, entry.path)
+
+            # Inputs a resumed journal already holds need no blank analysis;
+            # their segment recorded their share of the scaling target
+            resumed = journal.completed(i) if journal is not None else None
+            check_blanks = resumed is None or resumed.size is None
+            source = _open_source(
+                entry, options, temp_pdf_files, open_files, checked_out, cancelled,
+                check_blanks,
             )
+            sources.append(source)
 
-        # --------------------------------------------------------------
-        # Process each page
-        # --------------------------------------------------------------
-        for idx in page_indices:
-            page = pdf_reader.pages[idx]
-
-            # Skip blank pages
-            if (
-                options.delete_blank_pages
-                and not has_explicit_range
-                and is_page_blank(page)
-            ):
-                continue
+            if check_blanks:
+                width, height = _scaling_size(source)
+                pages_total += sum(1 for geometry in source.pages if not geometry.blank)
+                pages_total += 1 if options.add_breaker_pages else 0
+            else:
+                width, height = resumed.size
+                pages_total += resumed.pages
+            max_width = max(max_width, width)
+            max_height = max(max_height, height)
+            if streaming:
+                _park_source(source, open_files, checked_out)
+
+        # Finished inputs are kept as segments in the segment cache or the
+        # resumable journal, when either is enabled
+        journal = open_segment_store(files, options, (max_width, max_height), journal)
+
+        progress.pages_total = pages_total
+        progress.stage_end()
+
+        # ----------------------------------------------------------------------
+        # Output target: the output file or the caller's sink; if encryption is
+        # needed, a memory-first SpillBuffer that is encrypted into it at the end
+        # ----------------------------------------------------------------------
+        needs_encryption = getattr(options, "encrypt_enabled", False) and (getattr(options, "encrypt_user_pw", "") or getattr(options, "encrypt_owner_pw", ""))
+        spool = None
+        if needs_encryption:
+            spool = SpillBuffer(options.spool_max_mb * 1024 * 1024)
+            open_files.append(spool)
+
+        def open_output():
+            """(stream for the unencrypted PDF, whether to close it after)"""
+            if spool is not None:
+                return spool, False
+            if sink is not None:
+                return sink, False
+            return open(partial_output, "wb"), True
+
+        passthrough = _is_passthrough(options)
+        page_ops_enabled = _page_ops_enabled(options)
+        # Cached pages are copied from their own one-page PDFs, so resources
+        # the pages shared in the source (fonts, the watermark font) are
+        # deduplicated to keep them stored once
+        page_cache = open_page_cache(options) if page_ops_enabled else None
+        if streaming:
+            stream_out, owns_output = open_output()
+            if owns_output:
+                open_files.append(stream_out)
+            pdf_writer = StreamingPdfWriter(
+                stream_out, dedupe=options.dedupe_resources or page_cache is not None
+            )
+        else:
+            pdf_writer = PdfWriter()
+
+        # ----------------------------------------------------------------------
+        # Second pass: copy pages, reusing the readers opened above (parsed
+        # again here, one at a time, when streaming)
+        # ----------------------------------------------------------------------
+        progress.stage_start(STAGE_PAGES)
+        for i, source in enumerate(sources):
+            if cancelled():
+                raise RuntimeError("Merge cancelled")
+
+            file_path = source.entry.path
+            page_indices = source.page_indices
+
+            if progress_callback:
+                progress_callback(i, len(files), file_path)
+            progress.file_started(i, file_path)
+
+            page_args = (
+                source, options, passthrough, page_ops_enabled, max_width, max_height,
+                cancelled, progress, page_cache,
+            )
+            segment = journal.completed(i) if journal is not None else None
+            if segment is None:
+                _unpark_source(source, open_files, checked_out)
+            if segment is not None:
+                # Finished by an earlier run of the same job
+                resumed_segments += 1
+                progress.page_done(segment.pages)
+            elif journal is not None:
+                # Checkpoint this input's pages before they go to the output
+                part_path = journal.begin(i)
+                try:
+                    with open(part_path, "wb") as part_file:
+                        segment_writer = StreamingPdfWriter(
+                            part_file, dedupe=page_cache is not None
+                        )
+                        breaker_pages, written = _write_source_pages(segment_writer, *page_args)
+                        segment_writer.finish()
+                except BaseException:
+                    journal.abandon(i)
+                    raise
+                segment = journal.commit(i, written, breaker_pages, _scaling_size(source))
+
+            if segment is not None:
+                _append_segment(pdf_writer, segment)
+                breaker_pages, written = segment.breaker_pages, segment.pages
+            else:
+                breaker_pages, written = _write_source_pages(pdf_writer, *page_args)
+
+            file_start_page = current_page_num + breaker_pages
+            current_page_num += written
+
+            # --------------------------------------------------------------
+            # Filename bookmark (added once its page exists, see below)
+            # --------------------------------------------------------------
+            if options.add_filename_bookmarks and len(page_indices) > 0:
+                bookmarks.append((Path(file_path).stem, file_start_page))
+
+            # --------------------------------------------------------------
+            # Streaming: this input is fully written, release its reader
+            # --------------------------------------------------------------
+            if streaming:
+                pdf_writer.end_segment()
+                _release_source(source, open_files, checked_out)
+                sources[i] = None
+                source = None
+                progress.bytes(pdf_writer.bytes_written)
+
+            # --------------------------------------------------------------
+            # TOC entry
+            # --------------------------------------------------------------
+            if (options.insert_toc) and len(page_indices) > 0:
+                toc_entry = {
+                    "filename": Path(file_path).name,
+                    "page": file_start_page,
+                }
+                if getattr(options, 'toc_fileinfo_mode', 'none') == 'fullpath':
+                    toc_entry["fullpath"] = str(Path(file_path).resolve())
+                file_toc_entries.append(toc_entry)
 
-            # Rotation
-            if rotation != 0:
-                page.rotate(rotation)
-
-            # Scaling
-            if options.scaling_enabled:
-                if options.scaling_mode == "Percent":
-                    # Scale by percent (relative to current size)
-                    percent = max(1, min(100, options.scaling_percent))
-                    box = page.mediabox
-                    current_width = float(box.width)
-                    current_height = float(box.height)
-                    scale = percent / 100.0
-                    target_width = current_width * scale
-                    target_height = current_height * scale
-                    scale_page(page, target_width, target_height)
-                elif max_width > 0 and max_height > 0:
-                    scale_page(page, max_width, max_height)
-
-            # Watermark
-            if (
-                options.watermark_enabled
-                and options.watermark_text.strip()
-            ):
-                add_watermark(
-                    page,
-                    options.watermark_text.strip(),
-                    options.watermark_opacity,
-                    options.watermark_font_size,
-                    options.watermark_rotation,
-                    options.watermark_position.lower(),
-                    options.watermark_safe_mode,
-                    options.watermark_font_color
-                )
+        if cancelled():
+            raise RuntimeError("Merge cancelled")
+        progress.stage_end()
+
+        # Bookmarks are added after their pages, so PdfWriter resolves them to
+        # page references that stay correct when the TOC is put in front
+        for bookmark_title, page_index in bookmarks:
+            pdf_writer.add_outline_item(bookmark_title, page_index)
+
+        # ----------------------------------------------------------------------
+        # TOC pages go in front of the content in the same write; the page
+        # count depends only on the number of entries, so outline entries and
+        # TOC links are resolved here without reopening the output
+        # ----------------------------------------------------------------------
+        if options.insert_toc and len(file_toc_entries) > 0:
+            toc_fileinfo_mode = getattr(options, 'toc_fileinfo_mode', 'none')
+            file_info_list = None
+            if sink is not None:
+                # Only a name is known for a sink
+                if toc_fileinfo_mode != "none" and output_path:
+                    file_info_list = [str(Path(output_path).name)]
+            elif toc_fileinfo_mode == "filename":
+                # Use the merged output PDF's filename
+                file_info_list = [str(Path(output_path).name)]
+            elif toc_fileinfo_mode == "fullpath":
+                # Use the merged output PDF's full path
+                file_info_list = [str(Path(output_path).resolve())]
+            progress.stage_start(STAGE_TOC)
+            current_page_num += _insert_toc(
+                pdf_writer, file_toc_entries, current_page_num, file_info_list
+            )
+            progress.stage_end()
 
-            pdf_writer.add_page(page)
-            current_page_num += 1
-
-
-        # --------------------------------------------------------------
-        # TOC entry
-        # --------------------------------------------------------------
-        if (options.insert_toc) and len(page_indices) > 0:
-            toc_entry = {
-                "filename": Path(file_path).name,
-                "page": file_start_page,
-            }
-            if getattr(options, 'toc_fileinfo_mode', 'none') == 'fullpath':
-                toc_entry["fullpath"] = str(Path(file_path).resolve())
-            file_toc_entries.append(toc_entry)
-
-    if cancelled():
-        raise RuntimeError("Merge cancelled")
-
-    # ----------------------------------------------------------------------
-    # Metadata
-    # ----------------------------------------------------------------------
-    metadata = {}
-    if options.metadata_enabled and any(
-    getattr(options, k).strip()
-    for k in ("pdf_title", "pdf_author", "pdf_subject", "pdf_keywords")
-    ):
-        if options.pdf_title.strip():
-            metadata["/Title"] = options.pdf_title
-
-        if options.pdf_author.strip():
-            metadata["/Author"] = options.pdf_author
-
-        if options.pdf_subject.strip():
-            metadata["/Subject"] = options.pdf_subject
-
-        if options.pdf_keywords.strip():
-            metadata["/Keywords"] = options.pdf_keywords
-
-    pdf_writer.add_metadata(metadata)
-
-    # ----------------------------------------------------------------------
-    # Write output PDF (with TOC inserted before encryption if needed)
-    # ----------------------------------------------------------------------
-    final_output_path = output_path
-    needs_encryption = getattr(options, "encrypt_enabled", False) and (getattr(options, "encrypt_user_pw", "") or getattr(options, "encrypt_owner_pw", ""))
-    temp_unencrypted_path = None
-
-    if needs_encryption:
-        # Write unencrypted PDF to temp file
-        import tempfile
-        fd, temp_unencrypted_path = tempfile.mkstemp(suffix=".pdf")
-        os.close(fd)
-        out_path = temp_unencrypted_path
-    else:
-        out_path = output_path
+        # ----------------------------------------------------------------------
+        # Metadata
+        # ----------------------------------------------------------------------
+        metadata = {}
+        if options.metadata_enabled and any(
+        getattr(options, k).strip()
+        for k in ("pdf_title", "pdf_author", "pdf_subject", "pdf_keywords")
+        ):
+            if options.pdf_title.strip():
+                metadata["/Title"] = options.pdf_title
 
-    if progress_callback:
-        progress_callback(len(files), len(files), "Writing combined PDF...")
+            if options.pdf_author.strip():
+                metadata["/Author"] = options.pdf_author
 
-    with open(out_path, "wb") as out_file:
-        if options.compression_enabled:
-            for page in pdf_writer.pages:
-                compress_page(page, options.compression_level)
-        pdf_writer.write(out_file)
-
-    # Insert TOC pages (PyMuPDF) before encryption
-    if options.insert_toc and len(file_toc_entries) > 0:
-        toc_fileinfo_mode = getattr(options, 'toc_fileinfo_mode', 'none')
-        file_info_list = None
-        if toc_fileinfo_mode == "filename":
-            # Use the merged output PDF's filename
-            file_info_list = [str(Path(output_path).name)]
-        elif toc_fileinfo_mode == "fullpath":
-            # Use the merged output PDF's full path
-            file_info_list = [str(Path(output_path).resolve())]
-        insert_toc_pages(out_path, file_toc_entries, file_info_list=file_info_list)
-
-    # If encryption is needed, use PyMuPDF to encrypt after TOC insertion
-    if needs_encryption:
-        import fitz  # PyMuPDF
-        user_pw = getattr(options, "encrypt_user_pw", "")
-        owner_pw = getattr(options, "encrypt_owner_pw", "")
-        doc = fitz.open(temp_unencrypted_path)
-        # Use owner_pw if set, else user_pw for both
-        pw_owner = owner_pw if owner_pw else user_pw
-        pw_user = user_pw if user_pw else owner_pw
-        # Save with encryption
-        doc.save(output_path, encryption=fitz.PDF_ENCRYPT_AES_256,
-                 owner_pw=pw_owner, user_pw=pw_user,
-                 permissions=fitz.PDF_PERM_ACCESSIBILITY | fitz.PDF_PERM_PRINT | fitz.PDF_PERM_COPY | fitz.PDF_PERM_ANNOTATE)
-        doc.close()
-        os.remove(temp_unencrypted_path)
-
-    # Close all open file handles
-    for f in open_files:
-        try:
-            f.close()
-        except Exception:
-            pass
-    # Cleanup temp files
-    for temp_path in temp_pdf_files:
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
\ No newline at end of file
+            if options.pdf_subject.strip():
+                metadata["/Subject"] = options.pdf_subject
+
+            if options.pdf_keywords.strip():
+                metadata["/Keywords"] = options.pdf_keywords
+
+        pdf_writer.add_metadata(metadata)
+
+        # ----------------------------------------------------------------------
+        # Write output PDF
+        # ----------------------------------------------------------------------
+        if progress_callback:
+            progress_callback(len(files), len(files), "Writing combined PDF...")
+
+        progress.stage_start(STAGE_WRITE)
+        if streaming:
+            pdf_writer.finish()
+            output_bytes = pdf_writer.bytes_written
+            if owns_output:
+                stream_out.close()
+                open_files.remove(stream_out)
+        else:
+            out_file, owns_output = open_output()
+            try:
+                pdf_writer.write(out_file)
+                output_bytes = out_file.tell()
+            finally:
+                if owns_output:
+                    out_file.close()
+        progress.bytes(output_bytes)
+        progress.stage_end()
+
+        # PyPDF2 cannot write AES-256, so an encrypted job is written to the
+        # spool and re-saved once by PyMuPDF (the PyMuPDF engine does it directly)
+        if needs_encryption:
+            progress.stage_start(STAGE_ENCRYPT)
+            import fitz  # PyMuPDF
+            user_pw = getattr(options, "encrypt_user_pw", "")
+            owner_pw = getattr(options, "encrypt_owner_pw", "")
+            if spool.spilled:
+                spool.flush()
+                doc = fitz.open(spool.path)
+            else:
+                doc = fitz.open("pdf", bytes(spool.getbuffer()))
+            # Use owner_pw if set, else user_pw for both
+            pw_owner = owner_pw if owner_pw else user_pw
+            pw_user = user_pw if user_pw else owner_pw
+            # Save with encryption
+            save_args = dict(
+                encryption=fitz.PDF_ENCRYPT_AES_256, owner_pw=pw_owner, user_pw=pw_user,
+                permissions=fitz.PDF_PERM_ACCESSIBILITY | fitz.PDF_PERM_PRINT | fitz.PDF_PERM_COPY | fitz.PDF_PERM_ANNOTATE,
+            )
+            if sink is not None:
+                encrypted = doc.tobytes(**save_args)
+                sink.write(encrypted)
+                output_bytes = len(encrypted)
+            else:
+                doc.save(partial_output, **save_args)
+            doc.close()
+            spool.close()
+            open_files.remove(spool)
+            progress.stage_end()
+
+        # Return pooled readers (after an error or cancel, _merge_pypdf2
+        # closes those still checked out instead)
+        for source in sources:
+            if source is not None:
+                _release_source(source, open_files, checked_out)
+
+        if partial_output is not None:
+            os.replace(partial_output, output_path)
+            partial_output = None
+
+        # The output is complete; checkpoints are only kept for unfinished jobs
+        if journal is not None:
+            journal.finish()
+
+        report = MergeReport(
+            output_path, pages=current_page_num, resumed_segments=resumed_segments
+        )
+        if streaming:
+            report.duplicate_streams = pdf_writer.duplicate_streams
+            report.bytes_deduplicated = pdf_writer.bytes_deduplicated
+        if sink is not None:
+            report.output_bytes = output_bytes
+        else:
+            try:
+                report.output_bytes = os.path.getsize(output_path)
+            except OSError:
+                pass
+        return report
+    finally:
+        # Close all other open file handles and remove temporary files,
+        # whether the merge finished or not
+        for f in open_files:
+            _close_quietly(f)
+        for temp_path in temp_pdf_files:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        if partial_output is not None:
+            try:
+                os.remove(partial_output)
+            except OSError:
+                pass
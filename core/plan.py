@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+# core/plan.py
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from core.pdf_merger import (
+    IMAGE_EXTS,
+    MERGE_ENGINES,
+    FileEntry,
+    MergeOptions,
+    MergeReport,
+    _is_passthrough,
+    merge_files,
+    uses_streaming_writer,
+)
+from core.blank_pages import analyse_page
+from core.page_ops import parse_page_range
+from core.raster_blank import blank_pages
+from core.geometry import scan_pdf
+from core.doc_pool import get_document_pool
+from core.toc import TOC_PAGE_HEIGHT, TOC_PAGE_WIDTH, toc_page_count
+
+
+# ---------------------------------------------------------------------------
+# Merge plans
+#
+# compile_plan() turns a file list and MergeOptions into an immutable,
+# hashable description of the output: every output page in order with its
+# source and transforms, the generated breaker and TOC pages, and the TOC
+# and bookmark layout. Compiling reads only page-tree geometry (cached per
+# file), so it is cheap enough to run before every merge, and it reports
+# every problem in the job at once instead of failing on the first one
+# mid-merge. estimate_plan() turns a plan into a dry-run cost estimate.
+# ---------------------------------------------------------------------------
+
+PAGE_SOURCE = "source"
+PAGE_BREAKER = "breaker"
+PAGE_TOC = "toc"
+
+SCALING_MODES = ("Fit", "Fill", "Percent")
+COMPRESSION_LEVELS = ("Low", "Medium", "High", "Maximum")
+VALID_ROTATIONS = (0, 90, 180, 270)
+
+# Options that never reach the plan's hash or repr
+_SECRET_OPTIONS = ("encrypt_user_pw", "encrypt_owner_pw")
+
+
+class PlanError(ValueError):
+    """The job cannot run; ``problems`` lists every reason found."""
+
+    def __init__(self, problems: List[str]) -> None:
+        self.problems = list(problems)
+        super().__init__("\n".join(self.problems))
+
+
+@dataclass(frozen=True)
+class PlannedFile:
+    path: str
+    stamp: Tuple[int, int]  # (size, mtime_ns) at planning time
+    rotation: int
+    page_range: str
+    reverse: bool
+    is_image: bool
+    page_count: int
+    # Selected source pages in output order (before blank removal)
+    page_indices: Tuple[int, ...]
+    # True when blank pages are removed at merge time and were not
+    # classified while planning, so page_indices is an upper bound
+    blank_check: bool = False
+
+    @property
+    def size(self) -> int:
+        return self.stamp[0]
+
+    def entry(self) -> FileEntry:
+        return FileEntry(self.path, self.rotation, self.page_range, self.reverse)
+
+
+@dataclass(frozen=True)
+class PlannedPage:
+    kind: str  # PAGE_SOURCE, PAGE_BREAKER or PAGE_TOC
+    file_index: int  # -1 for TOC pages
+    source_page: int  # zero-based source page; -1 for generated pages
+    width: float  # placed size before scaling, in points
+    height: float
+    transforms: Tuple[str, ...] = ()  # e.g. ("rotate:90", "scale", "watermark")
+
+
+@dataclass(frozen=True)
+class MergePlan:
+    files: Tuple[PlannedFile, ...]
+    pages: Tuple[PlannedPage, ...]
+    # Every option, with passwords replaced by whether they are set
+    settings: Tuple[Tuple[str, object], ...]
+    engine: str
+    passthrough: bool
+    streaming: bool
+    scale_target: Optional[Tuple[float, float]]
+    toc_pages: int
+    # (filename, output page index) per TOC entry, in final numbering
+    toc_entries: Tuple[Tuple[str, int], ...]
+    bookmarks: Tuple[Tuple[str, int], ...]
+    # The options the plan was compiled from, used by execute()
+    options: MergeOptions = field(compare=False, repr=False)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.pages)
+
+    @property
+    def fingerprint(self) -> str:
+        """Stable hex identifier of the plan (same across processes)."""
+        payload = json.dumps(
+            [asdict(f) for f in self.files]
+            + [asdict(p) for p in self.pages]
+            + [list(self.settings), self.engine, self.toc_entries, self.bookmarks],
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def stale_files(self) -> List[str]:
+        """Inputs that changed on disk (or disappeared) since planning."""
+        stale = []
+        for planned in self.files:
+            try:
+                st = os.stat(planned.path)
+            except OSError:
+                stale.append(planned.path)
+                continue
+            if (st.st_size, st.st_mtime_ns) != planned.stamp:
+                stale.append(planned.path)
+        return stale
+
+    def execute(
+        self,
+        output_path: str,
+        progress_callback: Optional[Callable[[int, int, str], None]] = None,
+        cancel_callback: Optional[Callable[[], bool]] = None,
+        event_callback=None,
+    ) -> MergeReport:
+        """Run the planned merge, refusing if an input changed since planning."""
+        stale = self.stale_files()
+        if stale:
+            raise PlanError(
+                [f"{Path(p).name}: changed on disk since the merge was planned" for p in stale]
+            )
+        return merge_files(
+            [planned.entry() for planned in self.files],
+            output_path,
+            self.options,
+            progress_callback,
+            cancel_callback,
+            event_callback,
+        )
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+
+def _image_page_size(path: str) -> Tuple[float, float]:
+    # Same page size as image_tools.image_to_pdf (96 dpi), from the header
+    from PIL import Image
+
+    with Image.open(path) as img:
+        width, height = img.size
+    return width / 96 * 72, height / 96 * 72
+
+
+def _check_options(options: MergeOptions) -> List[str]:
+    problems = []
+    engine = (options.merge_engine or "pypdf2").lower()
+    if engine not in MERGE_ENGINES:
+        problems.append(
+            f"Unknown merge engine '{options.merge_engine}'. "
+            f"Available: {', '.join(sorted(MERGE_ENGINES))}"
+        )
+    if options.compression_enabled and options.compression_level not in COMPRESSION_LEVELS:
+        problems.append(f"Unknown compression level '{options.compression_level}'")
+    if options.scaling_enabled:
+        if options.scaling_mode not in SCALING_MODES:
+            problems.append(f"Unknown scaling mode '{options.scaling_mode}'")
+        elif options.scaling_mode == "Percent" and not 1 <= int(options.scaling_percent) <= 100:
+            problems.append("Scaling percent must be between 1 and 100")
+    if options.watermark_enabled and options.watermark_text.strip():
+        if not 0.0 <= float(options.watermark_opacity) <= 1.0:
+            problems.append("Watermark opacity must be between 0 and 1")
+        if int(options.watermark_font_size) <= 0:
+            problems.append("Watermark font size must be positive")
+    if options.delete_blank_pages and options.raster_blank_enabled:
+        if int(options.raster_blank_dpi) <= 0:
+            problems.append("Raster blank check resolution must be positive")
+        if not 0 <= int(options.raster_blank_white_level) <= 255:
+            problems.append("Raster blank white level must be between 0 and 255")
+        if not 0.0 <= float(options.raster_blank_max_ink) <= 1.0:
+            problems.append("Raster blank ink ratio must be between 0 and 1")
+        if not 0.0 <= float(options.raster_blank_margin) < 0.5:
+            problems.append("Raster blank margin must be at least 0 and below 0.5")
+        if int(options.raster_blank_workers) < 0:
+            problems.append("Raster blank workers must not be negative")
+    if options.toc_fileinfo_mode not in ("none", "filename", "fullpath"):
+        problems.append(f"Unknown TOC file info mode '{options.toc_fileinfo_mode}'")
+    return problems
+
+
+def _page_transforms(options: MergeOptions, rotation: int, scale: bool) -> Tuple[str, ...]:
+    transforms = []
+    if rotation:
+        transforms.append(f"rotate:{rotation}")
+    if scale:
+        transforms.append("scale")
+    if options.watermark_enabled and options.watermark_text.strip():
+        transforms.append("watermark")
+    if options.compression_enabled:
+        transforms.append(f"compress:{options.compression_level}")
+    return tuple(transforms)
+
+
+def compile_plan(
+    files: List[FileEntry],
+    options: MergeOptions,
+    classify_blanks: bool = False,
+) -> MergePlan:
+    """
+    Validate a job and compile it into a MergePlan. Raises PlanError listing
+    every problem found. With ``classify_blanks`` the blank-page check runs
+    now (it parses every page), otherwise such files keep all their pages in
+    the plan and are marked ``blank_check``.
+    """
+    options = replace(options)  # the plan keeps its own copy
+    problems = _check_options(options)
+    if not files:
+        problems.append("No input files")
+
+    planned_files: List[PlannedFile] = []
+    sizes: List[List[Tuple[int, float, float]]] = []  # per file: (index, w, h)
+    for entry in files:
+        name = Path(entry.path).name
+        path = os.path.abspath(entry.path)
+        is_image = path.lower().endswith(IMAGE_EXTS)
+        if entry.rotation not in VALID_ROTATIONS:
+            problems.append(f"{name}: rotation must be one of 0, 90, 180, 270")
+        try:
+            st = os.stat(path)
+        except OSError:
+            problems.append(f"{name}: file not found")
+            continue
+
+        try:
+            if is_image:
+                width, height = _image_page_size(path)
+                boxes = [(width, height)]
+            else:
+                geometry = scan_pdf(path)
+                boxes = [
+                    geometry.placed_size(i, entry.rotation)
+                    for i in range(geometry.page_count)
+                ]
+        except Exception as e:
+            problems.append(f"{name}: cannot be read ({e})")
+            continue
+
+        try:
+            indices = parse_page_range(entry.page_range, len(boxes))
+        except ValueError as e:
+            problems.append(f"{name} (Total pages: {len(boxes)}): {e}")
+            continue
+        if entry.reverse:
+            indices = list(reversed(indices))
+
+        has_explicit_range = (
+            entry.page_range and entry.page_range.strip().lower() not in ["all", ""]
+        )
+        blank_check = bool(options.delete_blank_pages and not has_explicit_range)
+        if blank_check and classify_blanks:
+            with get_document_pool().reader(path) as reader:
+                blanks = blank_pages(
+                    path, indices, lambda i: analyse_page(reader.pages[i]), options,
+                    cache_path=path,
+                )
+            indices = [i for i in indices if i not in blanks]
+            blank_check = False
+
+        planned_files.append(PlannedFile(
+            path, (st.st_size, st.st_mtime_ns), entry.rotation, entry.page_range or "",
+            bool(entry.reverse), is_image, len(boxes), tuple(indices), blank_check,
+        ))
+        sizes.append([(i, *boxes[i]) for i in indices])
+
+    if problems:
+        raise PlanError(problems)
+
+    # Scaling target: largest selected PDF page (images never count)
+    scale_target = None
+    if options.scaling_enabled and options.scaling_mode != "Percent":
+        widths = [w for f, s in zip(planned_files, sizes) if not f.is_image for _, w, _ in s]
+        heights = [h for f, s in zip(planned_files, sizes) if not f.is_image for _, _, h in s]
+        if widths:
+            scale_target = (max(widths), max(heights))
+
+    # TOC pages go first; their count depends only on the number of entries
+    with_pages = [f for f in planned_files if f.page_indices]
+    toc_pages = toc_page_count(len(with_pages)) if options.insert_toc and with_pages else 0
+
+    pages: List[PlannedPage] = [
+        PlannedPage(PAGE_TOC, -1, -1, float(TOC_PAGE_WIDTH), float(TOC_PAGE_HEIGHT))
+        for _ in range(toc_pages)
+    ]
+    toc_entries = []
+    bookmarks = []
+    for file_index, (planned, selected) in enumerate(zip(planned_files, sizes)):
+        if options.add_breaker_pages:
+            if options.breaker_uniform_size or planned.page_count == 0:
+                width, height = 612.0, 792.0
+            elif planned.is_image:
+                width, height = _image_page_size(planned.path)
+            else:
+                width, height = scan_pdf(planned.path).placed_size(0, planned.rotation)
+            pages.append(PlannedPage(PAGE_BREAKER, file_index, -1, width, height))
+        start = len(pages)
+        scale = scale_target is not None or (
+            options.scaling_enabled and options.scaling_mode == "Percent"
+        )
+        transforms = _page_transforms(options, planned.rotation, scale)
+        for index, width, height in selected:
+            pages.append(PlannedPage(PAGE_SOURCE, file_index, index, width, height, transforms))
+        if planned.page_indices:
+            if options.insert_toc:
+                toc_entries.append((Path(planned.path).name, start))
+            if options.add_filename_bookmarks:
+                bookmarks.append((Path(planned.path).stem, start))
+
+    settings = tuple(
+        (key, bool(value) if key in _SECRET_OPTIONS else value)
+        for key, value in sorted(asdict(options).items())
+    )
+    passthrough = _is_passthrough(options)
+    return MergePlan(
+        files=tuple(planned_files),
+        pages=tuple(pages),
+        settings=settings,
+        engine=(options.merge_engine or "pypdf2").lower(),
+        passthrough=passthrough,
+        streaming=uses_streaming_writer(options),
+        scale_target=scale_target,
+        toc_pages=toc_pages,
+        toc_entries=tuple(toc_entries),
+        bookmarks=tuple(bookmarks),
+        options=options,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Dry-run estimates
+#
+# Rough per-page and per-byte costs measured on a desktop machine with the
+# two engines. They are meant for ranking, admitting and routing jobs (and
+# for a "this will take about..." hint), not as promises.
+# ---------------------------------------------------------------------------
+
+_PROCESS_BASE_BYTES = 80 * 1024 * 1024
+_SECONDS_PER_FILE = 0.001  # open and scan the page tree
+_SECONDS_PER_PAGE = {
+    "raw": 0.00015,  # pass-through copy
+    "parsed": 0.0008,  # parsed copy (rotation, blank removal, dedup)
+    "scale": 0.0008,
+    "scale_form": 0.0003,  # scaling_form_xobject: independent of content size
+    "watermark": 0.006,
+    "compress": 0.0015,
+    "blank_check": 0.002,
+    "raster_blank": 0.03,  # render and measure a scanned page, one worker
+    "pymupdf": 0.0025,
+}
+_SECONDS_PER_MB = {"raw": 0.01, "parsed": 0.05, "pymupdf": 0.08}
+# Share of a page's bytes left after image recompression, per level
+_COMPRESSION_RATIO = {"Low": 0.85, "Medium": 0.7, "High": 0.55, "Maximum": 0.45}
+_BREAKER_PAGE_BYTES = 1500
+_TOC_PAGE_BYTES = 4000
+_WATERMARK_PAGE_BYTES = 700
+# Parsed PDF objects take a few times their size on disk in memory
+_PARSED_MEMORY_FACTOR = 3.0
+_DECODED_IMAGE_FACTOR = 10.0
+
+
+@dataclass(frozen=True)
+class PlanEstimate:
+    seconds: float
+    peak_memory_bytes: int
+    output_bytes: int
+    pages: int
+    input_bytes: int
+    # The plan still contains pages that may be dropped as blank
+    upper_bound: bool = False
+
+
+def estimate_plan(plan: MergePlan) -> PlanEstimate:
+    """Estimate wall time, peak memory and output size of a plan."""
+    options = plan.options
+    mode = "pymupdf" if plan.engine == "pymupdf" else ("raw" if plan.passthrough else "parsed")
+    watermark = options.watermark_enabled and options.watermark_text.strip()
+
+    seconds = _SECONDS_PER_FILE * len(plan.files)
+    output_bytes = 0.0
+    input_bytes = 0
+    largest_input = 0
+    selected_input_bytes = 0.0
+    largest_page_bytes = 0.0
+    pages_per_file = [0] * len(plan.files)
+    for page in plan.pages:
+        if page.kind == PAGE_SOURCE:
+            pages_per_file[page.file_index] += 1
+
+    for planned, selected in zip(plan.files, pages_per_file):
+        input_bytes += planned.size
+        largest_input = max(largest_input, planned.size)
+        page_bytes = planned.size / max(1, planned.page_count)
+        largest_page_bytes = max(largest_page_bytes, page_bytes)
+        share = page_bytes * selected
+        selected_input_bytes += share
+
+        per_page = _SECONDS_PER_PAGE[mode]
+        if options.scaling_enabled:
+            form = mode == "parsed" and options.scaling_form_xobject
+            per_page += _SECONDS_PER_PAGE["scale_form" if form else "scale"]
+        if watermark:
+            per_page += _SECONDS_PER_PAGE["watermark"]
+        if options.compression_enabled:
+            per_page += _SECONDS_PER_PAGE["compress"]
+        seconds += per_page * selected + _SECONDS_PER_MB[mode] * share / (1024 * 1024)
+        if planned.blank_check:
+            seconds += _SECONDS_PER_PAGE["blank_check"] * len(planned.page_indices)
+            if options.raster_blank_enabled:
+                seconds += (
+                    _SECONDS_PER_PAGE["raster_blank"] * len(planned.page_indices)
+                    / (options.raster_blank_workers or os.cpu_count() or 1)
+                )
+
+        file_output = share
+        if options.compression_enabled:
+            file_output *= _COMPRESSION_RATIO.get(options.compression_level, 0.7)
+        if watermark:
+            file_output += _WATERMARK_PAGE_BYTES * selected
+        output_bytes += file_output
+
+    generated = sum(1 for p in plan.pages if p.kind == PAGE_BREAKER)
+    output_bytes += generated * _BREAKER_PAGE_BYTES + plan.toc_pages * _TOC_PAGE_BYTES
+    if plan.toc_pages and plan.engine == "pymupdf":
+        seconds += 0.01 * plan.toc_pages
+
+    # Peak memory: what the engine keeps parsed at once
+    if plan.engine == "pymupdf":
+        # The whole output document is built in memory before the save
+        resident = output_bytes * _PARSED_MEMORY_FACTOR + largest_input
+    elif plan.streaming:
+        resident = largest_input * _PARSED_MEMORY_FACTOR
+    else:
+        # PdfWriter holds every copied page until the final write
+        resident = selected_input_bytes * _PARSED_MEMORY_FACTOR
+    if options.compression_enabled:
+        resident += largest_page_bytes * _DECODED_IMAGE_FACTOR
+
+    return PlanEstimate(
+        seconds=round(seconds, 3),
+        peak_memory_bytes=int(_PROCESS_BASE_BYTES + resident),
+        output_bytes=int(output_bytes),
+        pages=plan.page_count,
+        input_bytes=input_bytes,
+        upper_bound=any(f.blank_check for f in plan.files),
+    )
+
+
+def dry_run(files: List[FileEntry], options: MergeOptions) -> Tuple[MergePlan, PlanEstimate]:
+    """Validate and plan a job without merging; returns the plan and its estimate."""
+    plan = compile_plan(files, options)
+    return plan, estimate_plan(plan)
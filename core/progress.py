@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+# core/progress.py
+
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, TextIO
+
+from core.rss import current_rss
+
+
+# ---------------------------------------------------------------------------
+# Structured merge progress
+#
+# merge_files(..., event_callback=...) reports what the engine is doing as
+# ProgressEvent values. Per-page and bytes-written events are rate limited
+# (at most one per ProgressTracker.min_interval seconds) so the page loop
+# pays for a counter increment and a clock read, not a callback per page;
+# stage boundaries are always delivered. Events are emitted on the merge
+# thread: GUI consumers hand them to their UI thread themselves.
+#
+# The tracker also keeps a StageTiming per finished stage (duration,
+# resident memory at its end, time spent reading inputs), which merges
+# return in MergeReport.stages whether or not anyone listens.
+# ---------------------------------------------------------------------------
+
+STAGE_START = "stage_start"
+STAGE_END = "stage_end"
+PAGE_DONE = "page_done"
+BYTES_WRITTEN = "bytes_written"
+IMAGES_RECOMPRESSED = "images_recompressed"
+
+# Stages in the order a merge runs them (not every merge runs all of them)
+STAGE_PREPARE = "prepare"  # parse inputs, select pages, classify blanks
+STAGE_PAGES = "pages"  # copy and transform pages
+STAGE_TOC = "toc"  # render and insert the table of contents
+STAGE_WRITE = "write"  # write the output file
+STAGE_ENCRYPT = "encrypt"  # encrypted re-save
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    kind: str
+    stage: str
+    elapsed: float  # seconds since the merge started
+    stage_elapsed: float = 0.0
+    file_index: int = 0
+    file_count: int = 0
+    filename: str = ""
+    pages_done: int = 0
+    pages_total: int = 0  # 0 until the prepare stage has selected the pages
+    bytes_written: int = 0
+    images_recompressed: int = 0
+    pages_per_second: float = 0.0
+    bytes_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    rss_bytes: int = 0  # resident memory, sampled per file and stage
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Completed share of the page work, when the total is known."""
+        if self.pages_total <= 0:
+            return None
+        return min(1.0, self.pages_done / self.pages_total)
+
+
+@dataclass(frozen=True)
+class StageTiming:
+    stage: str
+    seconds: float
+    rss_bytes: int  # resident memory when the stage ended (0 if unknown)
+    read_seconds: float = 0.0  # time spent in input file reads
+
+
+class ProgressTracker:
+    """Counts merge work and turns it into ProgressEvents for one listener."""
+
+    min_interval = 0.1
+
+    def __init__(self, listener: Optional[Callable[[ProgressEvent], None]] = None,
+                 file_count: int = 0,
+                 read_clock: Optional[Callable[[], float]] = None) -> None:
+        """read_clock returns the total seconds spent reading inputs so far."""
+        self._listener = listener
+        self._read_clock = read_clock
+        self._stage_read_start = 0.0
+        self.stages: List[StageTiming] = []
+        self.rss = current_rss()
+        self.peak_rss = self.rss
+        self._start = time.perf_counter()
+        self._stage = ""
+        self._stage_start = self._start
+        self._pages_start = None  # when page copying began, for rates
+        self._last_emit = 0.0
+        self.file_count = file_count
+        self.file_index = 0
+        self.filename = ""
+        self.pages_done = 0
+        self.pages_total = 0
+        self.bytes_written = 0
+        self.images_recompressed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._listener is not None
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def _sample_rss(self) -> None:
+        self.rss = current_rss()
+        self.peak_rss = max(self.peak_rss, self.rss)
+
+    def stage_start(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._stage = stage
+        self._stage_start = now
+        if self._read_clock is not None:
+            self._stage_read_start = self._read_clock()
+        if stage == STAGE_PAGES:
+            self._pages_start = now
+        self._emit(STAGE_START, now)
+
+    def stage_end(self) -> None:
+        now = time.perf_counter()
+        self._sample_rss()
+        read_seconds = 0.0
+        if self._read_clock is not None:
+            read_seconds = self._read_clock() - self._stage_read_start
+        self.stages.append(StageTiming(
+            self._stage, now - self._stage_start, self.rss, read_seconds
+        ))
+        self._emit(STAGE_END, now)
+
+    def file_started(self, index: int, filename: str) -> None:
+        self.file_index = index
+        self.filename = filename
+        self._sample_rss()
+
+    def page_done(self, count: int = 1) -> None:
+        self.pages_done += count
+        if self._listener is not None:
+            now = time.perf_counter()
+            if now - self._last_emit >= self.min_interval:
+                self._emit(PAGE_DONE, now)
+
+    def bytes(self, total: int) -> None:
+        """Output bytes written so far (a running total)."""
+        self.bytes_written = total
+        if self._listener is not None:
+            now = time.perf_counter()
+            if now - self._last_emit >= self.min_interval:
+                self._emit(BYTES_WRITTEN, now)
+
+    def images(self, count: int) -> None:
+        if count <= 0:
+            return
+        self.images_recompressed += count
+        if self._listener is not None:
+            now = time.perf_counter()
+            if now - self._last_emit >= self.min_interval:
+                self._emit(IMAGES_RECOMPRESSED, now)
+
+    # ------------------------------------------------------------------
+
+    def _emit(self, kind: str, now: float) -> None:
+        if self._listener is None:
+            return
+        self._last_emit = now
+        pages_per_second = bytes_per_second = 0.0
+        eta = None
+        if self._pages_start is not None:
+            running = now - self._pages_start
+            if running > 0:
+                pages_per_second = self.pages_done / running
+                bytes_per_second = self.bytes_written / running
+            if pages_per_second > 0 and self.pages_total:
+                eta = max(0.0, (self.pages_total - self.pages_done) / pages_per_second)
+        self._listener(ProgressEvent(
+            kind=kind,
+            stage=self._stage,
+            elapsed=now - self._start,
+            stage_elapsed=now - self._stage_start,
+            file_index=self.file_index,
+            file_count=self.file_count,
+            filename=self.filename,
+            pages_done=self.pages_done,
+            pages_total=self.pages_total,
+            bytes_written=self.bytes_written,
+            images_recompressed=self.images_recompressed,
+            pages_per_second=pages_per_second,
+            bytes_per_second=bytes_per_second,
+            eta_seconds=eta,
+            rss_bytes=self.rss,
+        ))
+
+
+# ---------------------------------------------------------------------------
+# Text rendering (status lines, headless runners)
+# ---------------------------------------------------------------------------
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m{seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m"
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_event(event: ProgressEvent) -> str:
+    """One-line human-readable summary of an event."""
+    if event.kind == STAGE_START:
+        return f"[{event.stage}] started"
+    if event.kind == STAGE_END:
+        line = f"[{event.stage}] done in {event.stage_elapsed:.2f}s"
+        if event.rss_bytes:
+            line += f", RSS {_format_bytes(event.rss_bytes)}"
+        return line
+    parts = []
+    if event.pages_total:
+        parts.append(f"{event.pages_done:,}/{event.pages_total:,} pages")
+    else:
+        parts.append(f"{event.pages_done:,} pages")
+    if event.pages_per_second:
+        parts.append(f"{event.pages_per_second:,.0f} pages/s")
+    if event.bytes_written:
+        parts.append(_format_bytes(event.bytes_written))
+        if event.bytes_per_second:
+            parts.append(f"{_format_bytes(event.bytes_per_second)}/s")
+    if event.images_recompressed:
+        parts.append(f"{event.images_recompressed:,} images recompressed")
+    if event.eta_seconds is not None:
+        parts.append(f"ETA {_format_duration(event.eta_seconds)}")
+    return f"[{event.stage}] " + ", ".join(parts)
+
+
+def format_stages(stages: List[StageTiming]) -> str:
+    """One line per merge stage: duration, input read time and RSS."""
+    lines = []
+    for timing in stages:
+        line = f"{timing.stage:<8} {timing.seconds:7.2f}s"
+        if timing.read_seconds:
+            line += f"  reads {timing.read_seconds:.2f}s"
+        if timing.rss_bytes:
+            line += f"  RSS {_format_bytes(timing.rss_bytes)}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class ConsoleProgress:
+    """Event listener that prints one line per event, for headless runs."""
+
+    def __init__(self, stream: Optional[TextIO] = None) -> None:
+        self.stream = stream or sys.stderr
+
+    def __call__(self, event: ProgressEvent) -> None:
+        print(format_event(event), file=self.stream, flush=True)
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+# core/raster_blank.py
+
+import atexit
+import multiprocessing
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from core.analysis_cache import open_file_analysis, raster_key
+from core.blank_pages import (
+    REASON_IMAGE,
+    REASON_INLINE_IMAGE,
+    TIER_TEXT,
+    BlankVerdict,
+    PageAnalysis,
+)
+
+
+# ---------------------------------------------------------------------------
+# Raster blank detection for scanned pages
+#
+# A scanned separator sheet is a full-page image, so the content scan in
+# core/blank_pages.py always sees ink on it. With
+# MergeOptions.raster_blank_enabled, pages drawn from images (and pages the
+# content scan could not decide) are rendered in grayscale at a low
+# resolution, and their ink ratio is measured with NumPy:
+#
+#   - a margin around the page is ignored (scanner edge shadows, punch
+#     holes), as raster_blank_margin of each dimension;
+#   - pixels lighter than raster_blank_white_level (0-255) are paper, which
+#     drops paper tint and most scanner noise; at a low resolution dust
+#     averages out to light gray as well;
+#   - ink pixels with no ink neighbour (isolated specks) are not counted.
+#
+# A page is blank when at most raster_blank_max_ink of the remaining pixels
+# are ink. Rendering runs on a pool of worker processes, each rendering a
+# run of pages of one document, so the time per page stays flat however
+# large the batch. PyMuPDF and NumPy are imported only when a page is
+# actually rendered. Ink ratios are kept in the analysis cache when
+# MergeOptions.analysis_cache_dir is set.
+# ---------------------------------------------------------------------------
+
+# Fewer candidate pages than this are rendered in the calling process;
+# starting workers would cost more than it saves
+MIN_PARALLEL_PAGES = 16
+# Pages per worker task, at most
+MAX_CHUNK_PAGES = 64
+
+
+@dataclass(frozen=True)
+class RasterSettings:
+    dpi: int = 36
+    white_level: int = 200
+    margin: float = 0.05
+
+    @classmethod
+    def from_options(cls, options) -> "RasterSettings":
+        return cls(
+            int(options.raster_blank_dpi),
+            int(options.raster_blank_white_level),
+            float(options.raster_blank_margin),
+        )
+
+
+def ink_ratio(gray, white_level: int = 200, margin: float = 0.05) -> float:
+    """
+    Share of ink pixels in a 2-D uint8 grayscale array, ignoring ``margin``
+    of each edge, pixels at least ``white_level`` light and isolated specks.
+    """
+    import numpy as np
+
+    height, width = gray.shape
+    dy, dx = int(height * margin), int(width * margin)
+    inner = gray[dy:height - dy, dx:width - dx]
+    if inner.size == 0:
+        return 0.0
+    ink = inner < white_level
+    neighbour = np.zeros_like(ink)
+    neighbour[1:] |= ink[:-1]
+    neighbour[:-1] |= ink[1:]
+    neighbour[:, 1:] |= ink[:, :-1]
+    neighbour[:, :-1] |= ink[:, 1:]
+    return float(np.count_nonzero(ink & neighbour)) / inner.size
+
+
+def render_gray(page, dpi: int):
+    """A PyMuPDF page as a 2-D uint8 grayscale array."""
+    import fitz
+    import numpy as np
+
+    zoom = dpi / 72.0
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    samples = np.frombuffer(pix.samples, dtype=np.uint8)
+    return samples.reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def _open(source: Union[str, bytes]):
+    import fitz
+
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _page_ratios(doc, indices: List[int], settings: RasterSettings) -> List[float]:
+    return [
+        ink_ratio(render_gray(doc[idx], settings.dpi), settings.white_level, settings.margin)
+        for idx in indices
+    ]
+
+
+# Document last opened by this worker process, reused by the next task
+# for the same file: (path, size, mtime_ns, document)
+_worker_doc: Optional[Tuple[str, int, int, object]] = None
+
+
+def _worker_ratios(path: str, indices: List[int], settings: RasterSettings) -> List[float]:
+    global _worker_doc
+    st = os.stat(path)
+    if _worker_doc is None or _worker_doc[:3] != (path, st.st_size, st.st_mtime_ns):
+        if _worker_doc is not None:
+            _worker_doc[3].close()
+            _worker_doc = None
+        _worker_doc = (path, st.st_size, st.st_mtime_ns, _open(path))
+    return _page_ratios(_worker_doc[3], indices, settings)
+
+
+def _init_raster_worker() -> None:
+    import signal
+
+    # Ctrl+C is handled by the parent
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+class RasterPool:
+    """Worker processes that render pages for the ink-ratio check."""
+
+    def __init__(self) -> None:
+        self.max_workers = os.cpu_count() or 1
+        self._executor = None
+        self._executor_workers = 0
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers: Optional[int] = None) -> None:
+        """Cap the worker processes; 1 renders in the calling process."""
+        if max_workers is not None:
+            self.max_workers = max(1, int(max_workers))
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor, self._executor_workers = self._executor, None, 0
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self, workers: int):
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None or self._executor_workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                # Spawned, not forked: the GUI merges on a background thread
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_raster_worker,
+                )
+                self._executor_workers = workers
+            return self._executor
+
+    def ink_ratios(
+        self,
+        source: Union[str, bytes],
+        indices: List[int],
+        settings: RasterSettings,
+        workers: int = 0,
+        cancelled: Optional[Callable[[], bool]] = None,
+    ) -> Dict[int, float]:
+        """
+        Ink ratio of each page in ``indices`` of ``source`` (a PDF path, or
+        the bytes of an in-memory PDF, which is always rendered here).
+        ``workers`` (0 = max_workers) caps the processes used.
+        """
+        workers = min(workers or self.max_workers, self.max_workers)
+        if (
+            workers <= 1
+            or not isinstance(source, str)
+            or len(indices) < MIN_PARALLEL_PAGES
+            # Daemonic processes (merge daemon workers) cannot have children
+            or multiprocessing.current_process().daemon
+        ):
+            return self._ratios_here(source, indices, settings, cancelled)
+
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures.process import BrokenProcessPool
+
+        size = max(1, min(MAX_CHUNK_PAGES, -(-len(indices) // (workers * 4))))
+        chunks = [indices[i:i + size] for i in range(0, len(indices), size)]
+        path = os.path.abspath(source)
+        executor = self._get_executor(workers)
+        pending = {executor.submit(_worker_ratios, path, chunk, settings): chunk for chunk in chunks}
+        ratios: Dict[int, float] = {}
+        failed: List[int] = []
+        broken = False
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                if cancelled and cancelled():
+                    raise RuntimeError("Merge cancelled")
+                for future in done:
+                    chunk = pending.pop(future)
+                    try:
+                        ratios.update(zip(chunk, future.result()))
+                    except BrokenProcessPool:
+                        broken = True
+                        failed.extend(chunk)
+                    except Exception:
+                        # Failed to pickle, or raised in the worker
+                        failed.extend(chunk)
+        finally:
+            for future in pending:
+                future.cancel()
+        if broken:
+            # A worker died (out of memory, killed): the pool is unusable
+            self.shutdown()
+        if failed:
+            # Finish here; a page that really cannot be rendered raises now
+            ratios.update(self._ratios_here(source, failed, settings, cancelled))
+        return ratios
+
+    @staticmethod
+    def _ratios_here(source, indices: List[int], settings: RasterSettings,
+                     cancelled: Optional[Callable[[], bool]]) -> Dict[int, float]:
+        if not indices:
+            return {}
+        ratios: Dict[int, float] = {}
+        doc = _open(source)
+        try:
+            for idx in indices:
+                if cancelled and cancelled():
+                    raise RuntimeError("Merge cancelled")
+                ratios[idx] = _page_ratios(doc, [idx], settings)[0]
+        finally:
+            doc.close()
+        return ratios
+
+
+_pool = RasterPool()
+atexit.register(_pool.shutdown)
+
+
+def get_raster_pool() -> RasterPool:
+    """The process-wide pool of page-rendering workers."""
+    return _pool
+
+
+# ---------------------------------------------------------------------------
+# Blank pages of one input
+# ---------------------------------------------------------------------------
+
+def needs_raster_check(verdict: BlankVerdict) -> bool:
+    """True for pages the content scan kept only because of an image, or could not decide."""
+    return not verdict.blank and (
+        verdict.reason in (REASON_IMAGE, REASON_INLINE_IMAGE) or verdict.tier == TIER_TEXT
+    )
+
+
+def blank_pages(
+    source: Union[str, bytes],
+    indices: List[int],
+    analyse: Callable[[int], PageAnalysis],
+    options,
+    cancelled: Optional[Callable[[], bool]] = None,
+    engine: str = "pypdf2",
+    cache_path: str = "",
+) -> Set[int]:
+    """
+    Indices of the blank pages among ``indices``: blank by content
+    (``analyse`` runs the content scan on one page), or, with
+    raster_blank_enabled, scanned pages with at most raster_blank_max_ink
+    of ink. ``source`` is the PDF the indices refer to, as a path or bytes.
+    With analysis_cache_dir set, results are cached under the content of
+    ``cache_path`` (the input file; "" = not cached).
+    """
+    analysis = open_file_analysis(options, cache_path)
+    verdicts: Dict[int, BlankVerdict] = {}
+    for idx in indices:
+        if cancelled and cancelled():
+            raise RuntimeError("Merge cancelled")
+        page = analysis.page(engine, idx) if analysis else None
+        if page is None:
+            page = analyse(idx)
+            if analysis:
+                analysis.set_page(engine, idx, page)
+        verdicts[idx] = page.verdict
+
+    blank = {idx for idx, verdict in verdicts.items() if verdict.blank}
+    if options.raster_blank_enabled:
+        settings = RasterSettings.from_options(options)
+        key = raster_key(settings)
+        ratios: Dict[int, float] = {}
+        missing = []
+        for idx, verdict in verdicts.items():
+            if not needs_raster_check(verdict):
+                continue
+            ratio = analysis.ink_ratio(key, idx) if analysis else None
+            if ratio is None:
+                missing.append(idx)
+            else:
+                ratios[idx] = ratio
+        if missing:
+            measured = get_raster_pool().ink_ratios(
+                source, missing, settings, options.raster_blank_workers, cancelled,
+            )
+            ratios.update(measured)
+            if analysis:
+                for idx, ratio in measured.items():
+                    analysis.set_ink_ratio(key, idx, ratio)
+        blank.update(idx for idx, ratio in ratios.items() if ratio <= options.raster_blank_max_ink)
+    if analysis:
+        analysis.save()
+    return blank
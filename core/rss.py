@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+# core/rss.py
+
+import os
+import sys
+
+
+# ---------------------------------------------------------------------------
+# Resident set size of this process, for merge reports. Only the standard
+# library is used; 0 means the platform gave no answer.
+# ---------------------------------------------------------------------------
+
+def _rss_linux() -> int:
+    with open("/proc/self/statm", "rb") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def _rss_windows() -> int:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    get_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_info.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not get_info(process, ctypes.byref(counters), counters.cb):
+        return 0
+    return counters.WorkingSetSize
+
+
+def _rss_peak_fallback() -> int:
+    # Other Unixes: only the lifetime peak is available (bytes on macOS,
+    # kilobytes elsewhere)
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes (0 if unknown)."""
+    try:
+        if sys.platform.startswith("linux"):
+            return _rss_linux()
+        if sys.platform == "win32":
+            return _rss_windows()
+        return _rss_peak_fallback()
+    except Exception:
+        return 0
@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+# core/segment_cache.py
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from core.file_hash import HashIndex, read_json, write_json
+from core.journal import _OUTPUT_ONLY_OPTIONS, JournalSegment, open_journal
+from core.settings import make_private_dir, user_cache_dir
+
+
+# ---------------------------------------------------------------------------
+# Content-addressed segment cache
+#
+# With MergeOptions.segment_cache_dir set, every input's processed pages
+# (its "segment", as in core.journal) are kept after the merge under a key
+# made of the input's content hash, its FileEntry fields, its file name
+# (breaker label) and the options that shape its pages, including the
+# job-wide scaling target. Re-merging a binder after one document changed
+# reprocesses only that document and copies every other segment from the
+# cache. If nothing at all changed and the previous output is still on
+# disk as it was written, merge_files returns without writing anything.
+#
+# The cache is trimmed to max_bytes, least recently used segments first.
+# Like journal directories, it holds unencrypted pages, so the root must
+# belong to the user and is kept private (0o700).
+# ---------------------------------------------------------------------------
+
+CACHE_VERSION = 2  # 2: PyMuPDF pages scaled to their own size
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def default_segment_cache_dir() -> str:
+    return str(user_cache_dir("segments"))
+
+
+def _segment_settings(options) -> Dict:
+    return {
+        k: v for k, v in sorted(asdict(options).items())
+        if k not in _OUTPUT_ONLY_OPTIONS
+    }
+
+
+class SegmentCache:
+    """Directory of processed per-file segments shared by all merge jobs."""
+
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        make_private_dir(root)
+        self._hashes = HashIndex(os.path.join(root, "hashes.json"))
+        # One record per output, so concurrent batch workers never
+        # overwrite each other's
+        self._outputs_dir = os.path.join(root, "outputs")
+
+    def content_hash(self, path: str) -> str:
+        return self._hashes.content_hash(path)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def segment_key(self, entry, options, scale_target) -> str:
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "content": self.content_hash(entry.path),
+            "name": Path(entry.path).name,
+            "rotation": entry.rotation,
+            "page_range": entry.page_range or "",
+            "reverse": bool(entry.reverse),
+            "options": _segment_settings(options),
+            "scale_target": scale_target if options.scaling_enabled else None,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def job_key(self, files, options, output_path: str) -> str:
+        """Everything the output depends on, for the unchanged-job check."""
+        settings = {
+            k: v for k, v in sorted(asdict(options).items())
+            if k not in (
+                "segment_cache_dir", "journal_dir", "max_open_files",
+                "page_cache_dir", "page_cache_max_mb", "image_cache_dir", "mmap_inputs",
+                "spool_max_mb", "raster_blank_workers", "analysis_cache_dir",
+            )
+        }
+        payload = json.dumps({
+            "version": CACHE_VERSION,
+            "output": os.path.abspath(output_path),
+            "inputs": [
+                [self.content_hash(e.path), Path(e.path).name, e.rotation,
+                 e.page_range or "", bool(e.reverse)]
+                for e in files
+            ],
+            "options": settings,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Segments
+    # ------------------------------------------------------------------
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, key[:2], key)
+        return base + ".pdf", base + ".json"
+
+    def get(self, key: str) -> Optional[JournalSegment]:
+        pdf_path, meta_path = self._paths(key)
+        meta = read_json(meta_path)
+        try:
+            if not meta or os.path.getsize(pdf_path) != meta.get("bytes"):
+                return None
+            os.utime(pdf_path)  # recently used
+        except OSError:
+            return None
+        return JournalSegment(pdf_path, int(meta["pages"]), int(meta["breaker_pages"]))
+
+    def part_path(self, key: str) -> str:
+        pdf_path, _ = self._paths(key)
+        os.makedirs(os.path.dirname(pdf_path), mode=0o700, exist_ok=True)
+        return f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.part"
+
+    def put(self, key: str, part_path: str, pages: int, breaker_pages: int) -> JournalSegment:
+        pdf_path, meta_path = self._paths(key)
+        os.replace(part_path, pdf_path)
+        write_json(meta_path, {
+            "pages": pages,
+            "breaker_pages": breaker_pages,
+            "bytes": os.path.getsize(pdf_path),
+        })
+        return JournalSegment(pdf_path, pages, breaker_pages)
+
+    def trim(self) -> None:
+        """Remove least recently used segments beyond max_bytes."""
+        segments = []
+        total = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                segments.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        segments.sort()
+        for _, size, path in segments:
+            if total <= self.max_bytes:
+                break
+            for victim in (path, path[:-4] + ".json"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+
+    # ------------------------------------------------------------------
+    # Previous outputs, for the unchanged-job check
+    # ------------------------------------------------------------------
+
+    def _output_record(self, path: str) -> str:
+        name = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        return os.path.join(self._outputs_dir, name + ".json")
+
+    def unchanged_output(self, job_key: str, output_path: str) -> Optional[dict]:
+        """The recorded output of an identical earlier job, if still intact."""
+        path = os.path.abspath(output_path)
+        record = read_json(self._output_record(path))
+        if record.get("path") != path or record.get("job") != job_key:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if [st.st_size, st.st_mtime_ns] != record.get("stamp"):
+            return None
+        return record
+
+    def record_output(self, job_key: str, output_path: str, pages: int) -> None:
+        path = os.path.abspath(output_path)
+        st = os.stat(path)
+        os.makedirs(self._outputs_dir, mode=0o700, exist_ok=True)
+        write_json(self._output_record(path), {
+            "path": path, "job": job_key, "stamp": [st.st_size, st.st_mtime_ns],
+            "pages": pages,
+        })
+
+
+class _CachedSegments:
+    """
+    One job's view of the SegmentCache, with the same interface as
+    core.journal.MergeJournal so the engines treat both alike. Segments
+    stay in the cache after the job, which also makes a cancelled job
+    resumable.
+    """
+
+    def __init__(self, cache: SegmentCache, files, options, scale_target) -> None:
+        self.cache = cache
+        self._keys: List[str] = [
+            cache.segment_key(entry, options, scale_target) for entry in files
+        ]
+        self._parts: Dict[int, str] = {}
+
+    def completed(self, index: int) -> Optional[JournalSegment]:
+        return self.cache.get(self._keys[index])
+
+    def begin(self, index: int) -> str:
+        part = self._parts.get(index)
+        if part is None:
+            part = self._parts[index] = self.cache.part_path(self._keys[index])
+        return part
+
+    def commit(self, index: int, pages: int, breaker_pages: int,
+               size: Optional[Tuple[float, float]] = None) -> JournalSegment:
+        return self.cache.put(self._keys[index], self._parts.pop(index), pages, breaker_pages)
+
+    def abandon(self, index: int) -> None:
+        part = self._parts.pop(index, None)
+        if part:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+
+    def finish(self) -> None:
+        self.cache.trim()
+
+
+_caches: Dict[str, SegmentCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_segment_cache(root: str) -> SegmentCache:
+    """The process-wide SegmentCache for a directory."""
+    root = os.path.abspath(root)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = SegmentCache(root)
+        return cache
+
+
+def open_segment_store(files, options, scale_target, journal=None):
+    """
+    Where a merge keeps its per-file segments: the segment cache when
+    MergeOptions.segment_cache_dir is set, else the resumable journal when
+    journal_dir is set (``journal``, if open_prepass_journal opened it
+    already), else None (pages go straight to the output).
+    """
+    root = getattr(options, "segment_cache_dir", "")
+    if root:
+        return _CachedSegments(get_segment_cache(root), files, options, scale_target)
+    return journal if journal is not None else open_journal(files, options)
+
+
+def open_prepass_journal(files, options):
+    """
+    The resumable journal, opened before the prepass, when it is the
+    segment store (its key does not depend on the scaling target); inputs
+    it has already completed need no blank-page analysis. Else None.
+    """
+    if getattr(options, "segment_cache_dir", ""):
+        return None
+    return open_journal(files, options)
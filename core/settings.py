@@ -22,4 +22,35 @@ def save_settings(config_path: Path, settings: dict) -> None:
             json.dump(settings, f, indent=4)
     except Exception:
         # Silently ignore save errors (same behavior as load)
-        pass
\ No newline at end of file
+        pass
+
+def user_cache_dir(name: str) -> Path:
+    """Per-user directory for a persistent cache (not created here)."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
+        if base:
+            return Path(base) / "CombinePDFs" / "Cache" / name
+    base = os.environ.get("XDG_CACHE_HOME")
+    root = Path(base) if base else Path.home() / ".cache"
+    return root / "combinepdfs" / name
+
+def user_config_dir() -> Path:
+    """Per-user directory for persistent application state (not created here)."""
+    if os.name == "nt":
+        base = os.environ.get("APPDATA")
+        if base:
+            return Path(base) / "CombinePDFs"
+    base = os.environ.get("XDG_CONFIG_HOME")
+    root = Path(base) if base else Path.home() / ".config"
+    return root / "combinepdfs"
+
+def make_private_dir(path: str) -> None:
+    """Create a directory only this user can enter; PermissionError if another user owns it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return  # Windows: per-user profile directories are private already
+    st = os.stat(path)
+    if st.st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
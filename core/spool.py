@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+# core/spool.py
+
+import io
+import os
+import tempfile
+from typing import BinaryIO, Optional, Union
+
+
+# ---------------------------------------------------------------------------
+# Memory-first intermediate files
+#
+# Intermediate PDFs (an unencrypted output awaiting encryption, inputs
+# given as non-seekable streams) live in memory until they grow past a
+# threshold and only then move to a temporary file. Unlike
+# tempfile.SpooledTemporaryFile, a spilled buffer has a path, so PyMuPDF
+# can open it lazily instead of reading it back into memory.
+# ---------------------------------------------------------------------------
+
+DEFAULT_SPOOL_BYTES = 64 * 1024 * 1024
+
+
+class SpillBuffer(io.RawIOBase):
+    """Seekable read/write binary buffer that spills to disk when large."""
+
+    def __init__(self, max_memory: int = DEFAULT_SPOOL_BYTES) -> None:
+        super().__init__()
+        self.max_memory = max_memory
+        self._file: BinaryIO = io.BytesIO()
+        self.path: Optional[str] = None  # set once spilled
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def _spill(self) -> None:
+        fd, self.path = tempfile.mkstemp(prefix="combinepdfs_", suffix=".pdf")
+        disk = os.fdopen(fd, "w+b")
+        memory = self._file
+        disk.write(memory.getbuffer())
+        disk.seek(memory.tell())
+        self._file = disk
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.path is None and self._file.tell() + len(data) > self.max_memory:
+            self._spill()
+        return self._file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readinto(self, buffer) -> int:
+        return self._file.readinto(buffer)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def getbuffer(self) -> memoryview:
+        """The contents without a copy; only while still in memory."""
+        if self.path is not None:
+            raise ValueError("buffer has spilled to disk; open self.path instead")
+        return self._file.getbuffer()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        super().close()
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def seekable_input(data: Union[bytes, bytearray, memoryview, BinaryIO],
+                   max_memory: int = DEFAULT_SPOOL_BYTES):
+    """
+    A seekable binary stream over an input given as bytes or a file-like
+    object. Seekable streams are used as they are, without copying (the
+    PDF must start at offset 0); others are copied into a SpillBuffer.
+    Returns (stream, owned): owned streams are the caller's to close.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return io.BytesIO(data), True
+    try:
+        seekable = data.seekable()
+    except (AttributeError, ValueError):
+        seekable = False
+    if seekable:
+        return data, False
+    spool = SpillBuffer(max_memory)
+    while True:
+        chunk = data.read(1024 * 1024)
+        if not chunk:
+            break
+        spool.write(chunk)
+    spool.seek(0)
+    return spool, True
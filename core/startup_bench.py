@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+# core/startup_bench.py
+#
+# Measure what importing the headless entry points costs, module by
+# module, and fail when it regresses.
+#
+#   python -m core.startup_bench [--repeat 5] [--baseline startup.json]
+#   python -m core.startup_bench --save-baseline startup.json
+#
+# Each entry point is imported in fresh interpreters under -X importtime
+# and the fastest run is kept. A run fails (exit code 1) when an entry
+# point loads a module it must not (a GUI toolkit, or a heavy library
+# that only some features need), exceeds its time budget, or, with
+# --baseline, is slower than the recorded baseline by more than the
+# tolerance. Baselines are machine-specific; record them on the machine
+# that runs the comparison.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+# Never imported by any headless entry point
+GUI_MODULES = ("tkinter", "tkinterdnd2", "_tkinter")
+# Imported only by the features that need them: the PyMuPDF engine and
+# TOC (fitz), page rendering (reportlab), images and compression (PIL)
+HEAVY_MODULES = ("fitz", "pymupdf", "reportlab", "PIL", "numpy")
+
+# Entry point -> top-level packages it must not load
+ENTRY_POINTS: Dict[str, tuple] = {
+    "core.pdf_merger": GUI_MODULES + HEAVY_MODULES,
+    "core.plan": GUI_MODULES + HEAVY_MODULES,
+    # The CLI reads job specs before the merge engine is imported, and the
+    # daemon client never imports it
+    "core.cli": GUI_MODULES + HEAVY_MODULES + ("PyPDF2",),
+    "core.daemon_client": GUI_MODULES + HEAVY_MODULES + ("PyPDF2",),
+}
+
+DEFAULT_BUDGET_MS = 1000.0  # per entry point, as core.cli.STARTUP_BUDGET
+DEFAULT_TOLERANCE = 0.25  # allowed slowdown over the baseline
+SLACK_MS = 10.0  # timer noise ignored on top of the tolerance
+
+
+@dataclass
+class ImportProfile:
+    entry: str
+    total_ms: float
+    # Cumulative import time per module, including its own imports
+    modules: Dict[str, float] = field(default_factory=dict)
+    # Import time spent in each module's own body
+    self_ms: Dict[str, float] = field(default_factory=dict)
+
+    def packages(self) -> Dict[str, float]:
+        """Own import time summed per top-level package."""
+        totals: Dict[str, float] = {}
+        for name, ms in self.self_ms.items():
+            top = name.split(".")[0]
+            totals[top] = totals.get(top, 0.0) + ms
+        return totals
+
+
+def _import_once(entry: str, cwd: str) -> ImportProfile:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {entry} failed:\n{proc.stderr.strip()}")
+    profile = ImportProfile(entry, 0.0)
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        profile.self_ms[name] = int(own) / 1000
+        profile.modules[name] = int(cumulative) / 1000
+    profile.total_ms = profile.modules.get(entry, 0.0)
+    return profile
+
+
+def profile_imports(entry: str, repeat: int = 5, cwd: str = "") -> ImportProfile:
+    """Fastest of ``repeat`` cold imports, per module."""
+    cwd = cwd or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [_import_once(entry, cwd) for _ in range(max(1, repeat))]
+    best = min(runs, key=lambda p: p.total_ms)
+    for run in runs:
+        for name, ms in run.modules.items():
+            best.modules[name] = min(best.modules.get(name, ms), ms)
+        for name, ms in run.self_ms.items():
+            best.self_ms[name] = min(best.self_ms.get(name, ms), ms)
+    return best
+
+
+def check_profile(profile: ImportProfile, forbidden: tuple, budget_ms: float,
+                  baseline: Optional[Dict] = None,
+                  tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Regressions found in one entry point's profile; empty if none."""
+    problems = []
+    loaded = sorted({name.split(".")[0] for name in profile.modules} & set(forbidden))
+    if loaded:
+        problems.append(f"{profile.entry} imports {', '.join(loaded)}")
+    if profile.total_ms > budget_ms:
+        problems.append(
+            f"{profile.entry} takes {profile.total_ms:.0f} ms to import "
+            f"(budget {budget_ms:.0f} ms)"
+        )
+    if baseline:
+        limit = baseline["total_ms"] * (1 + tolerance) + SLACK_MS
+        if profile.total_ms > limit:
+            problems.append(
+                f"{profile.entry} takes {profile.total_ms:.0f} ms to import, "
+                f"baseline {baseline['total_ms']:.0f} ms (limit {limit:.0f} ms)"
+            )
+        new_packages = sorted(
+            set(profile.packages()) - {name.split(".")[0] for name in baseline["modules"]}
+        )
+        if new_packages:
+            problems.append(f"{profile.entry} now also imports {', '.join(new_packages)}")
+    return problems
+
+
+def format_profile(profile: ImportProfile, baseline: Optional[Dict] = None,
+                   top: int = 8) -> List[str]:
+    lines = [f"{profile.entry}: {profile.total_ms:.1f} ms, {len(profile.modules)} modules"]
+    packages = sorted(profile.packages().items(), key=lambda item: -item[1])
+    lines.append("  by package: " + ", ".join(
+        f"{name} {ms:.1f}" for name, ms in packages[:top]
+    ))
+    core_modules = sorted(
+        (name for name in profile.modules if name == "core" or name.startswith("core.")),
+        key=lambda name: -profile.modules[name],
+    )
+    for name in core_modules:
+        line = f"  {name:<24} {profile.modules[name]:7.1f} ms  (own {profile.self_ms[name]:.1f})"
+        if baseline and name in baseline["modules"]:
+            line += f"  baseline {baseline['modules'][name]:.1f}"
+        lines.append(line)
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m core.startup_bench",
+        description="Report per-module import cost of the headless entry points.",
+    )
+    parser.add_argument("entries", nargs="*", metavar="MODULE",
+                        help=f"entry points (default: {', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="cold imports per entry point; the fastest counts (default 5)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"fail above this import time (default {DEFAULT_BUDGET_MS:.0f})")
+    parser.add_argument("--baseline", help="fail when slower than this saved baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed slowdown over the baseline (default {DEFAULT_TOLERANCE})")
+    parser.add_argument("--save-baseline", help="write the measured profiles here")
+    parser.add_argument("--json", action="store_true", help="print profiles as JSON")
+    args = parser.parse_args(argv)
+
+    baseline: Dict = {}
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"error: {args.baseline}: {e}", file=sys.stderr)
+            return 2
+
+    problems: List[str] = []
+    profiles: List[ImportProfile] = []
+    for entry in args.entries or list(ENTRY_POINTS):
+        try:
+            profile = profile_imports(entry, args.repeat)
+        except RuntimeError as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 2
+        profiles.append(profile)
+        problems += check_profile(
+            profile, ENTRY_POINTS.get(entry, GUI_MODULES), args.budget_ms,
+            baseline.get(entry), args.tolerance,
+        )
+        if not args.json:
+            for line in format_profile(profile, baseline.get(entry)):
+                print(line)
+
+    if args.json:
+        print(json.dumps({
+            "ok": not problems,
+            "problems": problems,
+            "profiles": [asdict(p) for p in profiles],
+        }, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({p.entry: {"total_ms": p.total_ms, "modules": p.modules}
+                       for p in profiles}, f, indent=2)
+    for problem in problems:
+        print(f"REGRESSION: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,633 @@
+from __future__ import annotations
+
+# core/stream_writer.py
+
+import hashlib
+import re
+from typing import Any, BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+from PyPDF2.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    NullObject,
+    NumberObject,
+    StreamObject,
+    TextStringObject,
+    create_string_object,
+)
+
+from core.geometry import top_level_text
+
+
+# ---------------------------------------------------------------------------
+# Raw object copying (pass-through fast path)
+# ---------------------------------------------------------------------------
+
+_OBJ_HEADER = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\s*")
+_REF = re.compile(rb"(?<![\w.+\-#])(\d+)\s+(\d+)\s+R(?![\w#])")
+_STREAM_START = re.compile(rb"\s*stream(?:\r\n|\n|\r)")
+_LENGTH = re.compile(rb"/Length\s+(\d+)(?:\s+(\d+)\s+R)?")
+_PARENT = re.compile(rb"/Parent\s+(\d+)\s+(\d+)\s+R")
+_PAGE_TYPE = re.compile(rb"/Type\s*/Pages?(?![\w#])")
+_DICT_DELIM = re.compile(rb"<<|>>")
+_RAW_CHUNK = 4096
+_RAW_DICT_LIMIT = 1 << 20
+_INHERITABLE = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+# Resource streams that are worth storing once when several inputs embed
+# identical copies: images, form XObjects, embedded font programs and ICC
+# profiles. Page content streams are left alone.
+_SHARED_SUBTYPES = ("/Image", "/Form", "/Type1C", "/CIDFontType0C", "/OpenType")
+_SHARED_HINT = re.compile(
+    rb"/Subtype\s*/(?:Image|Form|Type1C|CIDFontType0C|OpenType)(?![\w#])|/Length1(?![\w#])|/N\s"
+)
+_KEY_MAX_DEPTH = 32
+
+
+class _NoContentKey(Exception):
+    pass
+
+
+def _is_shared_resource(obj) -> bool:
+    return (
+        isinstance(obj, StreamObject)
+        and (obj.get("/Subtype") in _SHARED_SUBTYPES or "/Length1" in obj or "/N" in obj)
+    )
+
+
+class _RawRef(NamedTuple):
+    pdf: Any
+    idnum: int
+    generation: int
+
+
+def _inherited(page, key: str):
+    node = page
+    for _ in range(64):
+        parent = node.get("/Parent")
+        if parent is None:
+            return None
+        node = parent.get_object()
+        if key in node:
+            return node.raw_get(key)
+    return None
+
+
+class _CountingStream:
+    """Write-through wrapper that tracks the output offset for the xref table."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self.pos = 0
+
+    def write(self, data: bytes) -> int:
+        self._stream.write(data)
+        self.pos += len(data)
+        return len(data)
+
+
+class StreamingPdfWriter:
+    """
+    Incremental PDF writer used by merge_files for very large jobs.
+
+    Pages are serialized as soon as they are added, together with every
+    object they reference. Source objects are remembered only until
+    end_segment(), after which the caller may close the source reader, so
+    memory is bounded by the largest single input instead of the whole job.
+
+    Mirrors the small part of PyPDF2's PdfWriter that the merge uses:
+    add_page, insert_page, add_outline_item and add_metadata. finish()
+    writes the page tree, outline, info dictionary, xref and trailer.
+
+    With ``dedupe`` set, resource streams (images, forms, font programs,
+    ICC profiles) are content-hashed when first referenced, and later
+    references to byte-identical copies, from any input, point at the
+    copy already written.
+    """
+
+    def __init__(self, stream: BinaryIO, dedupe: bool = False) -> None:
+        self._out = _CountingStream(stream)
+        self._offsets: List[Optional[int]] = [None]  # index = object number
+        self._kids: List[int] = []
+        self._outline: List[Tuple[str, int]] = []
+        self._info: Dict[str, Any] = {"/Producer": "PyPDF2"}
+        # id(source pdf) -> (source pdf, {(idnum, generation): new number})
+        self._sources: Dict[int, Tuple[Any, Dict[Tuple[int, int], int]]] = {}
+        self._queue: List[Tuple[int, Any]] = []
+        self._raw = False
+        self._finished = False
+
+        self._dedupe = dedupe
+        # content key -> output object number, kept for the whole job
+        self._shared: Dict[bytes, int] = {}
+        # (id(source pdf), idnum, generation) -> content key, per segment
+        self._keys: Dict[Tuple[int, int, int], bytes] = {}
+        self._duplicate_streams = 0
+        self._bytes_deduplicated = 0
+
+        self._out.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._pages_num = self._allocate()
+
+    # ------------------------------------------------------------------
+    # PdfWriter-compatible surface
+    # ------------------------------------------------------------------
+
+    @property
+    def page_count(self) -> int:
+        return len(self._kids)
+
+    @property
+    def bytes_written(self) -> int:
+        return self._out.pos
+
+    @property
+    def duplicate_streams(self) -> int:
+        """Resource streams that were replaced by an identical earlier copy."""
+        return self._duplicate_streams
+
+    @property
+    def bytes_deduplicated(self) -> int:
+        """Stream bytes not written thanks to deduplication."""
+        return self._bytes_deduplicated
+
+    def page_reference(self, index: int) -> IndirectObject:
+        """Indirect reference to an output page, e.g. for link destinations."""
+        return self._ref(self._kids[index])
+
+    def add_page(self, page) -> int:
+        """Serialize a page (and everything it references) immediately."""
+        num = self._write_page(page)
+        self._kids.append(num)
+        return num
+
+    def insert_page(self, page, index: int = 0) -> int:
+        num = self._write_page(page)
+        self._kids.insert(index, num)
+        self._outline = [
+            (title, page_index + 1 if page_index >= index else page_index)
+            for title, page_index in self._outline
+        ]
+        return num
+
+    def add_raw_page(self, reader, ref: Tuple[int, int], rotate: int = 0, box=None) -> int:
+        """
+        Pass-through fast path: copy a source page by object number without
+        building a PyPDF2 page object. Everything the page references is
+        copied byte-for-byte from the input (streams are never decoded);
+        only object numbers are rewritten.
+
+        ``box`` is the page's PageBox from the geometry scan; when the page
+        dictionary itself carries everything it inherits, it is copied raw
+        too. Otherwise it is parsed, inheritable attributes are pulled down
+        from the source page tree, and ``rotate`` is added to /Rotate.
+        """
+        num = self._allocate()
+        self._table(reader)[ref] = num
+
+        self._raw = not reader.is_encrypted
+        try:
+            raw_ref = _RawRef(reader, ref[0], ref[1])
+            if not (self._raw and not rotate and box is not None
+                    and self._emit_raw(num, raw_ref, page_box=box)):
+                self._emit(num, self._page_dict(reader, ref, rotate))
+            self._drain()
+        finally:
+            self._raw = False
+        self._kids.append(num)
+        return num
+
+    def _page_dict(self, reader, ref: Tuple[int, int], rotate: int) -> DictionaryObject:
+        page = reader.get_object(IndirectObject(ref[0], ref[1], reader))
+        page_dict = DictionaryObject()
+        for key, value in page.items():
+            if key in ("/Parent", "/StructParents"):
+                continue
+            page_dict[NameObject(key)] = value
+        for key in _INHERITABLE:
+            if key not in page_dict:
+                value = _inherited(page, key)
+                if value is not None:
+                    page_dict[NameObject(key)] = value
+        if rotate:
+            current = int(page_dict.get("/Rotate", 0))
+            page_dict[NameObject("/Rotate")] = NumberObject((current + rotate) % 360)
+        page_dict[NameObject("/Parent")] = self._ref(self._pages_num)
+        return page_dict
+
+    def add_outline_item(self, title: str, page_number: int) -> int:
+        """Top-level bookmark; resolved to a page reference in finish()."""
+        self._outline.append((title, page_number))
+        return len(self._outline) - 1
+
+    def add_metadata(self, infos: Dict[str, Any]) -> None:
+        self._info.update(infos)
+
+    def end_segment(self) -> None:
+        """
+        Forget every source object seen so far. Call after the last page of
+        an input has been added so its reader can be released.
+        """
+        self._drain()
+        self._sources.clear()
+        self._keys.clear()
+
+    def finish(self) -> None:
+        """Write the document structure, xref table and trailer."""
+        if self._finished:
+            return
+        self._drain()
+        self._sources.clear()
+        self._keys.clear()
+
+        kids = ArrayObject(self._ref(num) for num in self._kids)
+        self._emit(self._pages_num, DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): kids,
+            NameObject("/Count"): NumberObject(len(kids)),
+        }))
+
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): self._ref(self._pages_num),
+        })
+        outline_num = self._write_outline()
+        if outline_num is not None:
+            catalog[NameObject("/Outlines")] = self._ref(outline_num)
+            catalog[NameObject("/PageMode")] = NameObject("/UseOutlines")
+        catalog_num = self._allocate()
+        self._emit(catalog_num, catalog)
+
+        info_num = self._allocate()
+        self._emit(info_num, DictionaryObject({
+            NameObject(key): create_string_object(str(value))
+            for key, value in self._info.items()
+        }))
+
+        xref_pos = self._out.pos
+        size = len(self._offsets)
+        self._out.write(f"xref\n0 {size}\n".encode())
+        self._out.write(b"0000000000 65535 f \n")
+        for offset in self._offsets[1:]:
+            self._out.write(f"{offset:010d} 00000 n \n".encode())
+        self._out.write(
+            f"trailer\n<< /Size {size} /Root {catalog_num} 0 R "
+            f"/Info {info_num} 0 R >>\nstartxref\n{xref_pos}\n%%EOF\n".encode()
+        )
+        self._finished = True
+
+    # ------------------------------------------------------------------
+    # Object copying
+    # ------------------------------------------------------------------
+
+    def _allocate(self) -> int:
+        self._offsets.append(None)
+        return len(self._offsets) - 1
+
+    def _ref(self, num: int) -> IndirectObject:
+        return IndirectObject(num, 0, self)
+
+    def _write_page(self, page) -> int:
+        num = self._allocate()
+        source_ref = getattr(page, "indirect_reference", None)
+        if source_ref is not None and source_ref.pdf is not None:
+            # Annotations pointing back at this page (/P) resolve to the copy
+            self._table(source_ref.pdf)[(source_ref.idnum, source_ref.generation)] = num
+
+        page_dict = DictionaryObject()
+        for key, value in page.items():
+            if key in ("/Parent", "/StructParents"):
+                continue
+            page_dict[NameObject(key)] = value
+        page_dict[NameObject("/Parent")] = self._ref(self._pages_num)
+
+        self._emit(num, page_dict)
+        self._drain()
+        return num
+
+    def _table(self, pdf) -> Dict[Tuple[int, int], int]:
+        entry = self._sources.get(id(pdf))
+        if entry is None:
+            # Keep the source alive while mapped so its id() cannot be reused
+            entry = self._sources[id(pdf)] = (pdf, {})
+        return entry[1]
+
+    def _map_indirect(self, ref: IndirectObject) -> Optional[int]:
+        table = self._table(ref.pdf)
+        key = (ref.idnum, ref.generation)
+        num = table.get(key)
+        if num is None and self._raw:
+            # Resolved lazily in _emit_raw, which writes null for pages
+            num = self._new_mapping(ref.pdf, key, _RawRef(ref.pdf, ref.idnum, ref.generation))
+        elif num is None:
+            target = ref.get_object()
+            # Never drag in pages (or the source page tree) that were not
+            # added explicitly, e.g. through link destinations.
+            if isinstance(target, DictionaryObject) and target.get("/Type") in ("/Page", "/Pages"):
+                return None
+            num = self._new_mapping(ref.pdf, key, target)
+        return num
+
+    def _new_mapping(self, pdf, key: Tuple[int, int], item) -> int:
+        """Give a source object an output number, reusing a shared copy if any."""
+        content_key = self._shared_key(pdf, key, item) if self._dedupe else None
+        if content_key is not None:
+            num = self._shared.get(content_key)
+            if num is not None:
+                self._table(pdf)[key] = num
+                return num
+
+        num = self._allocate()
+        self._table(pdf)[key] = num
+        self._queue.append((num, item))
+        if content_key is not None:
+            self._shared[content_key] = num
+        return num
+
+    # ------------------------------------------------------------------
+    # Resource deduplication
+    # ------------------------------------------------------------------
+
+    def _shared_key(self, pdf, key: Tuple[int, int], item) -> Optional[bytes]:
+        """
+        Content key of a resource stream, or None for anything that is not
+        deduplicated. Counts the object as a duplicate when the key is known.
+        """
+        if isinstance(item, _RawRef):
+            # Cheap check on the raw bytes before asking PyPDF2 to parse it
+            if key[0] in pdf.xref_objStm:
+                return None
+            offset = pdf.xref.get(key[1], {}).get(key[0])
+            if offset is None:
+                return None
+            pdf.stream.seek(offset)
+            head = pdf.stream.read(_RAW_CHUNK)
+            if b"stream" not in head or _SHARED_HINT.search(head) is None:
+                return None
+            target = pdf.get_object(IndirectObject(key[0], key[1], pdf))
+        else:
+            target = item
+        if not _is_shared_resource(target):
+            return None
+
+        try:
+            content_key = self._content_key(IndirectObject(key[0], key[1], pdf), set(), 0)
+        except _NoContentKey:
+            return None
+        if content_key in self._shared:
+            self._duplicate_streams += 1
+            self._bytes_deduplicated += len(target._data)
+        return content_key
+
+    def _content_key(self, ref: IndirectObject, active: set, depth: int) -> bytes:
+        ident = (id(ref.pdf), ref.idnum, ref.generation)
+        cached = self._keys.get(ident)
+        if cached is not None:
+            return cached
+        if ident in active or depth > _KEY_MAX_DEPTH:
+            raise _NoContentKey
+
+        target = ref.pdf.get_object(ref)
+        if self._raw and isinstance(target, StreamObject):
+            # Raw copying never needs the parsed stream again; don't keep
+            # its data in the reader's object cache
+            ref.pdf.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+        digest = hashlib.sha256()
+        active.add(ident)
+        self._feed_key(digest, target, active, depth + 1)
+        active.discard(ident)
+        cached = self._keys[ident] = digest.digest()
+        return cached
+
+    def _feed_key(self, digest, value, active: set, depth: int) -> None:
+        if isinstance(value, IndirectObject):
+            target = value.get_object()
+            if isinstance(target, DictionaryObject) and target.get("/Type") in ("/Page", "/Pages"):
+                digest.update(b"N")  # written as null
+            else:
+                digest.update(b"R" + self._content_key(value, active, depth))
+        elif isinstance(value, StreamObject):
+            digest.update(b"S" + hashlib.sha256(value._data).digest())
+            self._feed_dict(digest, value, active, depth, skip=("/Length",))
+        elif isinstance(value, DictionaryObject):
+            self._feed_dict(digest, value, active, depth)
+        elif isinstance(value, ArrayObject):
+            digest.update(b"[")
+            for item in value:
+                self._feed_key(digest, item, active, depth)
+            digest.update(b"]")
+        else:
+            digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+    def _feed_dict(self, digest, value, active: set, depth: int, skip=()) -> None:
+        digest.update(b"<<")
+        for key in sorted(value.keys()):
+            if key in skip:
+                continue
+            digest.update(key.encode() + b" ")
+            self._feed_key(digest, value.raw_get(key), active, depth)
+        digest.update(b">>")
+
+    def _translate(self, value):
+        if isinstance(value, IndirectObject):
+            if value.pdf is self:
+                return value
+            num = self._map_indirect(value)
+            return NullObject() if num is None else self._ref(num)
+        if isinstance(value, StreamObject):
+            # Streams must be indirect objects in the output
+            num = self._allocate()
+            self._queue.append((num, value))
+            return self._ref(num)
+        if isinstance(value, DictionaryObject):
+            out = DictionaryObject()
+            for key, item in value.items():
+                out[NameObject(key)] = self._translate(item)
+            return out
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._translate(item) for item in value)
+        return value
+
+    def _translate_top(self, obj):
+        if not isinstance(obj, StreamObject):
+            return self._translate(obj)
+        # Stream data is copied as-is: encoded streams stay encoded
+        out = DecodedStreamObject() if isinstance(obj, DecodedStreamObject) else EncodedStreamObject()
+        out._data = obj._data
+        for key, item in obj.items():
+            if key == "/Length":
+                continue
+            out[NameObject(key)] = self._translate(item)
+        return out
+
+    def _emit(self, num: int, obj) -> None:
+        if isinstance(obj, _RawRef):
+            if self._emit_raw(num, obj):
+                return
+            obj = obj.pdf.get_object(IndirectObject(obj.idnum, obj.generation, obj.pdf))
+            if isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages"):
+                obj = NullObject()
+        self._offsets[num] = self._out.pos
+        self._out.write(f"{num} 0 obj\n".encode())
+        self._translate_top(obj).write_to_stream(self._out, None)
+        self._out.write(b"\nendobj\n")
+
+    def _map_raw(self, pdf, match) -> bytes:
+        key = (int(match.group(1)), int(match.group(2)))
+        num = self._table(pdf).get(key)
+        if num is None:
+            num = self._new_mapping(pdf, key, _RawRef(pdf, key[0], key[1]))
+        return b"%d 0 R" % num
+
+    def _emit_raw(self, num: int, ref: _RawRef, page_box=None) -> bool:
+        """
+        Copy one uncompressed object straight from the input file, rewriting
+        only its references. Returns False when the object needs the parsed
+        path (object streams, literal strings, unusual syntax).
+
+        With ``page_box`` the object is a page being added: its /Parent is
+        pointed at the output page tree, and it is only copied raw when it
+        does not rely on inherited attributes.
+        """
+        pdf = ref.pdf
+        if ref.idnum in pdf.xref_objStm:
+            return False
+        offset = pdf.xref.get(ref.generation, {}).get(ref.idnum)
+        if offset is None:
+            return False
+
+        source = pdf.stream
+        source.seek(offset)
+        data = source.read(_RAW_CHUNK)
+        m = _OBJ_HEADER.match(data)
+        if m is None or int(m.group(1)) != ref.idnum:
+            return False
+        body_start = m.end()
+
+        # Find the end of the object body (a dictionary, or anything up to endobj)
+        while True:
+            if data.startswith(b"<<", body_start):
+                depth = 0
+                body_end = None
+                for d in _DICT_DELIM.finditer(data, body_start):
+                    depth += 1 if d.group() == b"<<" else -1
+                    if depth == 0:
+                        body_end = d.end()
+                        break
+            else:
+                end = data.find(b"endobj", body_start)
+                body_end = end if end >= 0 else None
+            if body_end is not None:
+                break
+            more = source.read(_RAW_CHUNK)
+            if not more or len(data) > _RAW_DICT_LIMIT:
+                return False
+            data += more
+
+        body = data[body_start:body_end]
+        if b"(" in body:
+            return False
+
+        is_dict = body.startswith(b"<<")
+        if is_dict:
+            # Read far enough past the dictionary to see whether a stream
+            # follows; the chunk may end right after its ">>"
+            while len(data[body_end:].lstrip()) < len(b"stream\r\n"):
+                more = source.read(_RAW_CHUNK)
+                if not more:
+                    break
+                data += more
+
+        top = top_level_text(body) if is_dict else None
+        if is_dict and top is None:
+            return False
+        if page_box is not None:
+            if top is None or not self._raw_page_ok(pdf, top, page_box):
+                return False
+            payload = None
+            body = _REF.sub(lambda r: self._map_raw(pdf, r), body)
+        elif top is not None and _PAGE_TYPE.search(top):
+            payload = None
+            body = b"null"
+        else:
+            payload = None
+            stream_match = _STREAM_START.match(data, body_end) if is_dict else None
+            if stream_match is not None:
+                length_match = _LENGTH.search(top)
+                if length_match is None:
+                    return False
+                if length_match.group(2) is not None:
+                    length = int(pdf.get_object(IndirectObject(
+                        int(length_match.group(1)), int(length_match.group(2)), pdf
+                    )))
+                else:
+                    length = int(length_match.group(1))
+                source.seek(offset + stream_match.end())
+                payload = source.read(length)
+                if len(payload) != length:
+                    return False
+            body = _REF.sub(lambda r: self._map_raw(pdf, r), body)
+
+        self._offsets[num] = self._out.pos
+        self._out.write(b"%d 0 obj\n" % num)
+        self._out.write(body)
+        if payload is not None:
+            self._out.write(b"\nstream\n")
+            self._out.write(payload)
+            self._out.write(b"\nendstream")
+        self._out.write(b"\nendobj\n")
+        return True
+
+    def _raw_page_ok(self, pdf, top: bytes, box) -> bool:
+        if b"/Resources" not in top or b"/MediaBox" not in top:
+            return False
+        if b"/Rotate" not in top and box.rotation:
+            return False
+        if b"/CropBox" not in top and (box.crop_width, box.crop_height) != (box.width, box.height):
+            return False
+        parent = _PARENT.search(top)
+        if parent is None:
+            return False
+        # The source parent node becomes the output page tree root
+        self._table(pdf)[(int(parent.group(1)), int(parent.group(2)))] = self._pages_num
+        return True
+
+    def _drain(self) -> None:
+        while self._queue:
+            num, obj = self._queue.pop()
+            self._emit(num, obj)
+
+    def _write_outline(self) -> Optional[int]:
+        items = [
+            (title, page_index) for title, page_index in self._outline
+            if 0 <= page_index < len(self._kids)
+        ]
+        if not items:
+            return None
+        outline_num = self._allocate()
+        item_nums = [self._allocate() for _ in items]
+        for i, (title, page_index) in enumerate(items):
+            item = DictionaryObject({
+                NameObject("/Title"): TextStringObject(title),
+                NameObject("/Parent"): self._ref(outline_num),
+                NameObject("/Dest"): ArrayObject(
+                    [self._ref(self._kids[page_index]), NameObject("/Fit")]
+                ),
+            })
+            if i > 0:
+                item[NameObject("/Prev")] = self._ref(item_nums[i - 1])
+            if i < len(items) - 1:
+                item[NameObject("/Next")] = self._ref(item_nums[i + 1])
+            self._emit(item_nums[i], item)
+        self._emit(outline_num, DictionaryObject({
+            NameObject("/Type"): NameObject("/Outlines"),
+            NameObject("/First"): self._ref(item_nums[0]),
+            NameObject("/Last"): self._ref(item_nums[-1]),
+            NameObject("/Count"): NumberObject(len(items)),
+        }))
+        return outline_num
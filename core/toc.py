@@ -2,187 +2,189 @@ from __future__ import annotations
 
 # core/toc.py
 
-import tempfile
-import os
-import fitz  # PyMuPDF
+# Standard Letter size
+TOC_PAGE_WIDTH = 612
+TOC_PAGE_HEIGHT = 792
 
-def insert_toc_pages(pdf_path: str, toc_entries: list[dict], file_info_list: list[str] = None):
-    """
-    Insert a multi-page Table of Contents at the beginning of the PDF.
-    toc_entries = [
-        { "filename": "example.pdf", "page": 12 },
-        ...
-    ]
-    """
-    try:
-        doc = fitz.open(pdf_path)
+_TITLE_FONT_SIZE = 24
+_ENTRY_FONT_SIZE = 11
+_MARGIN_LEFT = 72
+_MARGIN_TOP = 72
+_MARGIN_BOTTOM = 72
+_LINE_HEIGHT = 20
+
+
+def _entries_per_page() -> int:
+    available_height = (
+        TOC_PAGE_HEIGHT - _MARGIN_TOP - _MARGIN_BOTTOM - (_TITLE_FONT_SIZE + 25)
+    )
+    return max(1, int(available_height / _LINE_HEIGHT))
 
-        # Standard Letter size
-        page_width = 612
-        page_height = 792
 
-        title_font_size = 24
-        entry_font_size = 11
-        margin_left = 72
-        margin_top = 72
-        margin_bottom = 72
-        line_height = 20
+def toc_page_count(num_entries: int) -> int:
+    """Number of TOC pages needed for the given number of entries."""
+    entries_per_page = _entries_per_page()
+    return (num_entries + entries_per_page - 1) // entries_per_page
+
+
+def render_toc_pages(toc_entries: list[dict], file_info_list: list[str] = None):
+    """
+    Render the Table of Contents on its own, as a new PyMuPDF document.
+
+    The TOC is meant to be placed in front of the merged pages, so each
+    entry's page number is shifted by the TOC page count. Returns the
+    document and its links as (toc_page_index, rect, dest_page_index),
+    with rects in PyMuPDF (top-left origin) coordinates; the caller adds
+    them once the destination pages exist.
+    """
+    page_width = TOC_PAGE_WIDTH
+    page_height = TOC_PAGE_HEIGHT
+    title_font_size = _TITLE_FONT_SIZE
+    entry_font_size = _ENTRY_FONT_SIZE
+    margin_left = _MARGIN_LEFT
+    margin_top = _MARGIN_TOP
+    line_height = _LINE_HEIGHT
+    entries_per_page = _entries_per_page()
+    num_toc_pages = toc_page_count(len(toc_entries))
+
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    links = []
+
+    for toc_page_idx, i in enumerate(range(0, len(toc_entries), entries_per_page)):
+        chunk = toc_entries[i:i + entries_per_page]
+        toc_page = doc.new_page(width=page_width, height=page_height)
+
+        # Title
+        title_text = "Table of Contents"
+        if num_toc_pages > 1:
+            title_text += f" (Page {toc_page_idx + 1} of {num_toc_pages})"
+
+        toc_page.insert_text(
+            (margin_left, margin_top + 20),
+            title_text,
+            fontsize=title_font_size,
+            fontname="helv",
+            color=(0, 0, 0)
+        )
 
-        available_height = (
-            page_height - margin_top - margin_bottom - (title_font_size + 25)
+        # Divider line
+        line_y = margin_top + title_font_size + 15
+        toc_page.draw_line(
+            (margin_left, line_y),
+            (page_width - margin_left, line_y),
+            color=(0, 0, 0),
+            width=1
         )
-        entries_per_page = max(1, int(available_height / line_height))
-
-        toc_pages_data = []
-        total_pages = (len(toc_entries) + entries_per_page - 1) // entries_per_page
-
-        # ------------------------------------------------------------------
-        # Break TOC entries into pages
-        # ------------------------------------------------------------------
-        for i in range(0, len(toc_entries), entries_per_page):
-            chunk = toc_entries[i:i + entries_per_page]
-            toc_pages_data.append({
-                "entries": chunk,
-                "page_number": len(toc_pages_data) + 1,
-                "total_pages": total_pages
-            })
 
-        num_toc_pages = len(toc_pages_data)
-        # ------------------------------------------------------------------
-        # Insert TOC pages at the beginning (reverse order)
-        # ------------------------------------------------------------------
-        for toc_page_idx, toc_page_info in enumerate(reversed(toc_pages_data)):
-            toc_page = doc.new_page(0, width=page_width, height=page_height)
-
-            # Title
-            title_text = "Table of Contents"
-            if toc_page_info["total_pages"] > 1:
-                title_text += (
-                    f" (Page {toc_page_info['page_number']} of "
-                    f"{toc_page_info['total_pages']})"
+        current_y = line_y + 25
+
+        # If this is the first TOC page and file_info_list is provided, insert file info below the divider
+        if toc_page_idx == 0 and file_info_list:
+            info_font_size = 10
+            info_y = current_y
+            for info in file_info_list:
+                toc_page.insert_text(
+                    (margin_left, info_y),
+                    info,
+                    fontsize=info_font_size,
+                    fontname="helv",
+                    color=(0.2, 0.2, 0.2)
                 )
+                info_y += info_font_size + 2
+            current_y = info_y + 8  # Add some space after file info
+        max_filename_length = 80
+
+        for entry in chunk:
+            filename = entry["filename"]
+            if len(filename) > max_filename_length:
+                filename = filename[:max_filename_length - 3] + "..."
 
-            toc_page.insert_text(
-                (margin_left, margin_top + 20),
-                title_text,
-                fontsize=title_font_size,
+            # Destination page index after TOC insertion
+            dest_page_index = entry["page"] + num_toc_pages
+
+            entry_text = filename
+            page_text = f"Page {dest_page_index + 1}"
+
+            # Filename text
+            text_rect = fitz.Rect(
+                margin_left, current_y,
+                page_width - 150, current_y + line_height
+            )
+            toc_page.insert_textbox(
+                text_rect,
+                entry_text,
+                fontsize=entry_font_size,
                 fontname="helv",
-                color=(0, 0, 0)
+                color=(0, 0, 1),
+                align=fitz.TEXT_ALIGN_LEFT
             )
 
-            # Divider line
-            line_y = margin_top + title_font_size + 15
-            toc_page.draw_line(
-                (margin_left, line_y),
-                (page_width - margin_left, line_y),
-                color=(0, 0, 0),
-                width=1
+            # Page number text
+            page_rect = fitz.Rect(
+                page_width - 150, current_y,
+                page_width - margin_left, current_y + line_height
+            )
+            toc_page.insert_textbox(
+                page_rect,
+                page_text,
+                fontsize=entry_font_size,
+                fontname="helv",
+                color=(0.3, 0.3, 0.3),
+                align=fitz.TEXT_ALIGN_RIGHT
             )
 
-            current_y = line_y + 25
-
-            # If this is the first TOC page and file_info_list is provided, insert file info below the divider
-            if toc_page_idx == len(toc_pages_data) - 1 and file_info_list:
-                info_font_size = 10
-                info_y = current_y
-                for info in file_info_list:
-                    toc_page.insert_text(
-                        (margin_left, info_y),
-                        info,
-                        fontsize=info_font_size,
-                        fontname="helv",
-                        color=(0.2, 0.2, 0.2)
-                    )
-                    info_y += info_font_size + 2
-                current_y = info_y + 8  # Add some space after file info
-            max_filename_length = 80
-
-            for entry in toc_page_info["entries"]:
-                filename = entry["filename"]
-                if len(filename) > max_filename_length:
-                    filename = filename[:max_filename_length - 3] + "..."
-
-                # Destination page index after TOC insertion
-                dest_page_index = entry["page"] + num_toc_pages
-
-                entry_text = filename
-                page_text = f"Page {dest_page_index + 1}"
-
-                # Filename text
-                text_rect = fitz.Rect(
-                    margin_left, current_y,
-                    page_width - 150, current_y + line_height
-                )
-                toc_page.insert_textbox(
-                    text_rect,
-                    entry_text,
-                    fontsize=entry_font_size,
-                    fontname="helv",
-                    color=(0, 0, 1),
-                    align=fitz.TEXT_ALIGN_LEFT
-                )
+            # Clickable area, linked by the caller
+            link_rect = fitz.Rect(
+                margin_left, current_y,
+                page_width - margin_left, current_y + line_height
+            )
+            links.append((toc_page_idx, link_rect, dest_page_index))
 
-                # Page number text
-                page_rect = fitz.Rect(
-                    page_width - 150, current_y,
-                    page_width - margin_left, current_y + line_height
-                )
-                toc_page.insert_textbox(
-                    page_rect,
-                    page_text,
-                    fontsize=entry_font_size,
-                    fontname="helv",
-                    color=(0.3, 0.3, 0.3),
-                    align=fitz.TEXT_ALIGN_RIGHT
-                )
+            current_y += line_height
+
+    return doc, links
 
-                # Clickable link
-                if dest_page_index < len(doc):
-                    link_rect = fitz.Rect(
-                        margin_left, current_y,
-                        page_width - margin_left, current_y + line_height
-                    )
-                    toc_page.insert_link({
-                        "kind": fitz.LINK_GOTO,
-                        "from": link_rect,
-                        "page": dest_page_index,
-                        "to": fitz.Point(0, 0),
-                        "zoom": 0
-                    })
-
-                current_y += line_height
-
-        # ------------------------------------------------------------------
-        # Adjust existing outline (bookmarks)
-        # ------------------------------------------------------------------
-        try:
-            existing_toc = doc.get_toc()
-            if existing_toc:
-                offset = len(toc_pages_data)
-                for entry in existing_toc:
-                    if len(entry) >= 3 and isinstance(entry[2], int):
-                        entry[2] += offset
-                doc.set_toc(existing_toc)
-        except Exception:
-            pass
-
-        # ------------------------------------------------------------------
-        # Save updated PDF
-        # ------------------------------------------------------------------
-        fd, temp_path = tempfile.mkstemp(suffix=".pdf")
-        os.close(fd)
-
-        try:
-            doc.save(temp_path, garbage=4, deflate=True)
-            doc.close()
-            os.replace(temp_path, pdf_path)
-        except Exception:
-            doc.close()
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise
-
-    except Exception as e:
-        print(f"Warning: Could not insert TOC page: {e}")
-
-print(">>> FUNCTIONS DEFINED:", "insert_toc_pages" in globals())
\ No newline at end of file
+
+def insert_toc_into_document(doc, toc_entries: list[dict], file_info_list: list[str] = None) -> int:
+    """
+    Insert the Table of Contents pages at the front of an open PyMuPDF
+    document and shift its outline. Returns the number of pages inserted.
+    """
+    import fitz  # PyMuPDF
+
+    # Read the outline before inserting: its page numbers are shifted below
+    try:
+        existing_toc = doc.get_toc()
+    except Exception:
+        existing_toc = []
+
+    toc_doc, links = render_toc_pages(toc_entries, file_info_list)
+    num_toc_pages = toc_doc.page_count
+    doc.insert_pdf(toc_doc, start_at=0)
+    toc_doc.close()
+
+    for toc_page_idx, link_rect, dest_page_index in links:
+        if dest_page_index < len(doc):
+            doc[toc_page_idx].insert_link({
+                "kind": fitz.LINK_GOTO,
+                "from": link_rect,
+                "page": dest_page_index,
+                "to": fitz.Point(0, 0),
+                "zoom": 0
+            })
+
+    # ------------------------------------------------------------------
+    # Adjust existing outline (bookmarks)
+    # ------------------------------------------------------------------
+    try:
+        if existing_toc:
+            for entry in existing_toc:
+                if len(entry) >= 3 and isinstance(entry[2], int):
+                    entry[2] += num_toc_pages
+            doc.set_toc(existing_toc)
+    except Exception:
+        pass
+
+    return num_toc_pages
@@ -5,7 +5,111 @@ from __future__ import annotations
 import io
 import math
 from PyPDF2 import PdfReader
-from reportlab.pdfgen import canvas
+
+def render_watermark(
+    width: float,
+    height: float,
+    text: str,
+    opacity: float,
+    font_size: int,
+    rotation: int,
+    position: str,
+    safe_mode: bool,
+    font_color: str = "#000000"
+) -> bytes:
+    """
+    Render the watermark for a page of the given size into a one-page PDF
+    and return its bytes. Shared by the PyPDF2 and PyMuPDF merge engines.
+    """
+    position = (position or "center").lower()
+
+    adjusted_font_size = font_size
+    adjusted_position = position
+
+    # ------------------------------------------------------------------
+    # Safe mode: auto-scale watermark to avoid clipping
+    # ------------------------------------------------------------------
+    if safe_mode:
+        text_width_approx = len(text) * font_size * 0.5
+        text_height_approx = font_size * 1.2
+
+        angle_rad = math.radians(rotation)
+        cos_a = abs(math.cos(angle_rad))
+        sin_a = abs(math.sin(angle_rad))
+
+        rotated_width = text_width_approx * cos_a + text_height_approx * sin_a
+        rotated_height = text_width_approx * sin_a + text_height_approx * cos_a
+
+        safe_margin = 40
+
+        # Top/bottom placement: ensure vertical fit
+        if position in ["top", "bottom"]:
+            half_rotated = rotated_height * 0.5
+            allowed = height * 0.15 + safe_margin
+
+            if half_rotated > allowed:
+                max_font = int(font_size * (allowed / half_rotated) * 0.95)
+                if max_font >= 10:
+                    adjusted_font_size = max(10, max_font)
+                else:
+                    adjusted_position = "center"
+
+        # Horizontal fit
+        if rotated_width > width - safe_margin * 2 and adjusted_font_size > 10:
+            max_font = int(
+                adjusted_font_size *
+                (width - safe_margin * 2) / rotated_width * 0.95
+            )
+            adjusted_font_size = max(10, max_font)
+
+    # ------------------------------------------------------------------
+    # Render watermark into a temporary PDF
+    # ------------------------------------------------------------------
+    from reportlab.lib.colors import HexColor
+    from reportlab.pdfgen import canvas
+
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=(width, height))
+    c.setFillAlpha(opacity)
+    c.setFont("Helvetica-Bold", adjusted_font_size)
+    c.setFillColor(HexColor(font_color))
+
+    c.saveState()
+
+    # Positioning
+    if adjusted_position == "top-left":
+        c.translate(60, height * 0.85)
+        c.rotate(rotation)
+        c.drawString(0, 0, text)
+    elif adjusted_position == "top-right":
+        c.translate(width - 60, height * 0.85)
+        c.rotate(rotation)
+        c.drawRightString(0, 0, text)
+    elif adjusted_position == "bottom-left":
+        c.translate(60, height * 0.15)
+        c.rotate(rotation)
+        c.drawString(0, 0, text)
+    elif adjusted_position == "bottom-right":
+        c.translate(width - 60, height * 0.15)
+        c.rotate(rotation)
+        c.drawRightString(0, 0, text)
+    elif adjusted_position == "top":
+        c.translate(width / 2, height * 0.85)
+        c.rotate(rotation)
+        c.drawCentredString(0, 0, text)
+    elif adjusted_position == "bottom":
+        c.translate(width / 2, height * 0.15)
+        c.rotate(rotation)
+        c.drawCentredString(0, 0, text)
+    else:
+        c.translate(width / 2, height / 2)
+        c.rotate(rotation)
+        c.drawCentredString(0, 0, text)
+    c.restoreState()
+    c.save()
+
+    return packet.getvalue()
+
 
 def add_watermark(
     page,
@@ -25,93 +129,10 @@ def add_watermark(
         width = float(box.width)
         height = float(box.height)
 
-        position = (position or "center").lower()
-
-        adjusted_font_size = font_size
-        adjusted_position = position
-
-        # ------------------------------------------------------------------
-        # Safe mode: auto-scale watermark to avoid clipping
-        # ------------------------------------------------------------------
-        if safe_mode:
-            text_width_approx = len(text) * font_size * 0.5
-            text_height_approx = font_size * 1.2
-
-            angle_rad = math.radians(rotation)
-            cos_a = abs(math.cos(angle_rad))
-            sin_a = abs(math.sin(angle_rad))
-
-            rotated_width = text_width_approx * cos_a + text_height_approx * sin_a
-            rotated_height = text_width_approx * sin_a + text_height_approx * cos_a
-
-            safe_margin = 40
-
-            # Top/bottom placement: ensure vertical fit
-            if position in ["top", "bottom"]:
-                half_rotated = rotated_height * 0.5
-                allowed = height * 0.15 + safe_margin
-
-                if half_rotated > allowed:
-                    max_font = int(font_size * (allowed / half_rotated) * 0.95)
-                    if max_font >= 10:
-                        adjusted_font_size = max(10, max_font)
-                    else:
-                        adjusted_position = "center"
-
-            # Horizontal fit
-            if rotated_width > width - safe_margin * 2 and adjusted_font_size > 10:
-                max_font = int(
-                    adjusted_font_size *
-                    (width - safe_margin * 2) / rotated_width * 0.95
-                )
-                adjusted_font_size = max(10, max_font)
-
-        # ------------------------------------------------------------------
-        # Render watermark into a temporary PDF
-        # ------------------------------------------------------------------
-        packet = io.BytesIO()
-        c = canvas.Canvas(packet, pagesize=(width, height))
-        c.setFillAlpha(opacity)
-        c.setFont("Helvetica-Bold", adjusted_font_size)
-        from reportlab.lib.colors import HexColor
-        c.setFillColor(HexColor(font_color))
-
-        c.saveState()
-
-        # Positioning
-        if adjusted_position == "top-left":
-            c.translate(60, height * 0.85)
-            c.rotate(rotation)
-            c.drawString(0, 0, text)
-        elif adjusted_position == "top-right":
-            c.translate(width - 60, height * 0.85)
-            c.rotate(rotation)
-            c.drawRightString(0, 0, text)
-        elif adjusted_position == "bottom-left":
-            c.translate(60, height * 0.15)
-            c.rotate(rotation)
-            c.drawString(0, 0, text)
-        elif adjusted_position == "bottom-right":
-            c.translate(width - 60, height * 0.15)
-            c.rotate(rotation)
-            c.drawRightString(0, 0, text)
-        elif adjusted_position == "top":
-            c.translate(width / 2, height * 0.85)
-            c.rotate(rotation)
-            c.drawCentredString(0, 0, text)
-        elif adjusted_position == "bottom":
-            c.translate(width / 2, height * 0.15)
-            c.rotate(rotation)
-            c.drawCentredString(0, 0, text)
-        else:
-            c.translate(width / 2, height / 2)
-            c.rotate(rotation)
-            c.drawCentredString(0, 0, text)
-        c.restoreState()
-        c.save()
-
-        packet.seek(0)
-        watermark_pdf = PdfReader(packet)
+        watermark_pdf = PdfReader(io.BytesIO(render_watermark(
+            width, height, text, opacity, font_size,
+            rotation, position, safe_mode, font_color
+        )))
         watermark_page = watermark_pdf.pages[0]
 
         # Merge watermark onto the page
@@ -119,4 +140,4 @@ def add_watermark(
 
     except Exception:
         # Watermark failure should not break the merge
-        pass
\ No newline at end of file
+        pass
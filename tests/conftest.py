@@ -0,0 +1,35 @@
+"""
+Shared fixtures: small PDFs written with PyMuPDF into the test's temporary
+directory, and per-user cache and config directories redirected there so
+no test touches the real ones.
+"""
+
+import fitz
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _private_user_dirs(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "user-cache"))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "user-config"))
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """
+    ``make_pdf(name, sizes)`` writes tmp_path/name with one page per
+    (width, height), each labelled with its name and page number, and
+    returns its path as a string.
+    """
+    def make(name, sizes):
+        doc = fitz.open()
+        for number, (width, height) in enumerate(sizes, 1):
+            page = doc.new_page(width=width, height=height)
+            page.insert_text((36, 72), f"{name} page {number}", fontsize=18)
+        path = tmp_path / name
+        doc.save(str(path))
+        doc.close()
+        return str(path)
+    return make
+
@@ -0,0 +1,103 @@
+"""
+The batch runner: every job gets a result in spec order, one failing job
+does not stop the others, and a worker process that dies mid-batch fails
+its jobs instead of hanging or crashing the batch.
+"""
+
+import multiprocessing
+import os
+import signal
+
+import fitz
+import pytest
+
+import core.jobs
+from core.batch import discover_jobs, run_batch, summarize
+from core.jobs import STATUS_FAILED, STATUS_INVALID, STATUS_OK, JobSpec
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def make_spec(make_pdf, tmp_path):
+    """``make_spec(name, pages)`` is a JobSpec merging one ``pages``-page input."""
+    def make(name, pages=2):
+        source = make_pdf(f"{name}-in.pdf", [(612, 792)] * pages)
+        return JobSpec(f"{name}.json", str(tmp_path / f"{name}.pdf"), [{"path": source}], {})
+    return make
+
+
+def _page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _dies_on(name):
+    """run_job that kills its own process for the job writing ``name``."""
+    run_job = core.jobs.run_job
+
+    def run(spec, *args, **kwargs):
+        if os.path.basename(spec.output) == name:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return run_job(spec, *args, **kwargs)
+    return run
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_follow_spec_order(make_spec, workers):
+    specs = [make_spec("small", 1), make_spec("large", 6), make_spec("medium", 3)]
+    results = run_batch(specs, workers=workers, shared_caches=False)
+    assert [r.output for r in results] == [s.output for s in specs]
+    assert [r.status for r in results] == [STATUS_OK] * 3
+    assert [_page_count(s.output) for s in specs] == [1, 6, 3]
+
+
+def test_failing_job_does_not_stop_the_batch(make_spec, tmp_path):
+    missing = [{"path": str(tmp_path / "gone.pdf")}]
+    bad = JobSpec("bad.json", str(tmp_path / "bad.pdf"), missing, {})
+    specs = [make_spec("first"), bad, make_spec("last")]
+    seen = []
+    results = run_batch(specs, shared_caches=False, on_result=seen.append)
+    assert [r.status for r in results] == [STATUS_OK, STATUS_INVALID, STATUS_OK]
+    assert seen == results
+    summary = summarize(results, 1.0, 1)
+    assert (summary.ok, summary.invalid, summary.pages) == (2, 1, 4)
+
+
+@pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="the dying job is patched in; spawned workers would not see it",
+)
+def test_dead_worker_fails_jobs_instead_of_the_batch(make_spec, monkeypatch):
+    monkeypatch.setattr(core.jobs, "run_job", _dies_on("doomed.pdf"))
+    specs = [make_spec("first"), make_spec("doomed", 4), make_spec("last")]
+
+    results = run_batch(specs, workers=2, shared_caches=False)
+    assert [r.output for r in results] == [s.output for s in specs]
+    doomed = results[1]
+    assert doomed.status == STATUS_FAILED
+    assert doomed.error
+    assert not os.path.exists(doomed.output)
+    # Jobs still in the pool fail the same way; finished ones are kept
+    for spec, result in zip(specs, results):
+        assert result.status in (STATUS_OK, STATUS_FAILED)
+        if result.status == STATUS_OK:
+            assert _page_count(spec.output) == 2
+
+    # The next batch gets a fresh pool
+    monkeypatch.undo()
+    results = run_batch([make_spec("again"), make_spec("more")], workers=2, shared_caches=False)
+    assert [r.status for r in results] == [STATUS_OK, STATUS_OK]
+
+
+def test_discover_jobs_finds_specs_only(tmp_path):
+    for name in ("b.json", "a.pdflist", "notes.txt", "out.pdf"):
+        (tmp_path / name).write_text("[]")
+    (tmp_path / "nested").mkdir()
+    assert [os.path.basename(p) for p in discover_jobs(str(tmp_path))] == ["a.pdflist", "b.json"]
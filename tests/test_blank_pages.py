@@ -0,0 +1,202 @@
+"""
+Blank-page verdicts: the tier 1 operator scan on bare content streams, and
+the whole-page classifiers of both engines on hand-written one-page PDFs,
+including the cases where tier 1 and the old text heuristic disagree.
+"""
+
+import io
+
+import fitz
+import pytest
+from PyPDF2 import PdfReader
+
+from core.blank_pages import (
+    AMBIGUOUS,
+    BLANK,
+    NOT_BLANK,
+    REASON_IMAGE,
+    REASON_INLINE_IMAGE,
+    TIER_OPERATORS,
+    TIER_TEXT,
+    BlankVerdict,
+    classify_fitz_page,
+    classify_page,
+    scan_content,
+    text_heuristic_blank,
+)
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+_FONT = b"/Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >>"
+_SQUARE = b"36 36 100 100 re "
+
+
+def _page_pdf(content: bytes, resources: bytes = b"", page_extra: bytes = b"",
+              extra_objects=()) -> bytes:
+    """One 200x200 page drawing ``content``; ``extra_objects`` are 5 0 R on."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200]"
+        b" /Resources << " + resources + b" >> /Contents 4 0 R" + page_extra + b" >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        *extra_objects,
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref)
+    return bytes(out)
+
+
+def _pypdf2_verdict(data: bytes):
+    return classify_page(PdfReader(io.BytesIO(data)).pages[0])
+
+
+def _fitz_verdict(data: bytes):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return classify_fitz_page(doc[0])
+
+
+ENGINES = [_pypdf2_verdict, _fitz_verdict]
+
+
+# ----------------------------------------------------------------------
+# Tier 1 operator scan
+# ----------------------------------------------------------------------
+
+@pytest.mark.parametrize("content", [
+    b"",
+    b"% only a comment\n",
+    _SQUARE + b"n",  # path without paint (a clip)
+    b"1 g " + _SQUARE + b"f",
+    b"0.97 g " + _SQUARE + b"f",
+    b"1 1 1 rg " + _SQUARE + b"f",
+    b"0 0 0 0 k " + _SQUARE + b"f",
+    b"1 G " + _SQUARE + b"S",
+    b"1 g 1 G " + _SQUARE + b"B",
+    b"/DeviceRGB cs 1 1 1 sc " + _SQUARE + b"f",
+    b"1 g q 0 g Q " + _SQUARE + b"f",  # Q restores the white fill
+    b"BT /F1 12 Tf 36 100 Td (   ) Tj ET",
+    b"BT 3 Tr /F1 12 Tf 36 100 Td (hidden) Tj ET",
+    b"BT 7 Tr /F1 12 Tf 36 100 Td (clip only) Tj ET",
+    b"1 g BT /F1 12 Tf 36 100 Td (white) Tj ET",
+])
+def test_scan_content_blank(content):
+    assert scan_content(content)[0] == BLANK
+
+
+@pytest.mark.parametrize("content, reason", [
+    (_SQUARE + b"f", "vector paint"),  # initial fill colour is black
+    (b"0.5 g " + _SQUARE + b"f", "vector paint"),
+    (b"1 0 0 rg " + _SQUARE + b"f", "vector paint"),
+    (b"0 0 0 1 k " + _SQUARE + b"f*", "vector paint"),
+    (_SQUARE + b"S", "vector paint"),
+    (b"1 g " + _SQUARE + b"B", "vector paint"),  # white fill, black stroke
+    (b"/DeviceGray cs 0.2 sc " + _SQUARE + b"f", "vector paint"),
+    (b"BT /F1 12 Tf 36 100 Td (x) Tj ET", "text"),
+    (b"BT /F1 12 Tf 36 100 Td [(a) -250 (b)] TJ ET", "text"),
+    (b"BT /F1 12 Tf 36 100 Td <41> Tj ET", "text"),
+    (b"BT 3 Tr (hidden) Tj 0 Tr (shown) Tj ET", "text"),
+    (b"/Im1 Do", REASON_IMAGE),
+    (b"q 10 0 0 10 36 36 cm BI /W 1 /H 1 /BPC 8 /CS /G ID \xff EI Q", REASON_INLINE_IMAGE),
+    (b"/Sh1 sh", "shading"),
+])
+def test_scan_content_not_blank(content, reason):
+    assert scan_content(content) == (NOT_BLANK, reason)
+
+
+@pytest.mark.parametrize("content", [
+    b"/CS0 cs 0.2 sc " + _SQUARE + b"f",
+    b"/CS0 CS 0.2 SC " + _SQUARE + b"S",
+    b"/CS0 cs BT /F1 12 Tf 36 100 Td (x) Tj ET",
+])
+def test_scan_content_unknown_colour_space_is_ambiguous(content):
+    assert scan_content(content)[0] == AMBIGUOUS
+
+
+def test_scan_content_stops_at_first_ink():
+    # Whatever follows the first mark is never looked at
+    content = _SQUARE + b"f " + b"1 g " * 1000 + b"(unterminated"
+    assert scan_content(content) == (NOT_BLANK, "vector paint")
+
+
+# ----------------------------------------------------------------------
+# Whole pages
+# ----------------------------------------------------------------------
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_dark_paths_without_text_are_not_blank(verdict):
+    # The text heuristic alone called this page blank (no text, fonts or
+    # XObjects); tier 1 sees the ink
+    data = _page_pdf(b"0 g " + _SQUARE + b"f")
+    assert text_heuristic_blank(PdfReader(io.BytesIO(data)).pages[0])
+    assert verdict(data) == BlankVerdict(False, TIER_OPERATORS, "vector paint")
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_white_fill_is_blank(verdict):
+    data = _page_pdf(b"1 g 0 0 200 200 re f")
+    assert verdict(data) == BlankVerdict(True, TIER_OPERATORS, "nothing drawn")
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_invisible_text_is_blank_despite_fonts(verdict):
+    # OCR layers without their scan: the text heuristic sees text and a
+    # font, tier 1 sees that nothing is painted
+    data = _page_pdf(b"BT 3 Tr /F1 12 Tf 36 100 Td (hidden) Tj ET", _FONT)
+    assert not text_heuristic_blank(PdfReader(io.BytesIO(data)).pages[0])
+    assert verdict(data).blank
+    assert verdict(data).tier == TIER_OPERATORS
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_unused_font_resource_is_blank(verdict):
+    data = _page_pdf(b"", _FONT)
+    assert verdict(data) == BlankVerdict(True, TIER_OPERATORS, "nothing drawn")
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_inline_image_is_not_blank(verdict):
+    data = _page_pdf(b"q 10 0 0 10 36 36 cm BI /W 1 /H 1 /BPC 8 /CS /G ID \x00 EI Q")
+    assert verdict(data) == BlankVerdict(False, TIER_OPERATORS, REASON_INLINE_IMAGE)
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_drawn_xobject_is_not_blank(verdict):
+    form = b"<< /Fm1 << /Type /XObject /Subtype /Form /BBox [0 0 10 10] /Length 0 >> >>"
+    data = _page_pdf(b"/Fm1 Do", b"/XObject " + form)
+    assert verdict(data) == BlankVerdict(False, TIER_OPERATORS, REASON_IMAGE)
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_unknown_colour_space_falls_back_to_text_heuristic(verdict):
+    data = _page_pdf(b"/CS0 cs 0.2 sc " + _SQUARE + b"f")
+    result = verdict(data)
+    assert result.tier == TIER_TEXT
+    assert result.blank  # no text, fonts or XObjects
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_annotation_is_not_blank(verdict):
+    annot = b"<< /Type /Annot /Subtype /Text /Rect [36 36 56 56] /Contents (note) >>"
+    data = _page_pdf(b"", page_extra=b" /Annots [5 0 R]", extra_objects=[annot])
+    assert verdict(data) == BlankVerdict(False, TIER_OPERATORS, "annotation")
+
+
+@pytest.mark.parametrize("verdict", ENGINES)
+def test_hidden_annotation_and_popup_are_blank(verdict):
+    hidden = b"<< /Type /Annot /Subtype /Text /Rect [36 36 56 56] /F 2 >>"
+    popup = b"<< /Type /Annot /Subtype /Popup /Rect [36 36 156 156] >>"
+    data = _page_pdf(b"", page_extra=b" /Annots [5 0 R 6 0 R]", extra_objects=[hidden, popup])
+    assert verdict(data).blank
@@ -0,0 +1,132 @@
+"""
+The headless CLI (python -m core): one exit status per outcome, 0 merged,
+1 a merge failed, 2 usage error or unreadable spec, 3 a job failed
+validation, 130 interrupted, and nothing written unless the merge ran.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import fitz
+import pytest
+
+import core.jobs
+from core import cli
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def spec(make_pdf, tmp_path):
+    """``spec(name, files, **job)`` writes a JSON job spec; returns its path."""
+    a = make_pdf("a.pdf", [(612, 792)] * 2)
+    b = make_pdf("b.pdf", [(595, 842)] * 3)
+
+    def write(name="job.json", files=(a, b), **job):
+        path = tmp_path / name
+        path.write_text(json.dumps({"files": list(files), **job}))
+        return str(path)
+    return write
+
+
+def _page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def test_merged_job_exits_0(spec, tmp_path, capsys):
+    assert cli.main([spec(output="out.pdf")]) == cli.EXIT_OK
+    assert _page_count(tmp_path / "out.pdf") == 5
+    assert capsys.readouterr().out.startswith("ok ")
+
+
+def test_output_option_and_json_summary(spec, tmp_path, capsys):
+    output = tmp_path / "elsewhere.pdf"
+    assert cli.main([spec(), "-o", str(output), "--json"]) == cli.EXIT_OK
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["ok"] and summary["exit_code"] == 0
+    assert summary["jobs"][0]["pages"] == 5
+    assert _page_count(output) == 5
+
+
+def test_failed_merge_exits_1(spec, tmp_path):
+    # Valid job, but the output path is a directory
+    (tmp_path / "out.pdf").mkdir()
+    assert cli.main([spec(output="out.pdf")]) == cli.EXIT_FAILED
+
+
+@pytest.mark.parametrize("argv", [
+    ["missing.json"],
+    ["broken.json"],
+    ["job.json", "--options", "missing-options.json"],
+])
+def test_unreadable_spec_exits_2(spec, tmp_path, monkeypatch, argv):
+    spec()
+    (tmp_path / "broken.json").write_text("{ not json")
+    monkeypatch.chdir(tmp_path)
+    assert cli.main(argv) == cli.EXIT_USAGE
+
+
+def test_usage_error_exits_2(spec):
+    with pytest.raises(SystemExit) as raised:
+        cli.main([spec(), "--jobs", "0"])
+    assert raised.value.code == cli.EXIT_USAGE
+
+
+def test_invalid_job_exits_3_without_writing(spec, tmp_path, capsys):
+    job = spec(output="out.pdf", files=[str(tmp_path / "a.pdf"), str(tmp_path / "gone.pdf")],
+               options={"scaling_mode": "Sideways", "scaling_enabled": True})
+    assert cli.main([job]) == cli.EXIT_INVALID
+    out = capsys.readouterr().out
+    assert "gone.pdf: file not found" in out
+    assert "Unknown scaling mode 'Sideways'" in out
+    assert not (tmp_path / "out.pdf").exists()
+
+
+def test_dry_run_writes_nothing(spec, tmp_path):
+    assert cli.main([spec(output="out.pdf"), "--dry-run"]) == cli.EXIT_OK
+    assert not (tmp_path / "out.pdf").exists()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGINT"), reason="needs SIGINT")
+def test_interrupted_batch_exits_130(spec, tmp_path, monkeypatch):
+    # Ctrl+C arrives while the first job runs: it is cancelled cleanly
+    # and the second one never starts
+    run_job = core.jobs.run_job
+
+    def interrupted(*args, **kwargs):
+        os.kill(os.getpid(), signal.SIGINT)
+        return run_job(*args, **kwargs)
+    monkeypatch.setattr(core.jobs, "run_job", interrupted)
+
+    first = spec("first.json", output="first.pdf")
+    second = spec("second.json", output="second.pdf")
+    assert cli.main([first, second, "--no-shared-cache"]) == cli.EXIT_INTERRUPTED
+    assert not (tmp_path / "first.pdf").exists()
+    assert not (tmp_path / "second.pdf").exists()
+    # The merge's signal handlers are gone again
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+
+
+@pytest.mark.parametrize("job, status", [
+    ({"output": "out.pdf"}, cli.EXIT_OK),
+    ({"output": "out.pdf", "options": {"merge_engine": "nope"}}, cli.EXIT_INVALID),
+])
+def test_process_exit_status(spec, tmp_path, job, status):
+    result = subprocess.run(
+        [sys.executable, "-m", "core", spec(**job)],
+        cwd=REPO, capture_output=True, text=True, timeout=120,
+        env={**os.environ, "XDG_CACHE_HOME": str(tmp_path / "user-cache")},
+    )
+    assert result.returncode == status, result.stderr
@@ -0,0 +1,131 @@
+"""
+The merge daemon's socket: only its own user may talk to it. The client
+refuses a socket that belongs to someone else before connecting, the
+daemon binds its socket 0o600 in a private directory, and a job submitted
+over the socket is merged by a warm worker.
+"""
+
+import os
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+
+import fitz
+import pytest
+
+from core.daemon import MergeDaemon
+from core.daemon_client import DaemonClient, DaemonError, DaemonUnavailable
+from core.jobs import STATUS_OK, JobSpec
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix sockets")
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def socket_dir():
+    # Socket paths are limited to about 100 bytes; pytest's tmp_path can
+    # be longer
+    path = tempfile.mkdtemp(prefix="cpd-")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+def listener(socket_dir):
+    """A bare listening socket standing in for a daemon."""
+    path = os.path.join(socket_dir, "daemon.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(1)
+    sock.settimeout(0.2)
+    yield path, sock
+    sock.close()
+
+
+# ----------------------------------------------------------------------
+# Socket ownership
+# ----------------------------------------------------------------------
+
+def test_client_refuses_a_socket_owned_by_another_user(listener, monkeypatch):
+    path, sock = listener
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(path).st_uid + 1)
+    with pytest.raises(DaemonError, match="belongs to another user"):
+        DaemonClient(path).ping()
+    # Refused before connecting: the listener never saw the client
+    with pytest.raises(socket.timeout):
+        sock.accept()
+
+
+def test_client_connects_to_its_own_users_socket(listener):
+    path, sock = listener
+
+    def serve():
+        conn, _ = sock.accept()
+        with conn:
+            conn.recv(1024)
+            conn.sendall(b'{"ok": true, "pid": 1}\n')
+    thread = threading.Thread(target=serve)
+    thread.start()
+    assert DaemonClient(path).ping() == {"ok": True, "pid": 1}
+    thread.join()
+
+
+def test_client_reports_a_missing_daemon(socket_dir):
+    with pytest.raises(DaemonUnavailable):
+        DaemonClient(os.path.join(socket_dir, "none.sock")).ping()
+
+
+def test_daemon_socket_is_private(socket_dir):
+    path = os.path.join(socket_dir, "private", "daemon.sock")
+    daemon = MergeDaemon(path, shared_caches=False)
+    sock = daemon._bind()
+    try:
+        assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    finally:
+        sock.close()
+
+
+def test_daemon_replaces_a_stale_socket_but_not_a_live_one(listener):
+    path, sock = listener
+    with pytest.raises(RuntimeError, match="already listening"):
+        MergeDaemon(path, shared_caches=False)._bind()
+
+    sock.close()  # the socket file stays behind, as after a crash
+    assert os.path.exists(path)
+    MergeDaemon(path, shared_caches=False)._bind().close()
+
+
+# ----------------------------------------------------------------------
+# Round trip
+# ----------------------------------------------------------------------
+
+def test_submitted_job_is_merged(socket_dir, make_pdf, tmp_path):
+    path = os.path.join(socket_dir, "daemon.sock")
+    daemon = MergeDaemon(path, workers=1, shared_caches=False)
+    daemon.start()
+    server = threading.Thread(target=daemon.serve_forever)
+    server.start()
+    try:
+        client = DaemonClient(path)
+        assert client.ping()["workers"] == 1
+
+        source = make_pdf("in.pdf", [(612, 792)] * 3)
+        output = str(tmp_path / "out.pdf")
+        messages = list(client.run(JobSpec("job.json", output, [{"path": source}], {})))
+        assert "id" in messages[0]
+        result = messages[-1]["result"]
+        assert result["status"] == STATUS_OK
+        assert result["pages"] == 3
+        with fitz.open(output) as doc:
+            assert doc.page_count == 3
+    finally:
+        DaemonClient(path).shutdown()
+        server.join(timeout=30)
+    assert not server.is_alive()
+    assert not os.path.exists(path)
@@ -0,0 +1,85 @@
+"""
+Both merge engines must produce the same page geometry for the same job:
+engine_compare runs the job through each one and reports any difference.
+Inputs are built with PyMuPDF in a temporary directory: portrait and
+landscape pages, a rotated page and a page with a CropBox.
+"""
+
+import json
+
+import fitz
+import pytest
+
+from core import engine_compare
+from core.engine_compare import compare_engines
+from core.geometry import scan_pdf
+from core.pdf_merger import FileEntry, MergeOptions, merge_files
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def inputs(tmp_path):
+    mixed = fitz.open()
+    for width, height in ((595, 842), (842, 595), (1191, 842)):
+        page = mixed.new_page(width=width, height=height)
+        page.insert_text((36, 100), f"{width}x{height}", fontsize=24)
+    mixed[1].set_rotation(90)
+    mixed.save(tmp_path / "mixed.pdf")
+
+    cropped = fitz.open()
+    page = cropped.new_page(width=612, height=792)
+    page.insert_text((100, 200), "cropped", fontsize=24)
+    page.set_cropbox(fitz.Rect(50, 100, 450, 400))
+    cropped.save(tmp_path / "cropped.pdf")
+    return [FileEntry(str(tmp_path / "mixed.pdf")), FileEntry(str(tmp_path / "cropped.pdf"))]
+
+
+def _sizes(path):
+    """Visible (CropBox) size and rotation of each page."""
+    return [(round(p.crop_width), round(p.crop_height), p.rotation) for p in scan_pdf(path).pages]
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+@pytest.mark.parametrize("options", [
+    MergeOptions(),
+    MergeOptions(scaling_enabled=True, scaling_mode="Fit"),
+    MergeOptions(scaling_enabled=True, scaling_mode="Fit", scaling_form_xobject=True),
+    MergeOptions(scaling_enabled=True, scaling_mode="Percent", scaling_percent=50),
+], ids=["plain", "fit", "fit-form", "percent"])
+def test_engines_are_equivalent(inputs, options):
+    report = compare_engines(inputs, options)
+    assert all(not r["error"] for r in report["engines"])
+    assert report["mismatches"] == {}
+    assert report["equivalent"]
+
+
+@pytest.mark.parametrize("engine", ["pypdf2", "pymupdf"])
+def test_fit_scales_each_page_with_its_own_aspect_ratio(inputs, tmp_path, engine):
+    # Every page is scaled by its own factor to fit the largest page
+    # (1191x842, compared unrotated) and is not padded out to that size
+    output = tmp_path / f"{engine}.pdf"
+    merge_files(inputs, str(output), MergeOptions(
+        scaling_enabled=True, scaling_mode="Fit", merge_engine=engine,
+    ))
+    assert _sizes(output) == [
+        (595, 842, 0),
+        (1191, 842, 90),
+        (1191, 842, 0),
+        # 612x792 MediaBox fits 1191x842 at 842/792; the 400x300 CropBox
+        # shrinks with it
+        (425, 319, 0),
+    ]
+
+
+def test_main_exits_zero_when_equivalent(inputs, tmp_path, capsys):
+    options = tmp_path / "options.json"
+    options.write_text(json.dumps({"scaling_enabled": True, "scaling_mode": "Fit"}))
+    status = engine_compare.main([e.path for e in inputs] + ["--options", str(options)])
+    assert status == 0
+    assert capsys.readouterr().out.rstrip().endswith("\nequivalent")
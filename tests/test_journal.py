@@ -0,0 +1,148 @@
+"""
+Resumable merges: a job cancelled part-way leaves its finished inputs in
+the journal, the next run of the same job copies them instead of
+reprocessing, and the output matches an uninterrupted merge.
+"""
+
+import os
+import stat
+
+import fitz
+import pytest
+
+from core.journal import MergeJournal, job_key
+from core.pdf_merger import FileEntry, MergeOptions, merge_files
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def files(make_pdf):
+    return [
+        FileEntry(make_pdf("a.pdf", [(612, 792)] * 2)),
+        FileEntry(make_pdf("b.pdf", [(842, 595)] * 3)),
+        FileEntry(make_pdf("c.pdf", [(595, 842)] * 4)),
+    ]
+
+
+def _options(tmp_path, **kwargs):
+    return MergeOptions(journal_dir=str(tmp_path / "journal"), **kwargs)
+
+
+def _cancel_at_input(index):
+    """Callbacks that cancel the merge when copying reaches input ``index``."""
+    state = {"cancel": False}
+
+    def progress(i, total, label):
+        # The prepass reports "Preparing: <name>" for every input first
+        if i == index and not label.startswith("Preparing"):
+            state["cancel"] = True
+    return progress, lambda: state["cancel"]
+
+
+def _pages(path):
+    with fitz.open(path) as doc:
+        return [(round(p.rect.width), round(p.rect.height), p.get_text().strip()) for p in doc]
+
+
+def _job_dirs(tmp_path):
+    root = tmp_path / "journal"
+    return sorted(p for p in root.iterdir() if p.is_dir()) if root.exists() else []
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def test_cancelled_merge_resumes_from_finished_inputs(files, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    options = _options(tmp_path, scaling_enabled=True)
+    progress, cancelled = _cancel_at_input(2)
+    with pytest.raises(RuntimeError, match="cancelled"):
+        merge_files(files, output, options, progress, cancelled)
+    assert not os.path.exists(output)
+
+    [job] = _job_dirs(tmp_path)
+    names = sorted(os.listdir(job))
+    assert names == ["journal.json", "segment-00000.pdf", "segment-00001.pdf"]
+
+    report = merge_files(files, output, options)
+    assert report.resumed_segments == 2
+    assert report.pages == 9
+    assert _job_dirs(tmp_path) == []  # removed once the output is written
+
+    reference = str(tmp_path / "reference.pdf")
+    merge_files(files, reference, MergeOptions(scaling_enabled=True))
+    assert _pages(output) == _pages(reference)
+
+
+def test_cancel_inside_an_input_leaves_no_partial_segment(files, tmp_path):
+    output = str(tmp_path / "out.pdf")
+    with open(output, "wb") as f:
+        f.write(b"previous output")
+    # Checked before each page too: stop after c.pdf's first page
+    state = {"copying_c": False, "checks": 0}
+
+    def progress(i, total, label):
+        state["copying_c"] = i == 2 and not label.startswith("Preparing")
+
+    def cancelled():
+        if state["copying_c"]:
+            state["checks"] += 1
+        return state["checks"] > 1
+    with pytest.raises(RuntimeError, match="cancelled"):
+        merge_files(files, output, _options(tmp_path), progress, cancelled)
+    assert state["checks"] == 2  # stopped inside c.pdf, not before it
+
+    # An existing output is untouched by a cancelled merge
+    with open(output, "rb") as f:
+        assert f.read() == b"previous output"
+    [job] = _job_dirs(tmp_path)
+    assert sorted(os.listdir(job)) == ["journal.json", "segment-00000.pdf", "segment-00001.pdf"]
+
+    report = merge_files(files, output, _options(tmp_path))
+    assert report.pages == 9
+    assert report.resumed_segments == 2
+
+
+def test_changed_input_starts_a_new_job(files, tmp_path, make_pdf):
+    options = _options(tmp_path)
+    progress, cancelled = _cancel_at_input(2)
+    with pytest.raises(RuntimeError):
+        merge_files(files, str(tmp_path / "out.pdf"), options, progress, cancelled)
+    key = job_key(files, options)
+
+    make_pdf("a.pdf", [(612, 792)] * 5)
+    assert job_key(files, options) != key
+    report = merge_files(files, str(tmp_path / "out.pdf"), options)
+    assert report.resumed_segments == 0
+    assert report.pages == 12
+
+
+def test_output_only_options_still_resume(files, tmp_path):
+    options = _options(tmp_path)
+    progress, cancelled = _cancel_at_input(1)
+    with pytest.raises(RuntimeError):
+        merge_files(files, str(tmp_path / "out.pdf"), options, progress, cancelled)
+
+    report = merge_files(files, str(tmp_path / "out.pdf"), _options(
+        tmp_path, metadata_enabled=True, pdf_title="Binder", add_filename_bookmarks=True,
+    ))
+    assert report.resumed_segments == 1
+
+
+def test_journal_directories_are_private(files, tmp_path):
+    journal = MergeJournal(str(tmp_path / "journal"), files, MergeOptions())
+    for path in (tmp_path / "journal", journal.directory):
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX ownership")
+def test_journal_refuses_a_directory_owned_by_another_user(files, tmp_path, monkeypatch):
+    root = tmp_path / "journal"
+    root.mkdir()
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(root).st_uid + 1)
+    with pytest.raises(PermissionError, match="another user"):
+        MergeJournal(str(root), files, MergeOptions())
@@ -0,0 +1,146 @@
+"""
+The transformed-page cache: entries are evicted least recently used first
+once the directory passes its size limit, merges with an expensive page
+transform reuse cached pages, and the cache, image cache and hash index
+directories are private to their user.
+"""
+
+import os
+import stat
+
+import fitz
+import pytest
+from PIL import Image
+
+from core.file_hash import HashIndex
+from core.image_cache import image_pdf
+from core.page_cache import PageCache, get_page_cache, page_transform_hash
+from core.pdf_merger import FileEntry, MergeOptions, merge_files
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+def _entry(cache, name):
+    return cache.page_key(f"{name}:transform", 0)
+
+
+def _put_at(cache, key, size, mtime):
+    """Store ``size`` bytes under ``key``, last used at ``mtime``."""
+    path = cache.put(key, b"x" * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def _sizes(path):
+    with fitz.open(path) as doc:
+        return [(round(p.rect.width), round(p.rect.height)) for p in doc]
+
+
+# ----------------------------------------------------------------------
+# LRU eviction
+# ----------------------------------------------------------------------
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path / "pages"), max_bytes=1000)
+    keys = [_entry(cache, name) for name in "abcd"]
+    for age, key in enumerate(keys[:3]):
+        _put_at(cache, key, 300, 1_000_000 + age)  # a oldest, c newest
+
+    assert cache.get(keys[0]) is not None  # a is now the most recent
+    cache.put(keys[3], b"x" * 300)  # 1200 bytes: trimmed to 90% of 1000
+
+    # Only b, now the least recently used, had to go
+    present = [cache.get(key) is not None for key in keys]
+    assert present == [True, False, True, True]
+
+
+def test_entries_within_the_limit_are_kept(tmp_path):
+    cache = PageCache(str(tmp_path / "pages"), max_bytes=1000)
+    keys = [_entry(cache, name) for name in "abc"]
+    for key in keys:
+        cache.put(key, b"x" * 300)
+    assert all(cache.get(key) == b"x" * 300 for key in keys)
+    assert (cache.hits, cache.misses) == (3, 0)
+
+
+def test_oversized_entry_does_not_stay(tmp_path):
+    cache = PageCache(str(tmp_path / "pages"), max_bytes=100)
+    key = _entry(cache, "big")
+    cache.put(key, b"x" * 500)
+    assert cache.get(key) is None
+
+
+# ----------------------------------------------------------------------
+# Merges
+# ----------------------------------------------------------------------
+
+def test_transformed_pages_are_reused(make_pdf, tmp_path):
+    files = [FileEntry(make_pdf("a.pdf", [(612, 792)] * 3)),
+             FileEntry(make_pdf("b.pdf", [(842, 1191)] * 2))]
+    options = MergeOptions(scaling_enabled=True, page_cache_dir=str(tmp_path / "pages"))
+    cache = get_page_cache(options.page_cache_dir)
+
+    merge_files(files, str(tmp_path / "first.pdf"), options)
+    assert (cache.hits, cache.misses) == (0, 5)
+    merge_files(files, str(tmp_path / "second.pdf"), options)
+    assert (cache.hits, cache.misses) == (5, 5)
+    assert _sizes(tmp_path / "second.pdf") == _sizes(tmp_path / "first.pdf")
+
+
+def test_transform_hash_tracks_page_settings():
+    scaled = MergeOptions(scaling_enabled=True)
+    assert page_transform_hash(MergeOptions(), 0, None, "pypdf2") is None
+    base = page_transform_hash(scaled, 0, (612.0, 792.0), "pypdf2")
+    assert base == page_transform_hash(scaled, 0, (612.0, 792.0), "pypdf2")
+    assert base != page_transform_hash(scaled, 90, (612.0, 792.0), "pypdf2")
+    assert base != page_transform_hash(scaled, 0, (842.0, 1191.0), "pypdf2")
+    assert base != page_transform_hash(scaled, 0, (612.0, 792.0), "pymupdf")
+
+
+def test_image_conversions_are_cached(tmp_path):
+    image = tmp_path / "scan.png"
+    Image.new("RGB", (192, 96), "white").save(image)
+    root = str(tmp_path / "images")
+
+    path, temporary = image_pdf(str(image), root)
+    assert not temporary
+    assert path.startswith(root)
+    assert image_pdf(str(image), root) == (path, False)
+    assert _sizes(path) == [(144, 72)]
+
+
+# ----------------------------------------------------------------------
+# Private directories
+# ----------------------------------------------------------------------
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_cache_directories_are_private(tmp_path):
+    cache = PageCache(str(tmp_path / "pages"))
+    path = cache.put(_entry(cache, "a"), b"data")
+    assert _mode(cache.root) == _mode(os.path.dirname(path)) == 0o700
+
+    image = tmp_path / "scan.png"
+    Image.new("RGB", (10, 10), "white").save(image)
+    image_pdf(str(image), str(tmp_path / "images"))
+    assert _mode(tmp_path / "images") == 0o700
+
+    index = HashIndex(str(tmp_path / "hashes" / "hashes.json"))
+    index.content_hash(str(image))
+    assert _mode(tmp_path / "hashes") == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX ownership")
+def test_caches_refuse_directories_owned_by_another_user(tmp_path, monkeypatch):
+    for name in ("pages", "hashes"):
+        (tmp_path / name).mkdir()
+    (tmp_path / "file").write_bytes(b"data")
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(PermissionError, match="another user"):
+        PageCache(str(tmp_path / "pages"))
+    with pytest.raises(PermissionError, match="another user"):
+        HashIndex(str(tmp_path / "hashes" / "hashes.json")).content_hash(str(tmp_path / "file"))
@@ -0,0 +1,133 @@
+"""
+Merge plans: compile_plan validates a whole job up front and describes the
+output page by page; executing the plan writes exactly that output and
+refuses to run once an input has changed on disk.
+"""
+
+import os
+
+import fitz
+import pytest
+
+from core.pdf_merger import FileEntry, MergeOptions
+from core.plan import PAGE_BREAKER, PAGE_SOURCE, PAGE_TOC, PlanError, compile_plan, dry_run
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def files(make_pdf):
+    return [
+        FileEntry(make_pdf("a.pdf", [(612, 792)] * 3)),
+        FileEntry(make_pdf("b.pdf", [(842, 595)] * 2), rotation=90),
+    ]
+
+
+def _sizes(path):
+    with fitz.open(path) as doc:
+        return [(round(p.rect.width), round(p.rect.height)) for p in doc]
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def test_plan_describes_every_output_page(files):
+    plan = compile_plan(files, MergeOptions(add_breaker_pages=True, insert_toc=True))
+    kinds = [p.kind for p in plan.pages]
+    assert kinds == (
+        [PAGE_TOC] + [PAGE_BREAKER] + [PAGE_SOURCE] * 3 + [PAGE_BREAKER] + [PAGE_SOURCE] * 2
+    )
+    b_pages = [p for p in plan.pages if p.file_index == 1 and p.kind == PAGE_SOURCE]
+    assert [p.source_page for p in b_pages] == [0, 1]
+    assert all(p.transforms == ("rotate:90",) for p in b_pages)
+    assert (b_pages[0].width, b_pages[0].height) == (595, 842)  # placed, rotated
+    assert [name for name, _ in plan.toc_entries] == ["a.pdf", "b.pdf"]
+
+
+def test_plan_applies_ranges_and_reverse(files):
+    files[0] = FileEntry(files[0].path, page_range="2-3", reverse=True)
+    plan = compile_plan(files, MergeOptions())
+    assert [p.source_page for p in plan.pages if p.file_index == 0] == [2, 1]
+    assert plan.page_count == 4
+
+
+def test_plan_fingerprint_is_stable_and_tracks_options(files):
+    options = MergeOptions(scaling_enabled=True)
+    assert compile_plan(files, options).fingerprint == compile_plan(files, options).fingerprint
+    assert compile_plan(files, options).fingerprint != compile_plan(files, MergeOptions()).fingerprint
+
+
+def test_plan_hides_passwords(files):
+    plan = compile_plan(files, MergeOptions(encrypt_enabled=True, encrypt_user_pw="hunter2"))
+    assert "hunter2" not in repr(plan)
+    assert "hunter2" not in str(plan.settings)
+
+
+def test_compile_reports_every_problem_at_once(files, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    bad = [
+        FileEntry(files[0].path, page_range="5-9"),
+        FileEntry(files[1].path, rotation=45),
+        FileEntry(str(tmp_path / "missing.pdf")),
+        FileEntry(str(broken)),
+    ]
+    options = MergeOptions(
+        merge_engine="nope", scaling_enabled=True, scaling_mode="Percent", scaling_percent=0,
+        watermark_enabled=True, watermark_text="DRAFT", watermark_opacity=2.0,
+    )
+    with pytest.raises(PlanError) as raised:
+        compile_plan(bad, options)
+    problems = raised.value.problems
+    assert len(problems) == 7
+    text = "\n".join(problems)
+    for expected in (
+        "Unknown merge engine 'nope'",
+        "Scaling percent must be between 1 and 100",
+        "Watermark opacity must be between 0 and 1",
+        "a.pdf (Total pages: 3)",
+        "b.pdf: rotation must be one of 0, 90, 180, 270",
+        "missing.pdf: file not found",
+        "broken.pdf: cannot be read",
+    ):
+        assert expected in text
+
+
+def test_compile_rejects_empty_jobs():
+    with pytest.raises(PlanError, match="No input files"):
+        compile_plan([], MergeOptions())
+
+
+def test_execute_writes_the_planned_pages(files, tmp_path):
+    plan = compile_plan(files, MergeOptions())
+    output = str(tmp_path / "out.pdf")
+    report = plan.execute(output)
+    assert report.pages == plan.page_count
+    assert _sizes(output) == [(612, 792)] * 3 + [(595, 842)] * 2
+    assert _sizes(output) == [(round(p.width), round(p.height)) for p in plan.pages]
+
+
+def test_execute_refuses_changed_inputs(files, tmp_path, make_pdf):
+    plan = compile_plan(files, MergeOptions())
+    make_pdf("a.pdf", [(612, 792)] * 4)
+    os.remove(files[1].path)
+    assert sorted(plan.stale_files()) == sorted(os.path.abspath(f.path) for f in files)
+
+    output = tmp_path / "out.pdf"
+    with pytest.raises(PlanError) as raised:
+        plan.execute(str(output))
+    assert raised.value.problems == [
+        "a.pdf: changed on disk since the merge was planned",
+        "b.pdf: changed on disk since the merge was planned",
+    ]
+    assert not output.exists()
+
+
+def test_dry_run_estimates_without_writing(files, tmp_path):
+    plan, estimate = dry_run(files, MergeOptions())
+    assert estimate.pages == plan.page_count == 5
+    assert estimate.output_bytes > 0
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf", "b.pdf"]
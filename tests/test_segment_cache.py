@@ -0,0 +1,131 @@
+"""
+The content-addressed segment cache: re-merging a job reprocesses only the
+inputs whose content or page-shaping settings changed, an unchanged job is
+not written again, and the cache directory is private to its user.
+"""
+
+import os
+import stat
+
+import fitz
+import pytest
+
+from core.pdf_merger import FileEntry, MergeOptions, merge_files
+from core.segment_cache import SegmentCache
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def files(make_pdf):
+    return [
+        FileEntry(make_pdf("a.pdf", [(612, 792)] * 2)),
+        FileEntry(make_pdf("b.pdf", [(595, 842)] * 3)),
+        FileEntry(make_pdf("c.pdf", [(420, 595)] * 1)),
+    ]
+
+
+@pytest.fixture
+def merge(tmp_path):
+    """Merge to tmp_path/out.pdf through the test's segment cache."""
+    output = str(tmp_path / "out.pdf")
+
+    def run(files, **kwargs):
+        options = MergeOptions(segment_cache_dir=str(tmp_path / "segments"), **kwargs)
+        return merge_files(files, output, options)
+    run.output = output
+    return run
+
+
+def _pages(path):
+    with fitz.open(path) as doc:
+        return [(round(p.rect.width), round(p.rect.height), p.get_text().strip()) for p in doc]
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def test_unchanged_job_is_not_written_again(files, merge):
+    first = merge(files)
+    assert not first.unchanged
+    stamp = os.stat(merge.output).st_mtime_ns
+
+    second = merge(files)
+    assert second.unchanged
+    assert second.pages == first.pages == 6
+    assert os.stat(merge.output).st_mtime_ns == stamp
+
+
+def test_changed_input_reuses_the_other_segments(files, merge, make_pdf, tmp_path):
+    merge(files)
+    make_pdf("b.pdf", [(595, 842)] * 5)
+    report = merge(files)
+    assert not report.unchanged
+    assert report.resumed_segments == 2
+    assert report.pages == 8
+
+    reference = str(tmp_path / "reference.pdf")
+    merge_files(files, reference, MergeOptions())
+    assert _pages(merge.output) == _pages(reference)
+
+
+def test_replaced_output_is_rebuilt_from_segments(files, merge):
+    merge(files)
+    with open(merge.output, "wb") as f:
+        f.write(b"edited by hand")
+    report = merge(files)
+    assert not report.unchanged
+    assert report.resumed_segments == 3
+    assert len(_pages(merge.output)) == 6
+
+
+def test_page_shaping_options_invalidate_segments(files, merge):
+    merge(files)
+    assert merge(files, add_breaker_pages=True).resumed_segments == 0
+    assert merge(files, watermark_enabled=True, watermark_text="DRAFT").resumed_segments == 0
+
+
+def test_entry_settings_invalidate_only_that_input(files, merge):
+    merge(files)
+    files[1] = FileEntry(files[1].path, rotation=90)
+    report = merge(files)
+    assert report.resumed_segments == 2
+    assert _pages(merge.output)[2][:2] == (842, 595)
+
+
+def test_output_only_options_reuse_every_segment(files, merge):
+    merge(files)
+    report = merge(files, metadata_enabled=True, pdf_title="Binder", insert_toc=True)
+    assert not report.unchanged  # the output itself differs
+    assert report.resumed_segments == 3
+
+
+def test_new_scaling_target_invalidates_scaled_segments(files, merge, make_pdf):
+    merge(files, scaling_enabled=True)
+    # A larger page raises the scaling target every other page is fitted to
+    files.append(FileEntry(make_pdf("d.pdf", [(1191, 842)])))
+    report = merge(files, scaling_enabled=True)
+    assert report.resumed_segments == 0
+
+    files.pop()
+    assert merge(files, scaling_enabled=True).resumed_segments == 3
+
+
+def test_cache_directory_is_private(tmp_path):
+    cache = SegmentCache(str(tmp_path / "segments"))
+    assert stat.S_IMODE(os.stat(cache.root).st_mode) == 0o700
+    os.chmod(cache.root, 0o755)
+    SegmentCache(cache.root)
+    assert stat.S_IMODE(os.stat(cache.root).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX ownership")
+def test_cache_refuses_a_directory_owned_by_another_user(tmp_path, monkeypatch):
+    root = tmp_path / "segments"
+    root.mkdir()
+    monkeypatch.setattr(os, "getuid", lambda: os.stat(root).st_uid + 1)
+    with pytest.raises(PermissionError, match="another user"):
+        SegmentCache(str(root))
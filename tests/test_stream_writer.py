@@ -0,0 +1,204 @@
+"""
+Round trips through StreamingPdfWriter: source PDFs are written by hand so
+the object layout (indirect /Length, inherited page attributes, incremental
+updates, shared resources) is exactly the one under test, copied with
+add_raw_page and read back with PyPDF2 and PyMuPDF.
+"""
+
+import io
+
+import fitz
+import pytest
+from PyPDF2 import PdfReader
+
+from core import stream_writer
+from core.geometry import scan_reader
+from core.stream_writer import StreamingPdfWriter
+
+
+# ----------------------------------------------------------------------
+# Fixtures
+# ----------------------------------------------------------------------
+
+def _text_stream(text: str) -> bytes:
+    return f"BT /F1 24 Tf 36 100 Td ({text}) Tj ET".encode("latin-1")
+
+
+def _write_revision(out: bytearray, objects: dict, root: int, size: int,
+                    prev=None) -> None:
+    """Append objects, an xref section and a trailer (an update if ``prev``)."""
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b"%d 0 obj\n" % num + objects[num] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n"
+    if prev is None:
+        out += b"0 %d\n0000000000 65535 f \n" % size
+        for num in range(1, size):
+            out += b"%010d 00000 n \n" % offsets[num]
+    else:
+        for num in sorted(objects):
+            out += b"%d 1\n%010d 00000 n \n" % (num, offsets[num])
+    out += b"trailer\n<< /Size %d /Root %d 0 R" % (size, root)
+    if prev is not None:
+        out += b" /Prev %d" % prev
+    out += b" >>\nstartxref\n%d\n%%%%EOF\n" % xref
+    return xref
+
+
+def _stream(content: bytes, extra: bytes = b"") -> bytes:
+    return b"<< /Length %d%s >>\nstream\n" % (len(content), extra) + content + b"\nendstream"
+
+
+def _simple_pdf(text: str) -> bytes:
+    """One page whose content stream has a direct /Length."""
+    out = bytearray(b"%PDF-1.4\n")
+    _write_revision(out, {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        3: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+           b" /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        4: _stream(_text_stream(text)),
+        5: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }, root=1, size=6)
+    return bytes(out)
+
+
+def _read(data: bytes):
+    reader = PdfReader(io.BytesIO(data))
+    return reader, scan_reader(reader)
+
+
+def _copy(*sources: bytes, dedupe: bool = False, rotate: int = 0):
+    """Copy every page of ``sources`` raw; (output bytes, writer)."""
+    out = io.BytesIO()
+    writer = StreamingPdfWriter(out, dedupe=dedupe)
+    for data in sources:
+        reader, geometry = _read(data)
+        for ref, box in zip(geometry.refs, geometry.pages):
+            writer.add_raw_page(reader, ref, rotate, box)
+        writer.end_segment()
+    writer.finish()
+    return out.getvalue(), writer
+
+
+def _texts(data: bytes):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [page.get_text().strip() for page in doc]
+
+
+# ----------------------------------------------------------------------
+# Tests
+# ----------------------------------------------------------------------
+
+def test_round_trip_keeps_text_and_size():
+    data, writer = _copy(_simple_pdf("first"), _simple_pdf("second"))
+    assert writer.page_count == 2
+    assert _texts(data) == ["first", "second"]
+    reader = PdfReader(io.BytesIO(data))
+    assert [float(v) for v in reader.pages[0].mediabox] == [0, 0, 612, 792]
+
+
+@pytest.mark.parametrize("chunk", [16, 64, 4096])
+def test_indirect_length(monkeypatch, chunk):
+    # /Length is an object of its own, stored after the stream that uses it
+    content = _text_stream("indirect length")
+    out = bytearray(b"%PDF-1.4\n")
+    _write_revision(out, {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        3: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+           b" /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        4: b"<< /Length 6 0 R >>\nstream\n" + content + b"\nendstream",
+        5: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        6: b"%d" % len(content),
+    }, root=1, size=7)
+    # Small read chunks put the dictionary's end and the stream keyword in
+    # different reads
+    monkeypatch.setattr(stream_writer, "_RAW_CHUNK", chunk)
+    data, _ = _copy(bytes(out))
+    assert _texts(data) == ["indirect length"]
+
+
+def test_inherited_attributes():
+    # MediaBox, Resources and Rotate come from the page tree, not the page
+    out = bytearray(b"%PDF-1.4\n")
+    _write_revision(out, {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [6 0 R] /Count 1 /MediaBox [0 0 300 400]"
+           b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        6: b"<< /Type /Pages /Parent 2 0 R /Kids [3 0 R] /Count 1 /Rotate 90 >>",
+        3: b"<< /Type /Page /Parent 6 0 R /Contents 4 0 R >>",
+        4: _stream(_text_stream("inherited")),
+        5: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }, root=1, size=7)
+    data, _ = _copy(bytes(out))
+    page = PdfReader(io.BytesIO(data)).pages[0]
+    assert [float(v) for v in page.mediabox] == [0, 0, 300, 400]
+    assert page.get("/Rotate") == 90
+    assert "/F1" in page["/Resources"]["/Font"]
+    assert _texts(data) == ["inherited"]
+
+
+def test_inherited_rotation_is_added_to():
+    out = bytearray(b"%PDF-1.4\n")
+    _write_revision(out, {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 /Rotate 90"
+           b" /MediaBox [0 0 612 792] >>",
+        3: b"<< /Type /Page /Parent 2 0 R /Contents 4 0 R >>",
+        4: _stream(b""),
+    }, root=1, size=5)
+    data, _ = _copy(bytes(out), rotate=90)
+    assert PdfReader(io.BytesIO(data)).pages[0].get("/Rotate") == 180
+
+
+def test_incremental_update_uses_latest_revision():
+    out = bytearray(_simple_pdf("original"))
+    prev = int(out.rsplit(b"startxref\n", 1)[1].split(b"\n", 1)[0])
+    # The update replaces the content stream and the page's MediaBox
+    _write_revision(out, {
+        3: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 500 500]"
+           b" /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        4: _stream(_text_stream("updated")),
+    }, root=1, size=6, prev=prev)
+    data, _ = _copy(bytes(out))
+    assert _texts(data) == ["updated"]
+    page = PdfReader(io.BytesIO(data)).pages[0]
+    assert [float(v) for v in page.mediabox] == [0, 0, 500, 500]
+
+
+def _image_pdf(text: str) -> bytes:
+    """A page drawing a small image XObject, identical in every copy."""
+    pixels = bytes(range(48))
+    content = b"q 100 0 0 100 72 200 cm /Im1 Do Q " + _text_stream(text)
+    out = bytearray(b"%PDF-1.4\n")
+    _write_revision(out, {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        3: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792]"
+           b" /Resources << /Font << /F1 5 0 R >> /XObject << /Im1 6 0 R >> >>"
+           b" /Contents 4 0 R >>",
+        4: _stream(content),
+        5: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        6: _stream(pixels, b" /Type /XObject /Subtype /Image /Width 4 /Height 4"
+                           b" /ColorSpace /DeviceRGB /BitsPerComponent 8"),
+    }, root=1, size=7)
+    return bytes(out)
+
+
+def test_dedupe_writes_shared_image_once():
+    plain, plain_writer = _copy(_image_pdf("one"), _image_pdf("two"))
+    deduped, writer = _copy(_image_pdf("one"), _image_pdf("two"), dedupe=True)
+    assert plain_writer.duplicate_streams == 0
+    assert writer.duplicate_streams == 1
+    assert writer.bytes_deduplicated == 48
+    assert len(deduped) < len(plain)
+    assert _texts(deduped) == ["one", "two"]
+
+    reader = PdfReader(io.BytesIO(deduped))
+    images = [page["/Resources"]["/XObject"].raw_get("/Im1") for page in reader.pages]
+    assert images[0].idnum == images[1].idnum
+    with fitz.open(stream=deduped, filetype="pdf") as doc:
+        assert all(len(page.get_images()) == 1 for page in doc)